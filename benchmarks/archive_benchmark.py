@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Archive export/import benchmark.
+
+Stores a seeded synthetic corpus (fragments, and memories with random
+embeddings) with the SQLite backends, then streams an archive export
+through the API while a writer thread keeps adding fragments, and imports
+the archive for a second user. Reports throughput, archive size, the
+writer's latency with and without an export running and how far the
+process's RSS rose during each phase, in a throwaway working directory.
+
+    python benchmarks/archive_benchmark.py --fragments 200000 --dimensions 384
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import generate_fragments, generate_memories
+from llm_stub import start_stub_server
+
+def _rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+class _Watch:
+    """Samples RSS on a thread and, optionally, times single fragment writes."""
+    def __init__(self, app, write):
+        self.app = app
+        self.write = write
+        self.stop = threading.Event()
+        self.latencies = []
+        self.start_rss = self.peak_rss = _rss_mb()
+
+    def _run(self):
+        client = self.app.test_client()
+        i = 0
+        while not self.stop.is_set():
+            self.peak_rss = max(self.peak_rss, _rss_mb())
+            if self.write:
+                started = time.perf_counter()
+                client.post("/api/cortex/fragments", json={"text": f"written during the benchmark {i}"})
+                self.latencies.append(time.perf_counter() - started)
+                i += 1
+            time.sleep(0.01)
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+
+    def result(self):
+        latencies = sorted(self.latencies)
+        result = {"rss_increase_mb": round(self.peak_rss - self.start_rss, 1)}
+        if latencies:
+            result.update({
+                "writes": len(latencies),
+                "write_p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+                "write_p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+                "write_max_ms": round(latencies[-1] * 1000, 2),
+            })
+        return result
+
+def run(fragment_count, dimensions, seed):
+    workdir = tempfile.mkdtemp(prefix="engram-archive-bench-")
+    stub, base_url = start_stub_server()
+
+    # Must be set before the app modules are imported
+    os.environ["ENGRAM_LLM_BASE_URL"] = base_url
+    os.environ["ENGRAM_MEMORY_BACKEND"] = "sqlite"
+    os.chdir(workdir)
+
+    try:
+        from main_app import create_app
+        app = create_app()
+        client = app.test_client()
+
+        print(f"Storing {fragment_count} fragments and their memories...")
+        body = "".join(json.dumps(record) + "\n" for record in generate_fragments(fragment_count, seed))
+        client.post("/api/cortex/fragments/bulk", data=body, content_type="application/x-ndjson").get_data()
+        rng = random.Random(seed)
+        memories = [{**memory, "embedding": [rng.gauss(0, 1) for _ in range(dimensions)]}
+                    for memory in generate_memories(fragment_count, seed)]
+        for start in range(0, len(memories), 1000):
+            body = "".join(json.dumps(memory) + "\n" for memory in memories[start:start + 1000])
+            client.post("/api/hippocampus/memories/bulk", data=body, content_type="application/x-ndjson").get_data()
+        del memories, body
+
+        results = {}
+        print("Writes without an export...")
+        with _Watch(app, write=True) as watch:
+            time.sleep(3)
+        results["writes_idle"] = watch.result()
+
+        print("Exporting while writing...")
+        path = os.path.join(workdir, "archive.engram")
+        with _Watch(app, write=True) as watch:
+            started = time.perf_counter()
+            response = client.get("/api/archive/export", buffered=False)
+            with open(path, "wb") as f:
+                for data in response.response:
+                    f.write(data)
+            response.close()
+            elapsed = time.perf_counter() - started
+        size = os.path.getsize(path)
+        results["export"] = {"seconds": round(elapsed, 2), "archive_mb": round(size / 1e6, 1),
+                             "mb_per_s": round(size / 1e6 / elapsed, 1), **watch.result()}
+
+        print("Importing for another user...")
+        with _Watch(app, write=False) as watch, open(path, "rb") as f:
+            started = time.perf_counter()
+            response = client.post("/api/archive/import", input_stream=f, content_length=size,
+                                   headers={"X-Engram-User": "restored"})
+            elapsed = time.perf_counter() - started
+        summary = response.get_json()["data"]
+        results["import"] = {"seconds": round(elapsed, 2), "mb_per_s": round(size / 1e6 / elapsed, 1),
+                             "records": summary["records"], **watch.result()}
+
+        return {"fragments": fragment_count, "dimensions": dimensions, "results": results}
+    finally:
+        os.chdir(REPO_ROOT)
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark archive export and import")
+    parser.add_argument("--fragments", type=int, default=100000, help="Fragments to store (default: 100000)")
+    parser.add_argument("--dimensions", type=int, default=384, help="Embedding dimensions (default: 384)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.fragments, args.dimensions, args.seed), indent=2))
+
+if __name__ == "__main__":
+    main()
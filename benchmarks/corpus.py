@@ -0,0 +1,150 @@
+"""
+Seeded synthetic journal corpus generator.
+
+Produces realistic-looking journal fragments (short first-person notes spread
+over several years and grouped into sessions) and matching consolidated
+memories as NDJSON, in the record formats accepted by the bulk endpoints.
+Records are generated lazily, so even 10M-fragment corpora stream to disk in
+constant memory.
+
+    python benchmarks/corpus.py --scale 100k --output /tmp/corpus
+"""
+
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from dateutil import tz
+
+SCALES = {
+    "1k": 1_000,
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+
+# One consolidated memory per this many fragments
+FRAGMENTS_PER_MEMORY = 10
+
+# Fragments written per session (a sitting with the app)
+FRAGMENTS_PER_SESSION = 25
+
+PEOPLE = ["Anna", "Ben", "mom", "dad", "Sam", "grandma", "Priya", "Lucas", "the neighbours", "my sister"]
+PLACES = ["the beach", "the office", "the park", "the gym", "the cafe", "the lake", "the market",
+          "the airport", "the library", "the mountains", "home", "the hospital"]
+ACTIVITIES = ["went for a run", "had coffee", "cooked pasta", "read a book", "watched a movie",
+              "went swimming", "played guitar", "cleaned the flat", "went hiking", "had a long call",
+              "worked on the project", "planted tomatoes", "went shopping", "took photos"]
+FEELINGS = ["felt great", "was exhausted", "felt a bit lonely", "was really happy", "felt anxious",
+            "was proud of myself", "felt calm", "was bored", "laughed a lot", "felt nostalgic"]
+DETAILS = ["it was raining", "the sun was out", "traffic was terrible", "we got lost",
+           "the food was amazing", "I forgot my keys", "it was freezing", "we stayed up late",
+           "the kids were loud", "everything went to plan"]
+
+TEMPLATES = [
+    "{activity} with {person}",
+    "{activity} at {place}",
+    "{person} and I {activity} at {place}",
+    "{feeling} after that",
+    "{detail}",
+    "{activity}, {detail}",
+    "saw {person} at {place}",
+    "{detail} but {feeling}",
+    "today I {activity} and {feeling}",
+]
+
+START_DATE = datetime(2019, 1, 1, tzinfo=tz.UTC)
+DAYS = 6 * 365
+
+def _sentence(rng):
+    return rng.choice(TEMPLATES).format(
+        person=rng.choice(PEOPLE),
+        place=rng.choice(PLACES),
+        activity=rng.choice(ACTIVITIES),
+        feeling=rng.choice(FEELINGS),
+        detail=rng.choice(DETAILS),
+    )
+
+def generate_fragments(count, seed=42):
+    """
+    Yield fragment records in chronological order. Consecutive fragments
+    share a session number in their metadata.
+    """
+    rng = random.Random(seed)
+    step = DAYS * 86400 / max(count, 1)
+    for i in range(count):
+        created_at = START_DATE + timedelta(seconds=i * step + rng.random() * step)
+        yield {
+            "content": _sentence(rng),
+            "source": "benchmark",
+            "metadata": {"session": i // FRAGMENTS_PER_SESSION},
+            "created_at": created_at.isoformat(),
+        }
+
+def generate_memories(fragment_count, seed=42):
+    """Yield one consolidated memory per FRAGMENTS_PER_MEMORY fragments."""
+    batch = []
+    for fragment in generate_fragments(fragment_count, seed):
+        batch.append(fragment)
+        if len(batch) == FRAGMENTS_PER_MEMORY:
+            yield _memory(batch)
+            batch = []
+    if batch:
+        yield _memory(batch)
+
+def _memory(fragments):
+    text = ". ".join(f["content"][0].upper() + f["content"][1:] for f in fragments) + "."
+    return {
+        "text": text,
+        "source": "benchmark",
+        "fragments": [f["content"] for f in fragments],
+        "metadata": {"session_id": f"session-{fragments[0]['metadata']['session']}"},
+        "created_at": fragments[0]["created_at"],
+    }
+
+def queries(count, seed=42):
+    """Natural-language questions over the corpus vocabulary."""
+    rng = random.Random(seed + 1)
+    forms = [
+        "when did I go to {place} with {person}",
+        "what did {person} and I do",
+        "how did I feel at {place}",
+        "times I {activity}",
+        "{person} {place}",
+    ]
+    return [rng.choice(forms).format(
+        person=rng.choice(PEOPLE), place=rng.choice(PLACES), activity=rng.choice(ACTIVITIES)
+    ) for _ in range(count)]
+
+def write_ndjson(path, records):
+    """Write records to an NDJSON file, returning how many were written."""
+    written = 0
+    with open(path, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+            written += 1
+    return written
+
+def write_corpus(directory, fragment_count, seed=42):
+    """Write fragments.ndjson and memories.ndjson; returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    fragments_path = os.path.join(directory, "fragments.ndjson")
+    memories_path = os.path.join(directory, "memories.ndjson")
+    write_ndjson(fragments_path, generate_fragments(fragment_count, seed))
+    write_ndjson(memories_path, generate_memories(fragment_count, seed))
+    return fragments_path, memories_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic journal corpus")
+    parser.add_argument("--scale", choices=SCALES, default="10k", help="Number of fragments (default: 10k)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--output", required=True, help="Directory to write NDJSON files to")
+    args = parser.parse_args()
+
+    fragments_path, memories_path = write_corpus(args.output, SCALES[args.scale], args.seed)
+    print(f"Wrote {fragments_path} and {memories_path}")
+
+if __name__ == "__main__":
+    main()
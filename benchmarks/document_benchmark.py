@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Source document storage benchmark.
+
+Uploads the same files twice, for two users: once storing each fragment's
+text inline, once keeping the file as a compressed source document that the
+fragments reference. Runs on seeded synthetic journal files, whose
+fragments are short, and on files cut from the repository's documentation.
+Reports upload time, the size of each user's fragments database and of the
+stored text, and how long listing the fragments takes with the document
+cache cold and warm, in a throwaway working directory.
+
+    python benchmarks/document_benchmark.py --files 200 --file-kb 20
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import generate_fragments
+from llm_stub import start_stub_server
+
+def journal_files(count, size, seed):
+    """Synthetic journal entries joined into files of about size characters."""
+    rng = random.Random(seed)
+    records = generate_fragments(count * size // 30, seed)
+    files = []
+    for _ in range(count):
+        pieces = []
+        length = 0
+        while length < size:
+            piece = next(records)["content"] + rng.choice([". ", ", and ", "; ", "! ", " but ", ".\n\n"])
+            pieces.append(piece)
+            length += len(piece)
+        files.append("".join(pieces))
+    return files
+
+def prose_files(count, size):
+    """The repository's documentation, cut into count files of size characters."""
+    docs = ""
+    for name in ("README.md", "VISION.md", "TODO.md"):
+        with open(os.path.join(REPO_ROOT, name), encoding="utf-8") as f:
+            docs += f.read()
+    docs *= count * size // len(docs) + 1
+    return [docs[i * size:(i + 1) * size] for i in range(count)]
+
+def _database_bytes(user):
+    from llm.tenancy import as_user, user_path
+    from modules.cortex import database
+    with as_user(user):
+        conn = database.get_connection()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        inline = conn.execute("SELECT COALESCE(SUM(LENGTH(CAST(content AS BLOB))), 0) FROM fragments").fetchone()[0]
+        documents = conn.execute("SELECT COALESCE(SUM(LENGTH(content)), 0) FROM documents").fetchone()[0]
+        conn.close()
+        return os.path.getsize(user_path(database.DB_PATH)), inline + documents
+
+def _upload_and_list(client, database, processor, files, user, store_documents, repeat):
+    processor.STORE_DOCUMENTS = store_documents
+    headers = {"X-Engram-User": user}
+    fragments = 0
+    started = time.perf_counter()
+    for i, text in enumerate(files):
+        response = client.post("/api/cortex/fragments/file", headers=headers, json={
+            "filename": f"notes-{i}.txt",
+            "file_content": base64.b64encode(text.encode()).decode(),
+        })
+        fragments += response.get_json()["data"]["fragments_added"]
+    upload_s = time.perf_counter() - started
+    database_bytes, text_bytes = _database_bytes(user)
+
+    result = {
+        "fragments": fragments,
+        "upload_s": round(upload_s, 2),
+        "database_mb": round(database_bytes / 1e6, 2),
+        "stored_text_mb": round(text_bytes / 1e6, 2),
+    }
+    for cache in ("cold", "warm"):
+        durations = []
+        for _ in range(repeat):
+            if cache == "cold":
+                database._document_cache.clear()
+            started = time.perf_counter()
+            client.get(f"/api/cortex/fragments?limit={fragments}", headers=headers).get_data()
+            durations.append(time.perf_counter() - started)
+        result[f"list_{cache}_ms"] = round(statistics.median(durations) * 1000, 1)
+    return result
+
+def run(file_count, file_kb, repeat, seed):
+    workdir = tempfile.mkdtemp(prefix="engram-document-bench-")
+    stub, base_url = start_stub_server()
+
+    # Must be set before the app modules are imported
+    os.environ["ENGRAM_LLM_BASE_URL"] = base_url
+    os.chdir(workdir)
+
+    try:
+        from main_app import create_app
+        from modules.cortex import database, processor
+        app = create_app()
+        client = app.test_client()
+
+        corpora = {"journal": journal_files(file_count, file_kb * 1000, seed),
+                   "prose": prose_files(file_count, file_kb * 1000)}
+        results = {}
+        for kind, files in corpora.items():
+            results[kind] = {"source_mb": round(sum(len(text.encode()) for text in files) / 1e6, 2)}
+            for mode in ("inline", "documents"):
+                print(f"Uploading {file_count} {kind} files ({mode})...")
+                results[kind][mode] = _upload_and_list(client, database, processor, files, f"{kind}-{mode}",
+                                                       mode == "documents", repeat)
+            results[kind]["database_reduction"] = round(
+                1 - results[kind]["documents"]["database_mb"] / results[kind]["inline"]["database_mb"], 2)
+        return {"files": file_count, "file_kb": file_kb, "results": results}
+    finally:
+        os.chdir(REPO_ROOT)
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark source document storage for file imports")
+    parser.add_argument("--files", type=int, default=200, help="Files to upload per mode (default: 200)")
+    parser.add_argument("--file-kb", type=int, default=20, help="Approximate size of each file in KB (default: 20)")
+    parser.add_argument("--repeat", type=int, default=5, help="Listing requests per measurement (default: 5)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.files, args.file_kb, args.repeat, args.seed), indent=2))
+
+if __name__ == "__main__":
+    main()
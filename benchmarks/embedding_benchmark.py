@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Memory, startup and recall benchmark for the embedding store.
+
+Writes seeded random embeddings to an on-disk EmbeddingStore (int8 and
+float16, with and without full-precision re-ranking) and compares open time,
+search latency, RSS growth and recall@k against exact float32 search.
+
+    python benchmarks/embedding_benchmark.py --vectors 200000 --dimensions 384
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.hippocampus.embeddings import EmbeddingStore
+
+def _rss_mb():
+    # Current resident set from /proc where available, else the peak
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _clustered_vectors(rng, count, dimensions, clusters=256):
+    centers = rng.standard_normal((clusters, dimensions)).astype(np.float32)
+    labels = rng.integers(0, clusters, count)
+    return centers[labels] + 0.5 * rng.standard_normal((count, dimensions)).astype(np.float32)
+
+def run(count, dimensions, queries, top_k, seed):
+    rng = np.random.default_rng(seed)
+    vectors = _clustered_vectors(rng, count, dimensions)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    query_vectors = _clustered_vectors(rng, queries, dimensions)
+    ids = [f"memory-{i}" for i in range(count)]
+
+    exact = []
+    for query in query_vectors:
+        scores = normalized @ (query / np.linalg.norm(query))
+        exact.append(set(np.argsort(-scores)[:top_k].tolist()))
+    del normalized
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for dtype in ("int8", "float16"):
+            for rerank in (False, True):
+                name = f"{dtype}{'+rerank' if rerank else ''}"
+                path = os.path.join(directory, name)
+                writer = EmbeddingStore(path, dtype=dtype, rerank=rerank)
+                for start in range(0, count, 10000):
+                    writer.add(list(zip(ids[start:start + 10000], vectors[start:start + 10000])))
+
+                rss_before = _rss_mb()
+                started = time.perf_counter()
+                store = EmbeddingStore(path)
+                store.search(query_vectors[0], top_k)
+                open_ms = (time.perf_counter() - started) * 1000
+
+                latencies = []
+                hits = 0
+                for query, truth in zip(query_vectors, exact):
+                    started = time.perf_counter()
+                    found = store.search(query, top_k)
+                    latencies.append(time.perf_counter() - started)
+                    hits += len({int(memory_id.split("-")[1]) for memory_id, _ in found} & truth)
+
+                latencies.sort()
+                disk = sum(os.path.getsize(os.path.join(directory, f))
+                           for f in os.listdir(directory) if f.startswith(name + "."))
+                results[name] = {
+                    "disk_mb": disk / 1e6,
+                    "open_and_first_search_ms": open_ms,
+                    "rss_growth_mb": _rss_mb() - rss_before,
+                    f"recall@{top_k}": hits / (queries * top_k),
+                    "p50_ms": latencies[len(latencies) // 2] * 1000,
+                    "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+                }
+                del store
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the quantized embedding store")
+    parser.add_argument("--vectors", type=int, default=100000, help="Number of stored embeddings (default: 100000)")
+    parser.add_argument("--dimensions", type=int, default=384, help="Embedding dimensions (default: 384)")
+    parser.add_argument("--queries", type=int, default=100, help="Number of queries (default: 100)")
+    parser.add_argument("--top-k", type=int, default=10, help="Results per query (default: 10)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.vectors, args.dimensions, args.queries, args.top_k, args.seed), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Offline OpenAI-compatible LLM stub.
+
+Serves /v1/models, /v1/chat/completions (including multimodal requests
+with images) and /v1/embeddings with deterministic responses and an
+optional artificial latency, so benchmarks
+exercise the real HTTP client path without a GPU or a vLLM server. With
+a concurrency limit, requests beyond it queue in arrival order the way a
+saturated vLLM server makes them wait. Chat prompts go through a simulated
+prefix cache: prompt tokens whose prefix was seen before are reported as
+cached and skip the per-token prefill delay.
+
+    python benchmarks/llm_stub.py --port 8000 --latency-ms 50 --max-concurrency 4 --prefill-ms-per-token 0.2
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODEL_NAME = "engram-stub"
+EMBEDDING_DIMENSIONS = 64
+
+# The stub's "tokens" are 4 characters; the prefix cache works in blocks of
+# 16 tokens like vLLM's
+CHARS_PER_TOKEN = 4
+BLOCK_TOKENS = 16
+
+def _embedding(text):
+    """A deterministic unit-ish vector derived from the text's words."""
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for word in text.lower().split():
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        vector[digest[0] % EMBEDDING_DIMENSIONS] += 1.0
+        vector[digest[1] % EMBEDDING_DIMENSIONS] -= 0.5
+    return vector
+
+def _message_text(content):
+    """Flatten string or multimodal list content to text."""
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+def _message_images(messages):
+    """Image URLs in multimodal message content, in order."""
+    return [part["image_url"]["url"] for message in messages if isinstance(message.get("content"), list)
+            for part in message["content"] if isinstance(part, dict) and part.get("type") == "image_url"]
+
+class _FifoSemaphore:
+    """A semaphore that admits waiters in arrival order."""
+    def __init__(self, value):
+        self.value = value
+        self.waiters = deque()
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        with self.lock:
+            if self.value > 0 and not self.waiters:
+                self.value -= 1
+                return self
+            event = threading.Event()
+            self.waiters.append(event)
+        event.wait()
+        return self
+
+    def __exit__(self, *exc):
+        with self.lock:
+            if self.waiters:
+                self.waiters.popleft().set()
+            else:
+                self.value += 1
+        return False
+
+class PrefixCache:
+    """
+    A block-level prompt cache like vLLM's automatic prefix caching: a block
+    of the prompt is cached if an earlier prompt had exactly the same text
+    up to the end of that block. Least recently used blocks are evicted.
+    """
+    def __init__(self, max_blocks=100000):
+        self.max_blocks = max_blocks
+        self.blocks = OrderedDict()
+        self.lock = threading.Lock()
+
+    def lookup(self, text):
+        """Cache the prompt's blocks and return how many of its tokens were cached already."""
+        block_chars = BLOCK_TOKENS * CHARS_PER_TOKEN
+        cached, parent = 0, b""
+        with self.lock:
+            for start in range(0, len(text) - block_chars + 1, block_chars):
+                parent = hashlib.blake2b(parent + text[start:start + block_chars].encode(), digest_size=16).digest()
+                if parent in self.blocks and cached == start // block_chars:
+                    cached += 1
+                self.blocks[parent] = True
+                self.blocks.move_to_end(parent)
+            while len(self.blocks) > self.max_blocks:
+                self.blocks.popitem(last=False)
+        return cached * BLOCK_TOKENS
+
+    def clear(self):
+        with self.lock:
+            self.blocks.clear()
+
+def _chat_template(messages):
+    """Serialize messages roughly the way a chat template does, system message first."""
+    return "".join(f"<|{m.get('role', 'user')}|>\n{_message_text(m.get('content', ''))}\n" for m in messages)
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    prefill_per_token = 0.0  # seconds per prompt token not in the prefix cache
+    capacity = None  # Semaphore limiting requests served at once
+    prefix_cache = None
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; don't let Nagle hold the body for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send({"object": "list", "data": [{"id": MODEL_NAME, "object": "model"}]})
+        else:
+            self._send({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        delay = self.latency
+        if self.path.endswith("/chat/completions"):
+            templated = _chat_template(request.get("messages", []))
+            prompt_tokens = max(len(templated) // CHARS_PER_TOKEN, 1)
+            cached_tokens = self.prefix_cache.lookup(templated)
+            delay += (prompt_tokens - cached_tokens) * self.prefill_per_token
+        if self.capacity:
+            with self.capacity:
+                time.sleep(delay)
+        elif delay:
+            time.sleep(delay)
+
+        if self.path.endswith("/chat/completions"):
+            prompt = " ".join(_message_text(m.get("content", "")) for m in request.get("messages", []))
+            images = _message_images(request.get("messages", []))
+            if images:
+                # One numbered line per image, as the vision prompt asks for
+                content = "\n".join(f"{i}. Stub description of photo {hashlib.blake2b(url.encode(), digest_size=4).hexdigest()}"
+                                     for i, url in enumerate(images, 1))
+            else:
+                content = "Stub response: " + " ".join(prompt.split()[-30:])
+            completion_tokens = max(len(content) // CHARS_PER_TOKEN, 1)
+            self._send({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", MODEL_NAME),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens,
+                          "prompt_tokens_details": {"cached_tokens": cached_tokens}},
+            })
+        elif self.path.endswith("/embeddings"):
+            inputs = request.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            tokens = sum(len(text) // 4 + 1 for text in inputs)
+            self._send({
+                "object": "list",
+                "model": request.get("model", MODEL_NAME),
+                "data": [{"object": "embedding", "index": i, "embedding": _embedding(text)}
+                         for i, text in enumerate(inputs)],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+        else:
+            self._send({"error": "not found"}, 404)
+
+def start_stub_server(host="127.0.0.1", port=0, latency_ms=0.0, max_concurrency=0, prefill_ms_per_token=0.0):
+    """
+    Start the stub in a background thread; returns (server, base_url). The
+    prefix cache is server.RequestHandlerClass.prefix_cache.
+    """
+    capacity = _FifoSemaphore(max_concurrency) if max_concurrency else None
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "latency": latency_ms / 1000,
+        "prefill_per_token": prefill_ms_per_token / 1000,
+        "capacity": capacity,
+        "prefix_cache": PrefixCache(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an offline OpenAI-compatible LLM stub")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to bind to (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default: 8000)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to each response")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="Requests served at once (default: unlimited)")
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.0,
+                        help="Delay per prompt token not in the prefix cache (default: 0)")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.host, args.port, args.latency_ms, args.max_concurrency,
+                                         args.prefill_ms_per_token)
+    print(f"LLM stub serving at {base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
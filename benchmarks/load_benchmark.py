@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Concurrent load benchmark for production mode.
+
+Stores a seeded synthetic corpus in the SQLite memory store, then serves it
+with `main_app.py --production` at each worker count against the offline
+LLM stub, and drives it with concurrent HTTP clients: stats, fragment
+listing, memory search, period summaries and memory writes. Reports
+requests per second and latency percentiles per worker count, how
+throughput scales against one worker, and whether the summary counts still
+match the memories stored once every worker has written to them, in a
+throwaway working directory.
+
+    python benchmarks/load_benchmark.py --workers 1,2,4 --clients 32 --seconds 20
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import generate_fragments, generate_memories, queries
+from llm_stub import start_stub_server
+
+# Each client cycles through these; writes land in 2022 so the year summary counts them
+REQUESTS = [
+    ("stats", "GET", "/api/cortex/stats", None),
+    ("fragments", "GET", "/api/cortex/fragments?limit=50", None),
+    ("search", "POST", "/api/hippocampus/memories/search", lambda question, i: {"query": question}),
+    ("summary", "GET", "/api/hippocampus/summaries?period=2022", None),
+    ("write", "POST", "/api/hippocampus/memories/bulk",
+     lambda question, i: {"text": question, "created_at": f"2022-06-{1 + i % 28:02d}T12:00:00"}),
+]
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _call(base_url, method, path, payload=None):
+    data = headers = None
+    if payload is not None:
+        if path.endswith("/bulk"):
+            data = "".join(json.dumps(record) + "\n" for record in payload).encode()
+            headers = {"Content-Type": "application/x-ndjson"}
+        else:
+            data = json.dumps(payload).encode()
+            headers = {"Content-Type": "application/json"}
+    request = urllib.request.Request(base_url + path, data=data, headers=headers or {}, method=method)
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return response.status, response.read()
+
+def _start_server(workers, threads, env, workdir):
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_ROOT, "main_app.py"), "--production", "--host", "127.0.0.1",
+         "--port", str(port)],
+        cwd=workdir, env={**env, "ENGRAM_WORKERS": str(workers), "ENGRAM_THREADS": str(threads)},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            if _call(base_url, "GET", "/api/ready")[0] == 200:
+                return server, base_url
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError(f"Server with {workers} workers did not become ready")
+
+def _stop_server(server):
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+def setup(base_url, fragment_count, seed):
+    """Store the corpus through the running server."""
+    records = list(generate_fragments(fragment_count, seed))
+    for start in range(0, len(records), 10000):
+        _call(base_url, "POST", "/api/cortex/fragments/bulk", records[start:start + 10000])
+    memories = list(generate_memories(fragment_count, seed))
+    for start in range(0, len(memories), 10000):
+        _call(base_url, "POST", "/api/hippocampus/memories/bulk", memories[start:start + 10000])
+
+def load(base_url, clients, seconds, seed):
+    """Run clients concurrently for a number of seconds; returns per-request latencies and errors."""
+    questions = queries(1000, seed)
+    counter = itertools.count()
+    latencies = {name: [] for name, _, _, _ in REQUESTS}
+    errors = []
+    stop = time.monotonic() + seconds
+
+    def client(offset):
+        for step in itertools.count(offset):
+            if time.monotonic() >= stop:
+                return
+            name, method, path, payload = REQUESTS[step % len(REQUESTS)]
+            i = next(counter)
+            body = None
+            if payload is not None:
+                body = payload(questions[i % len(questions)], i)
+                body = [body] if path.endswith("/bulk") else body
+            started = time.perf_counter()
+            try:
+                _call(base_url, method, path, body)
+                latencies[name].append(time.perf_counter() - started)
+            except (urllib.error.URLError, ConnectionError) as e:
+                errors.append(str(e))
+
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+def _summary_count(base_url):
+    return json.loads(_call(base_url, "GET", "/api/hippocampus/summaries?period=2022")[1])["data"]["memory_count"]
+
+def run(worker_counts, clients, threads, seconds, fragment_count, seed):
+    workdir = tempfile.mkdtemp(prefix="engram-load-bench-")
+    stub, base_url = start_stub_server()
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT, "ENGRAM_LLM_BASE_URL": base_url,
+           "ENGRAM_MEMORY_BACKEND": "sqlite", "ENGRAM_FRAGMENT_BACKEND": "sqlite"}
+    try:
+        print(f"Storing {fragment_count} fragments and their memories...")
+        server, url = _start_server(1, threads, env, workdir)
+        try:
+            setup(url, fragment_count, seed)
+            expected = _summary_count(url)
+        finally:
+            _stop_server(server)
+
+        results = {}
+        for workers in worker_counts:
+            print(f"Serving with {workers} workers, {clients} clients for {seconds}s...")
+            server, url = _start_server(workers, threads, env, workdir)
+            try:
+                latencies, errors, elapsed = load(url, clients, seconds, seed)
+                expected += len(latencies["write"])
+                counted = _summary_count(url)
+            finally:
+                _stop_server(server)
+            every = [latency for values in latencies.values() for latency in values]
+            results[workers] = {
+                "requests_per_s": round(len(every) / elapsed, 1),
+                "p50_ms": round(statistics.median(every) * 1000, 1) if every else None,
+                "p99_ms": round(statistics.quantiles(every, n=100)[98] * 1000, 1) if len(every) > 1 else None,
+                "errors": len(errors),
+                "per_request_p50_ms": {name: round(statistics.median(values) * 1000, 1)
+                                       for name, values in latencies.items() if values},
+                "summary_count_matches": counted == expected,
+            }
+        baseline = results[worker_counts[0]]["requests_per_s"]
+        for workers, result in results.items():
+            result["speedup"] = round(result["requests_per_s"] / baseline, 2) if baseline else None
+        return {"cpus": os.cpu_count(), "clients": clients, "threads": threads, "seconds": seconds,
+                "fragments": fragment_count, "results": results}
+    finally:
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark production-mode throughput per worker count")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}",
+                        help="Comma-separated worker counts (default: 1 and the CPU count)")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent HTTP clients (default: 32)")
+    parser.add_argument("--threads", type=int, default=4, help="Threads per worker (default: 4)")
+    parser.add_argument("--seconds", type=float, default=20, help="Load duration per worker count (default: 20)")
+    parser.add_argument("--fragments", type=int, default=10000, help="Fragments to store (default: 10000)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    args = parser.parse_args()
+
+    worker_counts = sorted({int(count) for count in args.workers.split(",")})
+    print(json.dumps(run(worker_counts, args.clients, args.threads, args.seconds, args.fragments, args.seed), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Prompt prefix caching benchmark.
+
+Sends memory building, fragment consolidation and memory query requests
+through the app against the offline LLM stub, whose simulated prefix cache
+reports cached prompt tokens and charges a prefill delay only for the rest.
+Runs once with every prompt template pinned to version 1 (the original
+prompts) and once with the current versions, and reports the prefix cache
+hit rate, prefill time and latency per template, in a throwaway working
+directory.
+
+    python benchmarks/prompt_benchmark.py --requests 100 --prefill-ms-per-token 0.2
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import _sentence, generate_memories, queries
+from llm_stub import start_stub_server
+
+# Template each endpoint renders, and how to call it
+WORKLOAD = [
+    ("build_memory", "/api/cortex/memory/build", lambda rng, question: {"content": _sentence(rng)}),
+    ("complete_memory", "/api/hippocampus/fragments/process",
+     lambda rng, question: {"fragments": [_sentence(rng) for _ in range(3)]}),
+    ("memory_query", "/api/hippocampus/memories/query", lambda rng, question: {"question": question}),
+]
+
+def _prompt_tokens():
+    """Snapshot of {(prompt id, result): tokens}."""
+    from llm.metrics import prompt_tokens
+    return {(dict(labels)["prompt"], dict(labels)["result"]): value for labels, value in prompt_tokens.values.items()}
+
+def _scenario(client, requests, prefill_ms_per_token, seed):
+    from llm.prompts import get_prompt
+
+    rng = random.Random(seed)
+    questions = queries(requests, seed)
+    before = _prompt_tokens()
+    latencies = {name: [] for name, _, _ in WORKLOAD}
+    for i in range(requests):
+        for name, path, payload in WORKLOAD:
+            started = time.perf_counter()
+            client.post(path, json=payload(rng, questions[i]))
+            latencies[name].append(time.perf_counter() - started)
+    after = _prompt_tokens()
+
+    results = {}
+    for name, _, _ in WORKLOAD:
+        prompt_id = get_prompt(name).id
+        hit = after.get((prompt_id, "hit"), 0) - before.get((prompt_id, "hit"), 0)
+        miss = after.get((prompt_id, "miss"), 0) - before.get((prompt_id, "miss"), 0)
+        results[name] = {
+            "prompt": prompt_id,
+            "prompt_tokens_per_request": round((hit + miss) / requests, 1),
+            "prefix_cache_hit_rate": round(hit / (hit + miss), 3) if hit + miss else None,
+            "prefill_ms_per_request": round(miss * prefill_ms_per_token / requests, 2),
+            "mean_latency_ms": round(sum(latencies[name]) / requests * 1000, 2),
+        }
+    return results
+
+def run(requests, memories, llm_latency_ms, prefill_ms_per_token, seed):
+    workdir = tempfile.mkdtemp(prefix="engram-prompt-bench-")
+    stub, base_url = start_stub_server(latency_ms=llm_latency_ms, prefill_ms_per_token=prefill_ms_per_token)
+
+    # Must be set before the app modules are imported
+    os.environ["ENGRAM_LLM_BASE_URL"] = base_url
+    os.environ.setdefault("ENGRAM_MEMORY_BACKEND", "memory")
+    os.chdir(workdir)
+
+    try:
+        from llm import prompts
+        from main_app import create_app
+        # No warm-up: it would prime the prefix cache being measured
+        client = create_app(warm_up=False).test_client()
+
+        # Memories for the query prompt's context
+        body = "".join(json.dumps(memory) + "\n" for memory in generate_memories(memories * 10, seed))
+        client.post("/api/hippocampus/memories/bulk", data=body, content_type="application/x-ndjson")
+
+        results = {}
+        for scenario, pinned in (("v1", {name: 1 for name in prompts.list_prompts()}), ("current", {})):
+            print(f"Prompts {scenario}...")
+            prompts.PINNED_VERSIONS.clear()
+            prompts.PINNED_VERSIONS.update(pinned)
+            stub.RequestHandlerClass.prefix_cache.clear()
+            results[scenario] = _scenario(client, requests, prefill_ms_per_token, seed)
+
+        return {
+            "requests_per_template": requests,
+            "memories": memories,
+            "llm_latency_ms": llm_latency_ms,
+            "prefill_ms_per_token": prefill_ms_per_token,
+            "scenarios": results,
+        }
+    finally:
+        os.chdir(REPO_ROOT)
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prompt prefix cache reuse")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per template (default: 50)")
+    parser.add_argument("--memories", type=int, default=200, help="Memories to query over (default: 200)")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Fixed latency of each stub request (default: 0)")
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.2,
+                        help="Stub prefill time per uncached prompt token (default: 0.2)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.requests, args.memories, args.llm_latency_ms, args.prefill_ms_per_token, args.seed),
+                     indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+API response encoding benchmark.
+
+Stores a seeded synthetic corpus, then fetches the fragment and memory
+lists with the stdlib JSON encoder and with orjson, uncompressed and with
+each compression the server supports. Reports serialization time, request
+latency and bytes on the wire per configuration, in a throwaway working
+directory.
+
+    python benchmarks/response_benchmark.py --fragments 20000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import generate_fragments, generate_memories
+from llm_stub import start_stub_server
+
+ENDPOINTS = {
+    "fragments": "/api/cortex/fragments",
+    "memories": "/api/hippocampus/memories",
+}
+
+def _measure(app, client, key, path, encoding, repeat):
+    """Median serialization and request time, and the response size."""
+    from llm.responses import success_response
+
+    payload = client.get(path, headers={"Accept-Encoding": "identity"}).get_json()["data"]
+    serialize, latency = [], []
+    size = 0
+    for _ in range(repeat):
+        with app.test_request_context():
+            started = time.perf_counter()
+            success_response({key: payload[key]}).get_data()
+            serialize.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        response = client.get(path, headers={"Accept-Encoding": encoding})
+        size = len(response.get_data())  # the test client doesn't decompress
+        latency.append(time.perf_counter() - started)
+    return {
+        "items": len(payload[key]),
+        "serialize_ms": round(statistics.median(serialize) * 1000, 2),
+        "request_ms": round(statistics.median(latency) * 1000, 2),
+        "bytes": size,
+    }
+
+def run(fragment_count, repeat, seed):
+    workdir = tempfile.mkdtemp(prefix="engram-response-bench-")
+    stub, base_url = start_stub_server()
+
+    # Must be set before the app modules are imported
+    os.environ["ENGRAM_LLM_BASE_URL"] = base_url
+    os.environ.setdefault("ENGRAM_MEMORY_BACKEND", "sqlite")
+    os.chdir(workdir)
+
+    try:
+        from flask.json.provider import DefaultJSONProvider
+        from llm import compression
+        from llm.responses import FastJSONProvider
+        from main_app import create_app
+        app = create_app()
+        client = app.test_client()
+
+        print(f"Storing {fragment_count} fragments and their memories...")
+        body = "".join(json.dumps(record) + "\n" for record in generate_fragments(fragment_count, seed))
+        client.post("/api/cortex/fragments/bulk", data=body, content_type="application/x-ndjson")
+        body = "".join(json.dumps(record) + "\n" for record in generate_memories(fragment_count, seed))
+        client.post("/api/hippocampus/memories/bulk", data=body, content_type="application/x-ndjson")
+
+        configurations = [("stdlib", "identity"), ("orjson", "identity")]
+        configurations += [("orjson", encoding) for encoding in compression.ENCODINGS]
+        results = {}
+        for encoder, encoding in configurations:
+            if encoder == "orjson" and not FastJSONProvider.enabled:
+                continue
+            print(f"{encoder} + {encoding}...")
+            app.json = FastJSONProvider(app) if encoder == "orjson" else DefaultJSONProvider(app)
+            results[f"{encoder}+{encoding}"] = {
+                name: _measure(app, client, name, f"{path}?limit={fragment_count}", encoding, repeat)
+                for name, path in ENDPOINTS.items()
+            }
+
+        return {"fragments": fragment_count, "repeat": repeat, "results": results}
+    finally:
+        os.chdir(REPO_ROOT)
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON encoding and response compression")
+    parser.add_argument("--fragments", type=int, default=10000, help="Fragments to store (default: 10000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Requests per configuration (default: 5)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.fragments, args.repeat, args.seed), indent=2))
+
+if __name__ == "__main__":
+    main()
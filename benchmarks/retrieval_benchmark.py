@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Recall and latency benchmark for hippocampus memory retrieval.
+
+Builds a seeded synthetic journal corpus where every memory belongs to one
+topic, then compares the old verbatim substring search with BM25, vector
+similarity and the hybrid (reciprocal rank fusion) search used by
+search_memories.
+
+    python benchmarks/retrieval_benchmark.py --memories 20000 --queries 300
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.hippocampus.retrieval import HybridIndex
+
+FILLER = """
+today went felt really morning evening afternoon later after before again still quite little
+long short good bad tired happy nice weird busy quiet walked talked thought remembered
+called saw met made took got came left home outside inside back around together alone
+""".split()
+
+TOPICS = {
+    "dentist": ["dentist", "appointment", "teeth", "cleaning", "clinic", "filling"],
+    "beach": ["beach", "ocean", "swim", "sand", "waves", "sunscreen"],
+    "birthday": ["birthday", "cake", "party", "candles", "presents", "friends"],
+    "work": ["meeting", "project", "deadline", "manager", "office", "presentation"],
+    "hiking": ["hike", "trail", "mountain", "summit", "boots", "forest"],
+    "cooking": ["recipe", "dinner", "pasta", "kitchen", "sauce", "oven"],
+    "travel": ["flight", "airport", "hotel", "luggage", "passport", "train"],
+    "music": ["concert", "guitar", "band", "song", "tickets", "stage"],
+    "family": ["mom", "dad", "sister", "brother", "grandma", "cousins"],
+    "garden": ["garden", "tomatoes", "seeds", "watering", "flowers", "soil"],
+}
+
+def make_corpus(memory_count, dimensions, rng):
+    """Return memory dicts plus each topic's embedding centroid."""
+    centroids = {topic: rng.standard_normal(dimensions) for topic in TOPICS}
+    memories = []
+    for i in range(memory_count):
+        topic = random.choice(list(TOPICS))
+        words = random.sample(FILLER, random.randint(6, 20)) + random.sample(TOPICS[topic], 3)
+        random.shuffle(words)
+        embedding = centroids[topic] + rng.standard_normal(dimensions) * 1.5
+        memories.append({
+            "id": f"m{i}",
+            "text": " ".join(words),
+            "topic": topic,
+            "embedding": embedding.tolist(),
+        })
+    return memories, centroids
+
+def make_queries(query_count, centroids, dimensions, rng):
+    """Queries use two topic words in an order that rarely appears verbatim."""
+    queries = []
+    for _ in range(query_count):
+        topic = random.choice(list(TOPICS))
+        words = random.sample(TOPICS[topic], 2)
+        embedding = centroids[topic] + rng.standard_normal(dimensions) * 1.5
+        queries.append({"text": f"when did I {words[0]} {words[1]}", "topic": topic, "embedding": embedding})
+    return queries
+
+def substring_search(memories, query, top_k):
+    """The previous search_memories fallback."""
+    query_lower = query.lower()
+    return [m for m in memories if query_lower in m["text"].lower()][:top_k]
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct)) * 1000 if values else 0.0
+
+def run(method, queries, search, top_k):
+    hits = 0
+    answered = 0
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        results = search(query)
+        latencies.append(time.perf_counter() - start)
+        relevant = sum(1 for memory in results if memory["topic"] == query["topic"])
+        hits += relevant
+        answered += 1 if relevant else 0
+    return {
+        "method": method,
+        # Share of queries with at least one relevant memory in the top k,
+        # i.e. how often query_memory gets usable context
+        "hit_rate": answered / len(queries),
+        "precision_at_k": hits / (len(queries) * top_k),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hippocampus memory retrieval")
+    parser.add_argument("--memories", type=int, default=10000, help="Corpus size (default: 10000)")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries (default: 200)")
+    parser.add_argument("--top-k", type=int, default=5, help="Results per query (default: 5)")
+    parser.add_argument("--dimensions", type=int, default=64, help="Embedding size (default: 64)")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed (default: 7)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    rng = np.random.default_rng(args.seed)
+    memories, centroids = make_corpus(args.memories, args.dimensions, rng)
+    queries = make_queries(args.queries, centroids, args.dimensions, rng)
+
+    start = time.perf_counter()
+    index = HybridIndex()
+    index.add_memories(memories)
+    build_seconds = time.perf_counter() - start
+
+    top_k = args.top_k
+    results = [
+        run("substring", queries, lambda q: substring_search(memories, q["text"], top_k), top_k),
+        run("bm25", queries, lambda q: [index.memories[i] for i, _ in index.bm25.search(q["text"], top_k)], top_k),
+        run("vector", queries, lambda q: [index.memories[i] for i, _ in index.vectors.search(q["embedding"], top_k)], top_k),
+        run("hybrid", queries, lambda q: index.search(q["text"], top_k, q["embedding"]), top_k),
+    ]
+
+    report = {
+        "memories": args.memories,
+        "queries": args.queries,
+        "top_k": top_k,
+        "index_build_seconds": build_seconds,
+        "results": results,
+    }
+
+    print(f"Index built over {args.memories} memories in {build_seconds:.2f}s")
+    print(f"{'method':<10} {'hit rate':>9} {'precision@k':>12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for result in results:
+        print(f"{result['method']:<10} {result['hit_rate']:>9.3f} {result['precision_at_k']:>12.3f} "
+              f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite.
+
+Generates a seeded synthetic journal corpus, starts an offline LLM stub and
+drives the real Flask app (via its test client) through ingest, fragment
+listing, memory search, consolidation and memory query scenarios. Everything
+runs in a throwaway working directory, so local data is never touched.
+Results are written as JSON so runs can be diffed across commits.
+
+    python benchmarks/run.py --scale 10k --output results.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from dateutil import tz
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import SCALES, FRAGMENTS_PER_SESSION, write_corpus, queries
+from llm_stub import start_stub_server
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * pct / 100), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def _latency_stats(durations):
+    """Summarise per-request durations (seconds) in milliseconds."""
+    durations = sorted(durations)
+    total = sum(durations)
+    return {
+        "requests": len(durations),
+        "throughput_per_s": len(durations) / total if total else 0.0,
+        "p50_ms": _percentile(durations, 50) * 1000,
+        "p95_ms": _percentile(durations, 95) * 1000,
+        "p99_ms": _percentile(durations, 99) * 1000,
+    }
+
+def _peak_rss_mb():
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _timed(client, method, url, **kwargs):
+    start = time.perf_counter()
+    response = getattr(client, method)(url, **kwargs)
+    body = response.get_data()
+    elapsed = time.perf_counter() - start
+    response.close()
+    if response.status_code >= 400:
+        raise RuntimeError(f"{method.upper()} {url} returned {response.status_code}: {body[:200]!r}")
+    return elapsed, response
+
+def bench_ingest(client, path, url, records):
+    """Stream an NDJSON file to a bulk endpoint and report records/s."""
+    with open(path, 'rb') as f:
+        elapsed, response = _timed(client, "post", url, data=f, content_type="application/x-ndjson")
+    summary = json.loads(response.get_data().splitlines()[-1])["summary"]
+    return {
+        "records": records,
+        "seconds": elapsed,
+        "records_per_s": records / elapsed if elapsed else 0.0,
+        "summary": summary,
+    }
+
+def bench_fragment_listing(client, iterations):
+    durations = [_timed(client, "get", "/api/cortex/fragments?limit=100")[0] for _ in range(iterations)]
+    return _latency_stats(durations)
+
+def bench_stats(client, iterations):
+    durations = [_timed(client, "get", "/api/cortex/stats")[0] for _ in range(iterations)]
+    return _latency_stats(durations)
+
+def bench_memory_search(client, questions):
+    durations = [
+        _timed(client, "post", "/api/hippocampus/memories/search", json={"query": q, "limit": 10})[0]
+        for q in questions
+    ]
+    return _latency_stats(durations)
+
+def bench_memory_query(client, questions):
+    durations = [
+        _timed(client, "post", "/api/hippocampus/memories/query", json={"question": q})[0]
+        for q in questions
+    ]
+    return _latency_stats(durations)
+
+def bench_consolidation(client, iterations):
+    """Consolidate session-sized batches of unprocessed fragments into memories."""
+    _, response = _timed(client, "get", f"/api/cortex/fragments?processed=false&limit={iterations * FRAGMENTS_PER_SESSION}")
+    fragment_ids = [f["id"] for f in response.get_json()["data"]["fragments"]]
+    durations = []
+    for i in range(0, len(fragment_ids), FRAGMENTS_PER_SESSION):
+        batch = fragment_ids[i:i + FRAGMENTS_PER_SESSION]
+        durations.append(_timed(client, "post", "/api/cortex/fragments/process", json={"fragment_ids": batch})[0])
+    return _latency_stats(durations)
+
+def run(scale, seed=42, iterations=200, llm_latency_ms=0.0, memory_backend="sqlite", fragment_backend="sqlite"):
+    """Run every scenario in a temporary working directory and return the results."""
+    fragment_count = SCALES[scale]
+    workdir = tempfile.mkdtemp(prefix="engram-bench-")
+    stub, base_url = start_stub_server(latency_ms=llm_latency_ms)
+
+    # Must be set before the app modules are imported
+    os.environ["ENGRAM_LLM_BASE_URL"] = base_url
+    os.environ["ENGRAM_MEMORY_BACKEND"] = memory_backend
+    os.environ["ENGRAM_FRAGMENT_BACKEND"] = fragment_backend
+    os.chdir(workdir)
+
+    try:
+        print(f"Generating {scale} corpus in {workdir}...")
+        fragments_path, memories_path = write_corpus(os.path.join(workdir, "corpus"), fragment_count, seed)
+        with open(memories_path) as f:
+            memory_count = sum(1 for _ in f)
+
+        from main_app import create_app
+        client = create_app().test_client()
+        question_count = max(iterations // 4, 10)
+        questions = queries(question_count, seed)
+
+        results = {"scenarios": {}}
+        scenarios = results["scenarios"]
+
+        print("Ingesting fragments...")
+        scenarios["ingest_fragments"] = bench_ingest(
+            client, fragments_path, "/api/cortex/fragments/bulk?source=benchmark", fragment_count)
+        print("Ingesting memories...")
+        scenarios["ingest_memories"] = bench_ingest(
+            client, memories_path, "/api/hippocampus/memories/bulk", memory_count)
+        print("Listing fragments...")
+        scenarios["fragment_listing"] = bench_fragment_listing(client, iterations)
+        print("Reading stats...")
+        scenarios["stats"] = bench_stats(client, iterations)
+        print("Searching memories...")
+        scenarios["memory_search"] = bench_memory_search(client, queries(iterations, seed))
+        print("Consolidating fragments...")
+        scenarios["consolidation"] = bench_consolidation(client, max(iterations // 20, 3))
+        print("Querying memories...")
+        scenarios["memory_query"] = bench_memory_query(client, questions)
+
+        results.update({
+            "scale": scale,
+            "fragments": fragment_count,
+            "memories": memory_count,
+            "seed": seed,
+            "memory_backend": os.environ["ENGRAM_MEMORY_BACKEND"],
+            "fragment_backend": os.environ["ENGRAM_FRAGMENT_BACKEND"],
+            "llm_latency_ms": llm_latency_ms,
+            "peak_rss_mb": _peak_rss_mb(),
+            "commit": _git_commit(),
+            "timestamp": datetime.now(tz=tz.UTC).isoformat(),
+        })
+        return results
+    finally:
+        os.chdir(REPO_ROOT)
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the end-to-end Engram benchmark suite")
+    parser.add_argument("--scale", choices=SCALES, default="1k", help="Corpus size in fragments (default: 1k)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--iterations", type=int, default=200, help="Requests per latency scenario (default: 200)")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Latency added by the LLM stub (default: 0)")
+    parser.add_argument("--memory-backend", choices=["json", "sqlite", "memory"], default="sqlite",
+                        help="Memory storage backend (default: sqlite)")
+    parser.add_argument("--fragment-backend", choices=["sqlite", "memory"], default="sqlite",
+                        help="Fragment storage backend (default: sqlite)")
+    parser.add_argument("--output", help="Write results JSON to this file (default: stdout)")
+    args = parser.parse_args()
+
+    results = run(args.scale, args.seed, args.iterations, args.llm_latency_ms, args.memory_backend,
+                  args.fragment_backend)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+        print(f"Results written to {args.output}")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+LLM scheduler benchmark.
+
+Measures interactive latency (/api/cortex/memory/build) while bulk
+consolidation requests (/api/hippocampus/fragments/process) keep the LLM
+busy, against the offline stub with a fixed per-request latency and a
+limited number of requests served at once, like a saturated vLLM server.
+Runs three scenarios in a throwaway working directory: no background load,
+background load with every request sent straight to the server, and
+background load through the priority scheduler.
+
+    python benchmarks/scheduler_benchmark.py --bulk-clients 16 --llm-latency-ms 200
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from llm_stub import start_stub_server
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else None
+
+def _scenario(app, interactive_requests, bulk_clients, think_ms):
+    """Run interactive requests one after another while bulk clients loop; return latencies and counts."""
+    stop = threading.Event()
+    bulk = {"ok": 0, "shed": 0}
+    lock = threading.Lock()
+
+    def bulk_client():
+        client = app.test_client()
+        while not stop.is_set():
+            response = client.post("/api/hippocampus/fragments/process",
+                                   json={"fragments": ["rain", "old bookshop", "a letter from home"]})
+            with lock:
+                bulk["ok" if response.status_code == 200 else "shed"] += 1
+            if response.status_code != 200:
+                time.sleep(float(response.headers.get("Retry-After", 1)))
+
+    threads = [threading.Thread(target=bulk_client, daemon=True) for _ in range(bulk_clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5 if bulk_clients else 0)  # let the backlog build up
+
+    client = app.test_client()
+    latencies, shed = [], 0
+    started = time.perf_counter()
+    for i in range(interactive_requests):
+        request_started = time.perf_counter()
+        response = client.post("/api/cortex/memory/build", json={"content": f"coffee with an old friend {i}"})
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - request_started)
+        else:
+            shed += 1
+        time.sleep(think_ms / 1000)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        "interactive_p50_ms": round(_percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+        "interactive_p95_ms": round(_percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        "interactive_shed": shed,
+        "bulk_per_s": round(bulk["ok"] / elapsed, 2),
+        "bulk_shed": bulk["shed"],
+    }
+
+def run(interactive_requests, bulk_clients, llm_latency_ms, server_concurrency, max_in_flight, interactive_reserve,
+        think_ms):
+    workdir = tempfile.mkdtemp(prefix="engram-scheduler-bench-")
+    stub, base_url = start_stub_server(latency_ms=llm_latency_ms, max_concurrency=server_concurrency)
+
+    # Must be set before the app modules are imported
+    os.environ["ENGRAM_LLM_BASE_URL"] = base_url
+    os.environ.setdefault("ENGRAM_MEMORY_BACKEND", "memory")
+    os.chdir(workdir)
+
+    try:
+        from llm import scheduler
+        from main_app import create_app
+        # No warm-up: its completions would queue with the measured requests
+        app = create_app(warm_up=False)
+
+        results = {}
+        print("Idle...")
+        scheduler.configure(max_in_flight, interactive_reserve)
+        results["idle"] = _scenario(app, interactive_requests, 0, think_ms)
+
+        print("Background load, unscheduled...")
+        scheduler.configure(max_in_flight=10 ** 6, interactive_reserve=0, budgets={})
+        results["unscheduled"] = _scenario(app, interactive_requests, bulk_clients, think_ms)
+
+        print("Background load, scheduled...")
+        scheduler.configure(max_in_flight, interactive_reserve)
+        results["scheduled"] = _scenario(app, interactive_requests, bulk_clients, think_ms)
+
+        return {
+            "interactive_requests": interactive_requests,
+            "bulk_clients": bulk_clients,
+            "llm_latency_ms": llm_latency_ms,
+            "server_concurrency": server_concurrency,
+            "max_in_flight": max_in_flight,
+            "interactive_reserve": interactive_reserve,
+            "scenarios": results,
+        }
+    finally:
+        os.chdir(REPO_ROOT)
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark interactive LLM latency under background load")
+    parser.add_argument("--interactive-requests", type=int, default=40, help="Interactive requests per scenario (default: 40)")
+    parser.add_argument("--bulk-clients", type=int, default=12, help="Concurrent bulk clients (default: 12)")
+    parser.add_argument("--llm-latency-ms", type=float, default=100.0, help="Latency of each stub request (default: 100)")
+    parser.add_argument("--server-concurrency", type=int, default=4, help="Requests the stub serves at once (default: 4)")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Scheduler slots (default: 4)")
+    parser.add_argument("--interactive-reserve", type=int, default=1, help="Slots kept for interactive requests (default: 1)")
+    parser.add_argument("--think-ms", type=float, default=20.0, help="Pause between interactive requests (default: 20)")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.interactive_requests, args.bulk_clients, args.llm_latency_ms, args.server_concurrency,
+                         args.max_in_flight, args.interactive_reserve, args.think_ms), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Fragment segmenter benchmark.
+
+Checks that the span-based segmenter returns exactly the fragments of the
+previous regex-split implementation (kept below as the reference) on a
+golden corpus: hand-written edge cases, seeded synthetic journal text and
+seeded random strings built from delimiters, conjunctions and unusual
+whitespace. Then times both on a large synthetic journal text and on the
+repository's documentation repeated to the same size, and reports the
+speedup and the peak memory each allocates. Exits non-zero on any mismatch.
+
+    python benchmarks/segmenter_benchmark.py --fragments 50000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import generate_fragments
+from modules.cortex.processor import extract_fragments_from_text
+from modules.cortex.segmenter import segment
+
+EDGE_CASES = [
+    "",
+    "   ",
+    "...!?",
+    "Hello",
+    "  padded sentence here.  ",
+    "one two three four five",
+    "one two three four five six",
+    "one, two, three, four, five",
+    "one, two, three, four, five, six",
+    "we went out and had fun, then came home or slept but it rained",
+    "and then we left and we came back home later on",
+    "the sand and the sea and the sky were all so very blue",
+    "a and and b and c and d and e and f",
+    "cats and\tdogs and\nbirds and fish and mice went by",
+    "multiple   spaces   between   the   words   here , and ; more",
+    "e.g. this splits. Mr. Smith went to Washington!!! Really?! Yes...",
+    "trailing conjunction in a long sentence goes here and",
+    "Und ANDERE Wörter: naïve café résumé, coöperate and façade were here today",
+    "tabs\tand\ttabs\tand\ttabs\tand\ttabs go here",
+    ";;;,,, , ; ,;",
+    " line separators and more words to make it long enough",
+    "short one. A much longer sentence that has commas, conjunctions and more!",
+]
+
+def reference_extract(text):
+    """The regex-split segmentation the span segmenter replaced."""
+    fragments = []
+    for sentence in re.split(r'[.!?]+', text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence.split()) <= 5:
+            fragments.append(sentence)
+        else:
+            for part in re.split(r'[,;]|\sand\s|\sor\s|\sbut\s', sentence):
+                part = part.strip()
+                if part and len(part.split()) >= 2:
+                    fragments.append(part)
+    return [f for f in fragments if f]
+
+def journal_text(count, seed):
+    """Synthetic fragments joined into running prose."""
+    rng = random.Random(seed)
+    pieces = []
+    for record in generate_fragments(count, seed):
+        pieces.append(record["content"])
+        pieces.append(rng.choice([". ", ", and ", "; ", "! ", " but ", "? ", ", ", " or "]))
+    return "".join(pieces)
+
+def random_texts(count, seed):
+    """Random strings dense in boundaries, conjunctions and odd whitespace."""
+    rng = random.Random(seed)
+    tokens = ["word", "and", "or", "but", "sand", "band", "or.", "but,", "x", "AND", "Ω", "ünï",
+              ".", "!", "?", "...", ",", ";", " ", "  ", "\t", "\n", " ", " ", "\x1c", "\r\n"]
+    return ["".join(rng.choice(tokens) + rng.choice(["", " "]) for _ in range(rng.randint(0, 60)))
+            for _ in range(count)]
+
+def check_golden(seed):
+    """Compare against the reference; returns the number of texts and the mismatches."""
+    texts = EDGE_CASES + [journal_text(2000, seed)] + random_texts(20000, seed)
+    mismatches = [text for text in texts if extract_fragments_from_text(text) != reference_extract(text)]
+    return len(texts), mismatches
+
+def _best(func, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(text)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def _peak_kb(func, text):
+    """Peak memory allocated while func runs."""
+    tracemalloc.start()
+    func(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return round(peak / 1024)
+
+def prose_text(size):
+    """The repository's own documentation, repeated to about size characters."""
+    docs = ""
+    for name in ("README.md", "VISION.md", "TODO.md"):
+        with open(os.path.join(REPO_ROOT, name), encoding="utf-8") as f:
+            docs += f.read()
+    return docs * max(1, size // len(docs))
+
+def _time(text, repeat):
+    reference_s, reference = _best(reference_extract, text, repeat)
+    spans_s, _ = _best(lambda text: sum(1 for _ in segment(text)), text, repeat)
+    fragments_s, fragments = _best(extract_fragments_from_text, text, repeat)
+    return {
+        "text_mb": round(len(text.encode()) / 1e6, 2),
+        "fragments": len(fragments),
+        "matches_reference": fragments == reference,
+        "reference_ms": round(reference_s * 1000, 1),
+        "spans_ms": round(spans_s * 1000, 1),
+        "fragments_ms": round(fragments_s * 1000, 1),
+        "speedup": round(reference_s / fragments_s, 2),
+        "reference_peak_kb": _peak_kb(reference_extract, text),
+        "fragments_peak_kb": _peak_kb(extract_fragments_from_text, text),
+    }
+
+def run(fragment_count, repeat, seed):
+    print("Checking the golden corpus...")
+    checked, mismatches = check_golden(seed)
+
+    print(f"Timing on {fragment_count} synthetic fragments of journal text...")
+    journal = journal_text(fragment_count, seed)
+    timings = {"journal": _time(journal, repeat)}
+    print("Timing on documentation prose of the same size...")
+    timings["prose"] = _time(prose_text(len(journal)), repeat)
+
+    return {
+        "golden": {"texts": checked, "mismatches": len(mismatches), "examples": mismatches[:3]},
+        "timings": timings,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and check the fragment segmenter")
+    parser.add_argument("--fragments", type=int, default=50000, help="Synthetic fragments in the timed text (default: 50000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs, best is reported (default: 5)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    args = parser.parse_args()
+
+    result = run(args.fragments, args.repeat, args.seed)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if result["golden"]["mismatches"] or not all(t["matches_reference"] for t in result["timings"].values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Image description throughput benchmark.
+
+Uploads seeded synthetic photos through the vision API, queues them all for
+description and waits for the job queue to drain, against the offline LLM
+stub with a configurable per-request latency. Reports images described per
+second for the chosen batch size and concurrency, in a throwaway working
+directory.
+
+    python benchmarks/vision_benchmark.py --images 500 --llm-latency-ms 300 --batch-size 8
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from llm_stub import start_stub_server
+
+def _photo(rng, size=256):
+    """A random blocky RGB image, so every photo has a different perceptual hash."""
+    import numpy as np
+    from PIL import Image
+    blocks = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    return Image.fromarray(np.kron(blocks, np.ones((size // 8, size // 8, 1), dtype=np.uint8)))
+
+def run(count, batch_size, concurrency, llm_latency_ms, seed, timeout):
+    import numpy as np
+
+    workdir = tempfile.mkdtemp(prefix="engram-vision-bench-")
+    stub, base_url = start_stub_server(latency_ms=llm_latency_ms)
+
+    # Must be set before the app modules are imported
+    os.environ["ENGRAM_LLM_BASE_URL"] = base_url
+    os.environ["ENGRAM_VISION_BATCH_SIZE"] = str(batch_size)
+    os.environ["ENGRAM_VISION_CONCURRENCY"] = str(concurrency)
+    os.chdir(workdir)
+
+    try:
+        from main_app import create_app
+        client = create_app().test_client()
+        rng = np.random.default_rng(seed)
+
+        print(f"Uploading {count} images...")
+        image_ids = []
+        started = time.perf_counter()
+        for i in range(count):
+            buffer = io.BytesIO()
+            _photo(rng).save(buffer, "JPEG", quality=85)
+            buffer.seek(0)
+            response = client.post("/api/vision/images", data={"image": (buffer, f"photo-{i}.jpg")},
+                                   content_type="multipart/form-data")
+            image_ids.extend(image["id"] for image in response.get_json()["data"]["images"])
+        upload_seconds = time.perf_counter() - started
+
+        print("Describing...")
+        started = time.perf_counter()
+        client.post("/api/vision/describe/batch", json={"image_ids": image_ids})
+        while time.perf_counter() - started < timeout:
+            if client.get("/api/vision/jobs").get_json()["data"]["pending"] == 0:
+                break
+            time.sleep(0.05)
+        describe_seconds = time.perf_counter() - started
+        stats = client.get("/api/vision/jobs").get_json()["data"]
+        fragments = client.get("/api/cortex/fragments").get_json()["data"]["fragments"]
+
+        return {
+            "images": count,
+            "batch_size": batch_size,
+            "concurrency": concurrency,
+            "llm_latency_ms": llm_latency_ms,
+            "uploads_per_s": count / upload_seconds,
+            "describe_seconds": describe_seconds,
+            "images_per_s": count / describe_seconds,
+            "reported_images_per_s": stats["images_per_second"],
+            "pending": stats["pending"],
+            "image_fragments": sum(1 for f in fragments if f["source"].startswith("image:")),
+        }
+    finally:
+        os.chdir(REPO_ROOT)
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched image description")
+    parser.add_argument("--images", type=int, default=200, help="Images to describe (default: 200)")
+    parser.add_argument("--batch-size", type=int, default=4, help="Images per model request (default: 4)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Model requests in flight (default: 4)")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="Latency of each stub request (default: 200)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Give up after this many seconds (default: 600)")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.images, args.batch_size, args.concurrency, args.llm_latency_ms,
+                         args.seed, args.timeout), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Startup warm-up benchmark.
+
+Stores a seeded synthetic corpus (fragments and memories, in the default
+JSON memory store), then starts the app in a fresh process twice against
+the offline LLM stub with its simulated prefix cache: once without warm-up
+and once waiting for /api/ready. Reports how long warm-up took, and the
+latency of the first request to each endpoint next to the median of the
+requests that follow, in a throwaway working directory.
+
+    python benchmarks/warmup_benchmark.py --fragments 100000 --prefill-ms-per-token 0.2
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import generate_fragments, generate_memories, queries
+from llm_stub import start_stub_server
+
+# Requests timed after startup: the first of each, then `repeat` more
+ENDPOINTS = [
+    ("stats", "GET", "/api/cortex/stats", None),
+    ("summary", "GET", "/api/hippocampus/summaries?period=2022", None),
+    ("search", "POST", "/api/hippocampus/memories/search", lambda question: {"query": question}),
+    ("query", "POST", "/api/hippocampus/memories/query", lambda question: {"question": question}),
+]
+
+def _request(client, method, path, payload, question):
+    started = time.perf_counter()
+    if method == "GET":
+        client.get(path).get_data()
+    else:
+        client.post(path, json=payload(question)).get_data()
+    return time.perf_counter() - started
+
+def setup(fragment_count, seed):
+    """Store the corpus and build the summary index, as a previous run would have."""
+    from main_app import create_app
+    client = create_app(warm_up=False).test_client()
+    body = "".join(json.dumps(record) + "\n" for record in generate_fragments(fragment_count, seed))
+    client.post("/api/cortex/fragments/bulk", data=body, content_type="application/x-ndjson").get_data()
+    body = "".join(json.dumps(memory) + "\n" for memory in generate_memories(fragment_count, seed))
+    client.post("/api/hippocampus/memories/bulk", data=body, content_type="application/x-ndjson").get_data()
+    client.get("/api/hippocampus/summaries?period=2022").get_data()
+
+def serve(warm_up, repeat, seed):
+    """Start the app, optionally wait until it is ready, and time the endpoints."""
+    started = time.perf_counter()
+    from main_app import create_app
+    app = create_app(warm_up=warm_up)
+    client = app.test_client()
+    result = {"create_app_s": round(time.perf_counter() - started, 2)}
+    if warm_up:
+        while client.get("/api/ready").status_code != 200:
+            time.sleep(0.01)
+        result["ready_s"] = round(time.perf_counter() - started, 2)
+
+    questions = queries(repeat + 1, seed)
+    for name, method, path, payload in ENDPOINTS:
+        first = _request(client, method, path, payload, questions[0])
+        steady = [_request(client, method, path, payload, question) for question in questions[1:]]
+        result[name] = {"first_ms": round(first * 1000, 1), "steady_ms": round(statistics.median(steady) * 1000, 1)}
+    return result
+
+def _child(phase, workdir, env, *args):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--phase", phase, *map(str, args)],
+                            cwd=workdir, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output[output.index("{"):]) if phase != "setup" else None
+
+def run(fragment_count, repeat, prefill_ms_per_token, seed):
+    workdir = tempfile.mkdtemp(prefix="engram-warmup-bench-")
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT}
+    try:
+        print(f"Storing {fragment_count} fragments and their memories...")
+        stub, env["ENGRAM_LLM_BASE_URL"] = start_stub_server()
+        _child("setup", workdir, env, "--fragments", fragment_count, "--seed", seed)
+        stub.shutdown()
+
+        results = {}
+        for scenario, warm_up in (("cold", 0), ("warm", 1)):
+            print(f"Starting the app {'with' if warm_up else 'without'} warm-up...")
+            # A fresh stub each time, so the prefix cache starts empty
+            stub, env["ENGRAM_LLM_BASE_URL"] = start_stub_server(prefill_ms_per_token=prefill_ms_per_token)
+            results[scenario] = _child("serve", workdir, env, "--warm-up", warm_up, "--repeat", repeat, "--seed", seed)
+            stub.shutdown()
+        return {"fragments": fragment_count, "prefill_ms_per_token": prefill_ms_per_token, "results": results}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark first-request latency with and without warm-up")
+    parser.add_argument("--fragments", type=int, default=100000, help="Fragments to store (default: 100000)")
+    parser.add_argument("--repeat", type=int, default=20, help="Requests after the first, per endpoint (default: 20)")
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.2,
+                        help="Stub delay per prompt token not in the prefix cache (default: 0.2)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--phase", choices=["setup", "serve"], help=argparse.SUPPRESS)
+    parser.add_argument("--warm-up", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase == "setup":
+        setup(args.fragments, args.seed)
+    elif args.phase == "serve":
+        print(json.dumps(serve(bool(args.warm_up), args.repeat, args.seed)))
+    else:
+        print(json.dumps(run(args.fragments, args.repeat, args.prefill_ms_per_token, args.seed), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Letta write-behind benchmark.
+
+Runs the Letta memory engine against a fake Letta client with a fixed
+latency per call, so it needs neither Letta nor a server. Stores memories
+from concurrent writers with and without the write-behind outbox and
+reports write latency, how long the outbox takes to drain and the batch
+sizes the client received. Then checks the failure paths: a client that
+fails its first calls (retried), one that always fails (stored locally
+after MAX_ATTEMPTS) and one that hangs (writers get WriteBufferFull once
+the outbox is full), in a throwaway working directory.
+
+    python benchmarks/write_behind_benchmark.py --memories 2000 --writers 8 --letta-latency-ms 50
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+
+class FakeMemory:
+    """Stands in for letta_client.schemas.Memory."""
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+class FakeLettaClient:
+    """Records the batches it receives; fails its first `fail_calls` calls, or every call."""
+    def __init__(self, latency_ms=0.0, fail_calls=0):
+        self.latency = latency_ms / 1000
+        self.fail_calls = fail_calls
+        self.calls = 0
+        self.batches = []
+        self.ids = set()
+        self._lock = threading.Lock()
+
+    def add_memories(self, memories):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            if self.fail_calls < 0 or self.calls <= self.fail_calls:
+                raise ConnectionError("Letta is unavailable")
+            self.batches.append(len(memories))
+            self.ids.update(memory.id for memory in memories)
+
+def _memories(count):
+    return [{"id": str(uuid.uuid4()), "text": f"memory {i}", "metadata": {}} for i in range(count)]
+
+def _engine(client, workdir, buffered, max_pending=None):
+    """A Letta engine with a fresh outbox, writing to client and falling back to an in-process store."""
+    from llm.storage import MemoryEngine
+    from llm.write_behind import MAX_PENDING, WriteBehindBuffer
+    from modules.hippocampus import backends
+    backends.letta_client = client
+    backends.LettaMemory = FakeMemory
+    local = MemoryEngine()
+    buffer = None
+    if buffered:
+        buffer = WriteBehindBuffer(write=backends.LettaMemoryEngine.write,
+                                   fallback=lambda items: local.put_many("memories", items),
+                                   path=os.path.join(workdir, f"outbox-{uuid.uuid4().hex}.db"),
+                                   max_pending=max_pending or MAX_PENDING)
+        buffer.start()
+    return backends.LettaMemoryEngine(local, buffer), local
+
+def _drain(engine, timeout=120):
+    started = time.perf_counter()
+    while engine.buffer.pending():
+        if time.perf_counter() - started > timeout:
+            raise RuntimeError(f"Outbox still has {engine.buffer.pending()} items after {timeout}s")
+        time.sleep(0.01)
+    return time.perf_counter() - started
+
+def throughput(workdir, memory_count, writers, latency_ms, buffered):
+    """Store memories one per request from concurrent writers."""
+    client = FakeLettaClient(latency_ms)
+    engine, _ = _engine(client, workdir, buffered)
+    memories = _memories(memory_count)
+
+    def put(memory):
+        started = time.perf_counter()
+        engine.put_many("memories", [memory])
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(writers) as pool:
+        durations = list(pool.map(put, memories))
+    elapsed = time.perf_counter() - started
+    drain = _drain(engine) if buffered else 0.0
+
+    return {
+        "writes_per_s": round(memory_count / elapsed, 1),
+        "p50_ms": round(statistics.median(durations) * 1000, 2),
+        "p99_ms": round(statistics.quantiles(durations, n=100)[98] * 1000, 2),
+        "drain_s": round(drain, 2),
+        "letta_calls": client.calls,
+        "mean_batch": round(statistics.mean(client.batches), 1),
+        "all_written": client.ids == {memory["id"] for memory in memories},
+    }
+
+def retry(workdir, memory_count, fail_calls):
+    """The client fails its first calls; every memory still reaches it, and none the fallback."""
+    client = FakeLettaClient(fail_calls=fail_calls)
+    engine, local = _engine(client, workdir, True)
+    memories = _memories(memory_count)
+    engine.put_many("memories", memories)
+    drain = _drain(engine)
+    return {
+        "failed_calls": fail_calls,
+        "drain_s": round(drain, 2),
+        "all_written": client.ids == {memory["id"] for memory in memories},
+        "stored_locally": local.count("memories"),
+    }
+
+def fallback(workdir, memory_count):
+    """The client always fails; after MAX_ATTEMPTS every memory is stored locally."""
+    from llm.write_behind import MAX_ATTEMPTS
+    client = FakeLettaClient(fail_calls=-1)
+    engine, local = _engine(client, workdir, True)
+    memories = _memories(memory_count)
+    engine.put_many("memories", memories)
+    drain = _drain(engine)
+    return {
+        "max_attempts": MAX_ATTEMPTS,
+        "drain_s": round(drain, 2),
+        "letta_calls": client.calls,
+        "all_stored_locally": {m["id"] for m in local.scan("memories")} == {m["id"] for m in memories},
+    }
+
+def backpressure(workdir, max_pending):
+    """The client hangs; once max_pending memories wait, writers get WriteBufferFull."""
+    from llm.write_behind import BACKPRESSURE_TIMEOUT_SECONDS, WriteBufferFull
+    client = FakeLettaClient(latency_ms=3600 * 1000)
+    engine, _ = _engine(client, workdir, True, max_pending=max_pending)
+    engine.put_many("memories", _memories(max_pending))
+    started = time.perf_counter()
+    try:
+        engine.put_many("memories", _memories(1))
+        rejected = False
+    except WriteBufferFull:
+        rejected = True
+    return {
+        "max_pending": max_pending,
+        "rejected": rejected,
+        "waited_s": round(time.perf_counter() - started, 2),
+        "timeout_s": BACKPRESSURE_TIMEOUT_SECONDS,
+    }
+
+def run(memory_count, writers, latency_ms, max_backoff):
+    workdir = tempfile.mkdtemp(prefix="engram-write-behind-bench-")
+    os.chdir(workdir)
+    try:
+        from llm import write_behind
+        # Keep the retry and backpressure scenarios short
+        write_behind.MAX_BACKOFF_SECONDS = max_backoff
+        write_behind.BACKPRESSURE_TIMEOUT_SECONDS = 1.0
+
+        results = {}
+        for mode, buffered in (("direct", False), ("write_behind", True)):
+            print(f"Storing {memory_count} memories from {writers} writers ({mode})...")
+            results[mode] = throughput(workdir, memory_count, writers, latency_ms, buffered)
+        print("Checking retry, fallback and backpressure...")
+        results["retry"] = retry(workdir, 250, fail_calls=3)
+        results["fallback"] = fallback(workdir, 250)
+        results["backpressure"] = backpressure(workdir, 100)
+        return {"memories": memory_count, "writers": writers, "letta_latency_ms": latency_ms,
+                "max_backoff_s": max_backoff, "results": results}
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Letta write-behind outbox with a fake client")
+    parser.add_argument("--memories", type=int, default=2000, help="Memories to store per mode (default: 2000)")
+    parser.add_argument("--writers", type=int, default=8, help="Concurrent writers (default: 8)")
+    parser.add_argument("--letta-latency-ms", type=float, default=50.0,
+                        help="Latency of each fake Letta call (default: 50)")
+    parser.add_argument("--max-backoff-s", type=float, default=0.05,
+                        help="Retry backoff cap, shortened so failures resolve quickly (default: 0.05)")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.memories, args.writers, args.letta_latency_ms, args.max_backoff_s), indent=2))
+
+if __name__ == "__main__":
+    main()
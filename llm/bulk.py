@@ -0,0 +1,104 @@
+import json
+from datetime import datetime
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+from flask import Response, stream_with_context
+
+# Records committed per transaction unless the caller asks otherwise
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 50000
+
+def iter_ndjson(stream: Iterable[bytes]) -> Iterator[Tuple[int, Any, Optional[str]]]:
+    """
+    Incrementally parse a newline-delimited JSON stream.
+
+    Yields (line_number, record, error) for every non-blank line. Only one
+    line is held in memory at a time, so the stream can be arbitrarily large.
+    """
+    for line_number, raw in enumerate(stream, 1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            yield line_number, json.loads(raw), None
+        except (ValueError, UnicodeDecodeError) as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+
+def bulk_ingest(stream: Iterable[bytes],
+                prepare: Callable[[Any], Any],
+                commit: Callable[[List[Any]], List[Any]],
+                batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[str]:
+    """
+    Parse an NDJSON stream, commit records in batches and yield status lines.
+
+    Args:
+        stream: Binary line iterator, e.g. ``request.stream``
+        prepare: Turns one parsed record into a commit item, raising
+            ValueError if the record is invalid
+        commit: Stores a list of items in one transaction and returns one
+            result (e.g. the new ids) per item
+        batch_size: Number of items per commit
+
+    Yields one JSON status line per input line, in input order, followed by
+    a final summary line.
+    """
+    pending = []   # (line_number, item) waiting for the next commit
+    statuses = []  # status dicts for lines up to the end of the current batch
+    totals = {"lines": 0, "ok": 0, "failed": 0, "batches": 0}
+
+    def flush():
+        if pending:
+            items = [item for _, item in pending]
+            totals["batches"] += 1
+            try:
+                results = commit(items)
+                for (line_number, _), result in zip(pending, results):
+                    statuses.append({"line": line_number, "status": "ok", "result": result})
+                totals["ok"] += len(pending)
+            except Exception as e:
+                for line_number, _ in pending:
+                    statuses.append({"line": line_number, "status": "error", "error": f"Commit failed: {e}"})
+                totals["failed"] += len(pending)
+            pending.clear()
+        statuses.sort(key=lambda status: status["line"])
+        lines = "".join(json.dumps(status) + "\n" for status in statuses)
+        statuses.clear()
+        return lines
+
+    for line_number, record, error in iter_ndjson(stream):
+        totals["lines"] += 1
+        if error is None:
+            try:
+                pending.append((line_number, prepare(record)))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            statuses.append({"line": line_number, "status": "error", "error": error})
+            totals["failed"] += 1
+
+        if len(pending) >= batch_size or len(statuses) >= batch_size:
+            yield flush()
+
+    yield flush()
+    yield json.dumps({"summary": totals}) + "\n"
+
+def parse_created_at(value: Any) -> Optional[str]:
+    """Check a record's optional 'created_at' is an ISO 8601 timestamp, raising ValueError if not."""
+    if value is None:
+        return None
+    try:
+        datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'created_at' must be an ISO 8601 timestamp, got {value!r}")
+    return value
+
+def parse_batch_size(value: Optional[int]) -> Optional[int]:
+    """Validate a requested batch size, returning None if it is out of range."""
+    if value is None:
+        return DEFAULT_BATCH_SIZE
+    if value < 1 or value > MAX_BATCH_SIZE:
+        return None
+    return value
+
+def ndjson_response(lines: Iterator[str]) -> Response:
+    """Stream status lines back to the client as they are produced."""
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
@@ -1,13 +1,36 @@
 import openai
 import os
+import re
 import requests
+import threading
+import time
+import weakref
 from typing import Optional
+from . import scheduler
+from .prompts import DEFAULT_SYSTEM_MESSAGE, get_prompt, list_prompts
+from .tokens import count_tokens, record_usage
+from .warmup import register_warmup
+from .metrics import llm_request_duration, llm_tokens, llm_errors, prompt_tokens, record_cache
+from .profiling import span
+
+# OpenAI-compatible server all modules talk to
+LLM_BASE_URL = os.environ.get("ENGRAM_LLM_BASE_URL", "http://localhost:8000/v1")
+
+# After an embeddings request fails (e.g. the model serves no embeddings
+# endpoint), embed() returns None without calling the server for this long
+EMBED_RETRY_SECONDS = float(os.environ.get("ENGRAM_EMBED_RETRY_SECONDS", "300"))
+
+# "3. A dog on a beach" - one line per image in batched vision replies
+NUMBERED_LINE = re.compile(r"^\s*(\d+)[.):]\s*(.+)$")
+
+# Every client created in this process, so they can be reconnected after fork
+_clients = weakref.WeakSet()
 
 class LLMClient:
     """
     A client for interacting with a local vLLM server that mimics the OpenAI API.
     """
-    def __init__(self, base_url="http://localhost:8000/v1", api_key="not-needed", module_name="shared"):
+    def __init__(self, base_url=LLM_BASE_URL, api_key="not-needed", module_name="shared"):
         """
         Initializes the client to connect to the specified server endpoint.
         
@@ -18,19 +41,35 @@ class LLMClient:
         """
         self.base_url = base_url
         self.module_name = module_name
+        self.api_key = api_key
+        self._connect()
+        self._model_name = None
+        self._model_lock = threading.Lock()
+        self._embed_retry_at = 0.0  # monotonic time before which embed() doesn't try
+        _clients.add(self)
+
+    def _connect(self):
+        """Create the underlying OpenAI client and its connection pool."""
         self.client = openai.OpenAI(
-            base_url=base_url,
-            api_key=api_key
+            base_url=self.base_url,
+            api_key=self.api_key
         )
-        # Fetch the actual model name from the server
-        self.model_name = self._get_model_name()
+
+    @property
+    def model_name(self):
+        """The served model's name, fetched from the server on first use (or by warm-up)."""
+        if self._model_name is None:
+            with self._model_lock:
+                if self._model_name is None:
+                    self._model_name = self._get_model_name()
+        return self._model_name
 
     def _get_model_name(self):
         """
         Fetch the actual model name from the vLLM server's /v1/models endpoint.
         """
         try:
-            response = requests.get(f"{self.base_url}/models")
+            response = requests.get(f"{self.base_url}/models", timeout=10)
             if response.status_code == 200:
                 models_data = response.json()
                 if models_data.get("data") and len(models_data["data"]) > 0:
@@ -54,25 +93,117 @@ class LLMClient:
         messages.append({"role": "user", "content": prompt})
         return messages
 
-    def query(self, prompt: str, system_message: Optional[str] = None, max_tokens: int = 1000, temperature: float = 0.7):
+    def _record_prefix_cache(self, usage, prompt_id: Optional[str]):
+        """
+        Count prompt tokens served from vLLM's prefix cache. The server
+        reports them when started with --enable-prompt-tokens-details.
+        """
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None)
+        if cached is None:
+            return
+        record_cache("llm_prefix", hit=True, count=cached)
+        record_cache("llm_prefix", hit=False, count=usage.prompt_tokens - cached)
+        prompt_tokens.inc(cached, prompt=prompt_id or "none", result="hit")
+        prompt_tokens.inc(usage.prompt_tokens - cached, prompt=prompt_id or "none", result="miss")
+
+    def query(self, prompt: str, system_message: Optional[str] = None, max_tokens: int = 1000, temperature: float = 0.7,
+              prompt_id: Optional[str] = None):
         """
         Sends a prompt to the local vLLM server and returns the completion.
+        `prompt_id` names the template the prompt was rendered from (see
+        llm/prompts.py) for the prefix cache metrics.
+        Raises scheduler.LLMBusy if the server is too busy to take the request.
         """
         messages = self._prepare_messages(prompt, system_message)
+        estimate = sum(count_tokens(m["content"]) for m in messages) + max_tokens
         
-        try:
-            completion = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
-            response = completion.choices[0].message.content
-            return response
-        except Exception as e:
-            print(f"Error in {self.module_name} LLM query: {e}")
-            print("Please ensure the vLLM server is running at the specified endpoint.")
+        with scheduler.slot(self.module_name, estimate) as request:
+            try:
+                with span("llm_query"), llm_request_duration.time(module=self.module_name, operation="chat"):
+                    completion = self.client.chat.completions.create(
+                        model=self.model_name,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=temperature
+                    )
+                response = completion.choices[0].message.content
+                if completion.usage:
+                    request.used(completion.usage.total_tokens)
+                    record_usage(sum(len(m["content"]) for m in messages), completion.usage.prompt_tokens)
+                    self._record_prefix_cache(completion.usage, prompt_id)
+                    llm_tokens.inc(completion.usage.prompt_tokens, module=self.module_name, kind="prompt")
+                    llm_tokens.inc(completion.usage.completion_tokens, module=self.module_name, kind="completion")
+                return response
+            except Exception as e:
+                llm_errors.inc(module=self.module_name, operation="chat")
+                print(f"Error in {self.module_name} LLM query: {e}")
+                print("Please ensure the vLLM server is running at the specified endpoint.")
+                return None
+
+    def embed(self, texts):
+        """
+        Get embedding vectors for a list of texts from the server's embeddings endpoint.
+        Returns None if the server does not serve embeddings; after a failure
+        it returns None right away for EMBED_RETRY_SECONDS.
+        """
+        if time.monotonic() < self._embed_retry_at:
             return None
+        with scheduler.slot(self.module_name, sum(count_tokens(text) for text in texts)) as request:
+            try:
+                with span("llm_embed"), llm_request_duration.time(module=self.module_name, operation="embed"):
+                    response = self.client.embeddings.create(model=self.model_name, input=texts)
+                if response.usage:
+                    request.used(response.usage.prompt_tokens)
+                    llm_tokens.inc(response.usage.prompt_tokens, module=self.module_name, kind="embedding")
+                return [item.embedding for item in response.data]
+            except Exception as e:
+                llm_errors.inc(module=self.module_name, operation="embed")
+                self._embed_retry_at = time.monotonic() + EMBED_RETRY_SECONDS
+                print(f"Error in {self.module_name} embedding request, not retrying for {EMBED_RETRY_SECONDS:.0f}s: {e}")
+                return None
+
+    def describe_images(self, image_urls, prompt: str, max_tokens: int = 1000, temperature: float = 0.2):
+        """
+        Describe several images in one multimodal chat request. `image_urls`
+        are http(s) or data: URLs. Returns one description per image, or
+        None if the request failed or the reply did not have one numbered
+        line per image.
+        """
+        content = [{"type": "text", "text": prompt}]
+        content.extend({"type": "image_url", "image_url": {"url": url}} for url in image_urls)
+        messages = [{"role": "user", "content": content}]
+
+        # Image tokens are only known once the server reports usage
+        with scheduler.slot(self.module_name, count_tokens(prompt) + max_tokens) as request:
+            try:
+                with span("llm_describe_images"), llm_request_duration.time(module=self.module_name, operation="vision"):
+                    completion = self.client.chat.completions.create(
+                        model=self.model_name,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=temperature
+                    )
+                if completion.usage:
+                    request.used(completion.usage.total_tokens)
+                    llm_tokens.inc(completion.usage.prompt_tokens, module=self.module_name, kind="prompt")
+                    llm_tokens.inc(completion.usage.completion_tokens, module=self.module_name, kind="completion")
+            except Exception as e:
+                llm_errors.inc(module=self.module_name, operation="vision")
+                print(f"Error in {self.module_name} vision request: {e}")
+                return None
+
+        reply = (completion.choices[0].message.content or "").strip()
+        descriptions = {}
+        for line in reply.splitlines():
+            match = NUMBERED_LINE.match(line)
+            if match and 1 <= int(match.group(1)) <= len(image_urls):
+                descriptions.setdefault(int(match.group(1)), match.group(2).strip())
+        if len(image_urls) == 1 and not descriptions and reply:
+            return [reply]  # models often skip the number for a single image
+        if len(descriptions) != len(image_urls):
+            return None
+        return [descriptions[i] for i in range(1, len(image_urls) + 1)]
 
     def get_available_models(self):
         """
@@ -87,6 +218,39 @@ class LLMClient:
             print(f"Error fetching models for {self.module_name}: {e}")
             return None
 
+def _reconnect_after_fork():
+    """
+    Give each forked worker its own connection pools. Sockets inherited from
+    the parent process would otherwise be shared between workers.
+    """
+    for client in list(_clients):
+        client._connect()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reconnect_after_fork)
+
+def _warm_up_clients():
+    """
+    Discover the model and open a connection for every client, then send a
+    one-token completion with each prompt template's system message, so
+    vLLM's prefix cache already holds them when the first requests arrive.
+    """
+    clients = list(_clients)
+    if not clients:
+        return
+    systems = [DEFAULT_SYSTEM_MESSAGE]
+    for name in list_prompts():
+        system = get_prompt(name).system
+        if system not in systems:
+            systems.append(system)
+    with scheduler.priority(scheduler.BACKGROUND):
+        for i, system in enumerate(systems + [DEFAULT_SYSTEM_MESSAGE] * (len(clients) - len(systems))):
+            client = clients[i % len(clients)]
+            if client.query("Hi", system_message=system, max_tokens=1, temperature=0, prompt_id="warmup") is None:
+                raise RuntimeError(f"Warm-up completion failed for {client.module_name}")
+
+register_warmup("llm", _warm_up_clients)
+
 # Create client instances for different modules
 def create_llm_client(module_name: str):
     """Create an LLM client for a specific module."""
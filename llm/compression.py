@@ -0,0 +1,125 @@
+# Negotiated compression for API responses
+#
+# JSON and NDJSON responses of at least COMPRESS_MIN_BYTES are compressed
+# with the best encoding the client accepts: zstd (when the zstandard
+# package is installed) or gzip. Streamed responses are compressed chunk by
+# chunk and flushed after each chunk, so clients still receive data as it
+# is produced. Static assets (precompressed, with ETags per variant),
+# images and responses that set their own Content-Encoding are left alone.
+
+import os
+import zlib
+from llm.metrics import counter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = int(os.environ.get("ENGRAM_COMPRESS_MIN_BYTES", "1024"))
+
+# Fast levels: dynamic responses are compressed on every request
+GZIP_LEVEL = 3
+ZSTD_LEVEL = 3
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# Preferred first when the client accepts both equally
+ENCODINGS = ("zstd", "gzip") if zstandard else ("gzip",)
+
+response_bytes = counter(
+    "engram_http_response_bytes_total", "Compressible API response bytes by encoding, before and after compression")
+
+class _GzipStream:
+    """Incremental gzip with a flush after every chunk."""
+    def __init__(self):
+        self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+class _ZstdStream:
+    """Incremental zstd with a flush after every chunk."""
+    def __init__(self):
+        self.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush()
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress a whole body."""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, GZIP_LEVEL, wbits=31)
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    """Reverse compress()."""
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd data needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if encoding != "gzip":
+        raise ValueError(f"Unknown encoding: {encoding}")
+    return zlib.decompress(data, wbits=31)
+
+def _compress_stream(chunks, encoding):
+    stream = _ZstdStream() if encoding == "zstd" else _GzipStream()
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = stream.compress(chunk)
+            response_bytes.inc(len(chunk), encoding=encoding, stage="uncompressed")
+            response_bytes.inc(len(data), encoding=encoding, stage="sent")
+            if data:
+                yield data
+        data = stream.finish()
+        response_bytes.inc(len(data), encoding=encoding, stage="sent")
+        yield data
+    finally:
+        # Ends the wrapped generator (and its request context) if the client went away
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+def negotiate(request):
+    """The encoding to use for a request, or None."""
+    accepted = request.accept_encodings
+    best = max(ENCODINGS, key=lambda encoding: accepted[encoding])
+    return best if accepted[best] > 0 else None
+
+def init_app(app):
+    """Compress eligible responses."""
+    from flask import request
+
+    @app.after_request
+    def _compress_response(response):
+        if (response.direct_passthrough or "Content-Encoding" in response.headers or "ETag" in response.headers
+                or not (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)
+                or response.status_code < 200 or response.status_code in (204, 304)):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate(request)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding)
+        else:
+            body = response.get_data()
+            if len(body) < COMPRESS_MIN_BYTES:
+                return response
+            compressed = compress(body, encoding)
+            response_bytes.inc(len(body), encoding=encoding, stage="uncompressed")
+            response_bytes.inc(len(compressed), encoding=encoding, stage="sent")
+            response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        return response
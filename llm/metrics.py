@@ -0,0 +1,320 @@
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from functools import wraps
+from typing import Dict, Iterable, Optional, Tuple
+
+# Latency buckets in seconds, from fast SQLite reads up to slow LLM completions
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# With several worker processes, each one writes its values to a file in this
+# directory and render() adds up every file, so any worker can answer a
+# scrape for all of them. Production mode sets it up; unset means this
+# process only.
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or None
+
+# How often each process writes its values to MULTIPROC_DIR
+FLUSH_SECONDS = float(os.environ.get("ENGRAM_METRICS_FLUSH_SECONDS", "1"))
+
+# Values of exited workers, merged so counters never go backwards
+DEAD_FILE = "metrics_dead.json"
+
+_lock = threading.Lock()
+_metrics = {}  # name -> metric, in registration order
+_flusher_pid = None  # process whose flush thread is running
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """A monotonically increasing count per label set."""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        _ensure_flusher()
+
+    @staticmethod
+    def merge(total, value):
+        return value if total is None else total + value
+
+    def samples(self, values=None) -> Iterable[str]:
+        for labels, value in (self.values if values is None else values).items():
+            yield f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.values = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+        _ensure_flusher()
+
+    def time(self, **labels):
+        """Context manager / decorator observing the elapsed wall time."""
+        return _Timer(self, labels)
+
+    @staticmethod
+    def merge(total, state):
+        return list(state) if total is None else [a + b for a, b in zip(total, state)]
+
+    def samples(self, values=None) -> Iterable[str]:
+        for labels, state in (self.values if values is None else values).items():
+            for bound, count in zip(self.buckets, state):
+                yield f"{self.name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} {count}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(state[-2])}"
+            yield f"{self.name}_count{_format_labels(labels)} {state[-1]}"
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+    def __call__(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.histogram, self.labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+def _register(metric):
+    with _lock:
+        existing = _metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        _metrics[metric.name] = metric
+        return metric
+
+def counter(name: str, help_text: str) -> Counter:
+    """Get or create a counter."""
+    return _register(Counter(name, help_text))
+
+def histogram(name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    """Get or create a histogram."""
+    return _register(Histogram(name, help_text, buckets))
+
+# Shared metrics used across modules
+http_request_duration = histogram(
+    "engram_http_request_duration_seconds", "HTTP request duration by blueprint and route")
+llm_request_duration = histogram(
+    "engram_llm_request_duration_seconds", "LLM request duration by module and operation")
+llm_tokens = counter(
+    "engram_llm_tokens_total", "Tokens processed by the LLM server by module and kind")
+llm_errors = counter(
+    "engram_llm_errors_total", "Failed LLM requests by module and operation")
+sqlite_query_duration = histogram(
+    "engram_sqlite_query_duration_seconds", "SQLite operation duration by store and operation")
+cache_requests = counter(
+    "engram_cache_requests_total", "Cache lookups by cache and result (hit or miss)")
+prompt_tokens = counter(
+    "engram_llm_prompt_tokens_total", "Prompt tokens by prompt template and result (hit or miss in vLLM's prefix cache)")
+
+def time_sqlite(store: str):
+    """Decorator recording a database function's duration under its name."""
+    def decorator(func):
+        return sqlite_query_duration.time(store=store, operation=func.__name__)(func)
+    return decorator
+
+def record_cache(cache: str, hit: bool, count: int = 1):
+    """Count cache hits or misses."""
+    cache_requests.inc(count, cache=cache, result="hit" if hit else "miss")
+
+def _snapshot() -> Dict[str, list]:
+    """This process's values, as JSON-serializable {name: [[labels, value], ...]}."""
+    with _lock:
+        return {metric.name: [[list(map(list, labels)), value] for labels, value in metric.values.items()]
+                for metric in _metrics.values() if metric.values}
+
+def _write_json(path: str, data):
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_file, path)
+    except Exception:
+        os.remove(tmp_file)
+        raise
+
+def _read_json(path: str) -> Dict[str, list]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _process_file(pid: int) -> str:
+    return os.path.join(MULTIPROC_DIR, f"metrics_{pid}.json")
+
+def _merge_into(totals: Dict[str, dict], snapshot: Dict[str, list]):
+    for name, values in snapshot.items():
+        metric = _metrics.get(name)
+        if metric is None:
+            continue
+        merged = totals.setdefault(name, {})
+        for labels, value in values:
+            key = tuple(map(tuple, labels))
+            merged[key] = metric.merge(merged.get(key), value)
+
+def flush():
+    """Write this process's values to MULTIPROC_DIR (no-op without one)."""
+    if MULTIPROC_DIR:
+        _write_json(_process_file(os.getpid()), _snapshot())
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        try:
+            flush()
+        except OSError as e:
+            print(f"Could not write metrics to {MULTIPROC_DIR}: {e}")
+
+def _ensure_flusher():
+    global _flusher_pid
+    if MULTIPROC_DIR and _flusher_pid != os.getpid():
+        with _lock:
+            if _flusher_pid == os.getpid():
+                return
+            _flusher_pid = os.getpid()
+        threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+
+def set_multiprocess_dir(directory: Optional[str]):
+    """Share metrics between processes through files in a directory."""
+    global MULTIPROC_DIR
+    MULTIPROC_DIR = directory or None
+    if MULTIPROC_DIR:
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+def clear_process_files():
+    """Delete every process's values, e.g. when a new server starts."""
+    for path in glob.glob(os.path.join(MULTIPROC_DIR, "metrics_*.json")):
+        os.remove(path)
+
+def mark_process_dead(pid: int):
+    """Fold an exited worker's values into DEAD_FILE and delete its file."""
+    path = _process_file(pid)
+    if not os.path.exists(path):
+        return
+    dead_path = os.path.join(MULTIPROC_DIR, DEAD_FILE)
+    totals = {}
+    _merge_into(totals, _read_json(dead_path))
+    _merge_into(totals, _read_json(path))
+    _write_json(dead_path, {name: [[list(map(list, labels)), value] for labels, value in values.items()]
+                            for name, values in totals.items()})
+    os.remove(path)
+
+def _values() -> Dict[str, dict]:
+    """Every metric's values, added up across processes when sharing them."""
+    if not MULTIPROC_DIR:
+        with _lock:
+            return {metric.name: dict(metric.values) for metric in _metrics.values()}
+    flush()
+    totals = {}
+    for path in glob.glob(os.path.join(MULTIPROC_DIR, "metrics_*.json")):
+        _merge_into(totals, _read_json(path))
+    return totals
+
+def render() -> str:
+    """Render every metric in the Prometheus text exposition format."""
+    lines = []
+    values = _values()
+    for metric in list(_metrics.values()):
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples(values.get(metric.name, {})))
+
+    # Hit ratios derived from the cache counters, for dashboards without PromQL
+    ratios = {}
+    for labels, value in values.get(cache_requests.name, {}).items():
+        labels = dict(labels)
+        hits, total = ratios.get(labels["cache"], (0, 0))
+        ratios[labels["cache"]] = (hits + (value if labels["result"] == "hit" else 0), total + value)
+
+    if ratios:
+        lines.append("# HELP engram_cache_hit_ratio Share of cache lookups that were hits")
+        lines.append("# TYPE engram_cache_hit_ratio gauge")
+        for cache, (hits, total) in ratios.items():
+            lines.append(f'engram_cache_hit_ratio{{cache="{_escape(cache)}"}} {hits / total if total else 0.0}')
+
+    return "\n".join(lines) + "\n"
+
+def _reset_after_fork():
+    """
+    The flush thread doesn't survive fork, and the lock may have been held.
+    Samples recorded before fork are in the parent's file already, so the
+    child starts from zero rather than counting them again.
+    """
+    global _lock, _flusher_pid
+    _lock = threading.Lock()
+    _flusher_pid = None
+    for metric in _metrics.values():
+        metric.values = {}
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def init_app(app):
+    """Time every request by blueprint and route template."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return response
+        labels = {
+            "blueprint": request.blueprint or "app",
+            "route": request.url_rule.rule if request.url_rule else "unmatched",
+            "method": request.method,
+            "status": str(response.status_code),
+        }
+        # Closing happens after a streamed body is fully sent
+        response.call_on_close(lambda: http_request_duration.observe(time.perf_counter() - start, **labels))
+        return response
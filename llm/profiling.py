@@ -0,0 +1,161 @@
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+# Share of requests to profile without being asked (0 disables)
+PROFILE_SAMPLE_RATE = float(os.environ.get("ENGRAM_PROFILE_SAMPLE_RATE", "0"))
+
+# Whether clients may request a profile with the X-Engram-Profile header. Off
+# by default: anyone who can reach the API could otherwise make every request
+# pay for stack sampling and fill the disk with profiles
+PROFILE_HEADER_ENABLED = os.environ.get("ENGRAM_PROFILE_HEADER", "0") == "1"
+PROFILE_HEADER = "X-Engram-Profile"
+
+# Whether responses carry a Server-Timing header; off by default, as it
+# tells clients how long internal steps take
+SERVER_TIMING_ENABLED = os.environ.get("ENGRAM_SERVER_TIMING", "0") == "1"
+
+# Where collapsed stacks are written, one subdirectory per route
+PROFILE_DIR = os.environ.get("ENGRAM_PROFILE_DIR", "data/profiles")
+
+# Profiles kept per route before the oldest are deleted
+PROFILE_KEEP = int(os.environ.get("ENGRAM_PROFILE_KEEP", "50"))
+
+# Stack sampling interval
+PROFILE_INTERVAL_SECONDS = float(os.environ.get("ENGRAM_PROFILE_INTERVAL_MS", "5")) / 1000
+
+class StackSampler:
+    """
+    Samples one thread's Python stack at a fixed interval and counts
+    identical stacks, producing flamegraph.pl / speedscope collapsed stacks.
+    """
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Return the samples as 'frame;frame;frame count' lines."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+def _route_slug(rule):
+    return re.sub(r"[^A-Za-z0-9]+", "_", rule).strip("_") or "root"
+
+def write_profile(route, collapsed):
+    """Write collapsed stacks for a route and prune its oldest profiles."""
+    directory = os.path.join(PROFILE_DIR, _route_slug(route))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{threading.get_ident()}.folded")
+    with open(path, 'w') as f:
+        f.write(collapsed)
+
+    profiles = sorted(os.listdir(directory))
+    for old in profiles[:-PROFILE_KEEP]:
+        try:
+            os.remove(os.path.join(directory, old))
+        except OSError:
+            pass
+    return path
+
+class span:
+    """
+    Time a block or function and report it in the request's Server-Timing
+    header. Outside a request (background threads, scripts), or with
+    ENGRAM_SERVER_TIMING off, it does nothing.
+
+        with span("llm"):
+            ...
+
+        @span("get_fragments")
+        def get_fragments(...):
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        from flask import g, has_request_context
+        if SERVER_TIMING_ENABLED and has_request_context():
+            spans = g.setdefault("server_timing", {})
+            duration, calls = spans.get(self.name, (0.0, 0))
+            spans[self.name] = (duration + time.perf_counter() - self.start, calls + 1)
+        return False
+
+    def __call__(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(self.name):
+                return func(*args, **kwargs)
+        return wrapper
+
+def _server_timing_header(spans, total):
+    entries = []
+    for name, (duration, calls) in spans.items():
+        entry = f"{name};dur={duration * 1000:.1f}"
+        if calls > 1:
+            entry += f';desc="{calls} calls"'
+        entries.append(entry)
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+def init_app(app):
+    """Add Server-Timing headers to responses and sample opted-in requests, as configured."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_profile():
+        if SERVER_TIMING_ENABLED:
+            g.profile_start = time.perf_counter()
+        requested = PROFILE_HEADER_ENABLED and request.headers.get(PROFILE_HEADER, "").lower() in ("1", "true")
+        if requested or (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+            g.profile_sampler = StackSampler(threading.get_ident()).start()
+
+    @app.after_request
+    def _finish_profile(response):
+        start = g.pop("profile_start", None)
+        if start is not None:
+            response.headers["Server-Timing"] = _server_timing_header(
+                g.pop("server_timing", {}), time.perf_counter() - start)
+
+        sampler = g.pop("profile_sampler", None)
+        if sampler is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+
+            def _write():
+                # Runs after a streamed body is fully sent
+                sampler.stop()
+                if sampler.counts:
+                    write_profile(route, sampler.collapsed())
+            response.call_on_close(_write)
+            response.headers[PROFILE_HEADER] = "sampled"
+        return response
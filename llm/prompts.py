@@ -0,0 +1,79 @@
+# Versioned prompt templates
+#
+# vLLM's automatic prefix caching reuses the KV cache of any prompt prefix
+# it has already computed, but only when the tokens are identical. Every
+# template therefore keeps its instructions in a static system message and
+# puts the per-call content (fragments, memories, the question) at the end
+# of the user message, so all calls of a template share one cached prefix
+# and only the tail is prefilled.
+#
+# A template never changes once registered: a new wording is a new
+# version. The latest version is used unless ENGRAM_PROMPT_VERSIONS pins
+# an older one, e.g. "memory_query=1,build_memory=2".
+
+import os
+from string import Formatter
+from typing import Dict, Tuple
+
+def _parse_versions(value: str) -> Dict[str, int]:
+    """Parse "memory_query=1,build_memory=2" into {name: version}."""
+    versions = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, version = item.partition("=")
+        versions[name.strip()] = int(version)
+    return versions
+
+PINNED_VERSIONS = _parse_versions(os.environ.get("ENGRAM_PROMPT_VERSIONS", ""))
+
+# System message of prompts registered before templates had their own
+DEFAULT_SYSTEM_MESSAGE = "You are a helpful assistant."
+
+class PromptTemplate:
+    """A static system message plus a user message filled in per call."""
+    def __init__(self, name: str, version: int, system: str, user: str):
+        self.name = name
+        self.version = version
+        self.system = system
+        self.user = user
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}@v{self.version}"
+
+    def render(self, **values) -> Tuple[str, str]:
+        """Return (system message, user prompt)."""
+        return self.system, self.user.format(**values)
+
+_templates = {}  # name -> {version: PromptTemplate}
+_warned = set()  # names pinned to a version that doesn't exist
+
+def register_prompt(name: str, version: int, system: str, user: str) -> PromptTemplate:
+    """
+    Register a template version. The system message must be static text so
+    it is byte-identical in every call.
+    """
+    if any(field is not None for _, field, _, _ in Formatter().parse(system)):
+        raise ValueError(f"Prompt {name} v{version}: the system message can't have placeholders")
+    versions = _templates.setdefault(name, {})
+    existing = versions.get(version)
+    if existing is not None and (existing.system, existing.user) != (system, user):
+        raise ValueError(f"Prompt {name} v{version} is already registered with different text; add a new version")
+    versions[version] = PromptTemplate(name, version, system, user)
+    return versions[version]
+
+def get_prompt(name: str) -> PromptTemplate:
+    """The pinned version of a template, or its latest."""
+    versions = _templates[name]
+    pinned = PINNED_VERSIONS.get(name)
+    if pinned is not None:
+        if pinned in versions:
+            return versions[pinned]
+        if name not in _warned:
+            _warned.add(name)
+            print(f"Warning: prompt {name} has no version {pinned}, using v{max(versions)}")
+    return versions[max(versions)]
+
+def list_prompts() -> Dict[str, Dict[str, object]]:
+    """Registered templates with their versions and the one in use."""
+    return {name: {"versions": sorted(versions), "active": get_prompt(name).version}
+            for name, versions in sorted(_templates.items())}
@@ -1,5 +1,62 @@
-from flask import jsonify
-from typing import Dict, Any, Optional
+import os
+from flask import Response, current_app, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from typing import Dict, Any, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# "orjson" (the default when installed) or "stdlib"
+JSON_ENCODER = os.environ.get("ENGRAM_JSON_ENCODER", "orjson" if orjson else "stdlib").lower()
+
+# Lists with at least this many items are streamed in chunks by list_response
+STREAM_MIN_ITEMS = int(os.environ.get("ENGRAM_STREAM_MIN_ITEMS", "1000"))
+STREAM_CHUNK_ITEMS = 500
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes and decodes with orjson, several times
+    faster than the stdlib json module on large lists, and writes UTF-8
+    instead of \\u escapes. Output is otherwise the same: sorted keys, and
+    dates and other types orjson doesn't know go through Flask's default.
+    Falls back to the stdlib encoder when orjson is missing or
+    ENGRAM_JSON_ENCODER=stdlib.
+    """
+    enabled = JSON_ENCODER == "orjson" and orjson is not None
+
+    def _options(self, indent=None):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps_bytes(self, obj, indent=None) -> bytes:
+        """Serialize to UTF-8 JSON bytes."""
+        if self.enabled:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._options(indent))
+            except orjson.JSONEncodeError:
+                pass  # e.g. integers wider than 64 bits; the stdlib handles them
+        return super().dumps(obj, indent=indent, separators=None if indent else (",", ":")).encode()
+
+    def dumps(self, obj, **kwargs) -> str:
+        if not self.enabled or set(kwargs) - {"indent", "separators"}:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj, kwargs.get("indent")).decode()
+
+    def loads(self, s, **kwargs):
+        if not self.enabled or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = 2 if (self.compact is None and self._app.debug) or self.compact is False else None
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b"\n", mimetype=self.mimetype)
 
 def success_response(data: Dict[str, Any], message: Optional[str] = None) -> Dict[str, Any]:
     """Create a standardized success response."""
@@ -11,6 +68,37 @@ def success_response(data: Dict[str, Any], message: Optional[str] = None) -> Dic
         response["message"] = message
     return jsonify(response)
 
+def list_response(key: str, items: List[Any], extra: Optional[Dict[str, Any]] = None,
+                  message: Optional[str] = None):
+    """
+    success_response({key: items, **extra}, message), streamed in chunks of
+    STREAM_CHUNK_ITEMS when the list is long so the first bytes (and, with
+    compression, the first compressed blocks) go out before the whole list
+    is encoded. The JSON is the same either way.
+    """
+    data = dict(extra or {})
+    if len(items) < STREAM_MIN_ITEMS:
+        data[key] = items
+        return success_response(data, message)
+
+    provider = current_app.json
+    encode = provider.dumps_bytes if isinstance(provider, FastJSONProvider) else lambda obj: provider.dumps(obj).encode()
+
+    def generate():
+        # Keys in sorted order, like the non-streamed envelope: data, message, success
+        fields = [encode(name) + b":" + encode(value) for name, value in sorted(data.items()) if name < key]
+        yield b'{"data":{' + b"".join(field + b"," for field in fields) + encode(key) + b":["
+        for start in range(0, len(items), STREAM_CHUNK_ITEMS):
+            chunk = encode(items[start:start + STREAM_CHUNK_ITEMS])[1:-1]
+            yield (b"," if start else b"") + chunk
+        later = [b"," + encode(name) + b":" + encode(value) for name, value in sorted(data.items()) if name > key]
+        tail = b"]" + b"".join(later) + b"}"
+        if message:
+            tail += b',"message":' + encode(message)
+        yield tail + b',"success":true}\n'
+
+    return Response(stream_with_context(generate()), mimetype=provider.mimetype)
+
 def error_response(error: str, status_code: int = 400, details: Optional[Dict[str, Any]] = None) -> tuple:
     """Create a standardized error response."""
     response = {
@@ -32,6 +120,13 @@ def not_found_error(resource: str) -> tuple:
     """Create a not found error response."""
     return error_response(f"{resource} not found", 404)
 
+def retry_later_error(message: str, status_code: int = 503, retry_after: int = 5,
+                      details: Optional[Dict[str, Any]] = None) -> tuple:
+    """Create a 429/503 response telling the client when to retry."""
+    response, status = error_response(message, status_code, details)
+    response.headers['Retry-After'] = str(retry_after)
+    return response, status
+
 def server_error(message: str = "Internal server error") -> tuple:
     """Create a server error response."""
     return error_response(message, 500)
\ No newline at end of file
@@ -0,0 +1,284 @@
+# Priority-aware scheduling of LLM requests
+#
+# Every LLMClient request passes through this process's scheduler before it
+# is sent to vLLM. At most MAX_IN_FLIGHT requests are outstanding at once
+# and the rest wait in a priority queue, so a user's question goes ahead of
+# a backlog of consolidation or image description work. INTERACTIVE_RESERVE
+# of those slots are only ever used by interactive requests, so a question
+# never waits for a long bulk completion to finish.
+#
+# Bulk and background requests are also held to per-module token budgets
+# (tokens per minute). Interactive requests are charged against the budget
+# but never wait on it. A request that would wait too long - its module is
+# over budget (429) or too many requests are queued ahead of it (503) - is
+# rejected right away with LLMBusy instead of timing out later.
+
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional
+from .metrics import counter, histogram
+from .profiling import span
+
+INTERACTIVE, BULK, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk", BACKGROUND: "background"}
+
+# Requests this process sends to vLLM at once, and how many of those slots
+# are kept free for interactive requests
+MAX_IN_FLIGHT = int(os.environ.get("ENGRAM_LLM_MAX_IN_FLIGHT", "8"))
+INTERACTIVE_RESERVE = int(os.environ.get("ENGRAM_LLM_INTERACTIVE_RESERVE", "2"))
+
+# A request is shed when this many requests that would be sent before it are already waiting
+QUEUE_LIMITS = {INTERACTIVE: 64, BULK: 32, BACKGROUND: 256}
+
+# Longest a request may wait for a slot or for its module's token budget
+MAX_WAIT_SECONDS = {
+    INTERACTIVE: float(os.environ.get("ENGRAM_LLM_MAX_WAIT", "30")),
+    BULK: 60.0,
+    BACKGROUND: 600.0,
+}
+
+# Retry-After for requests shed because the queue is full
+RETRY_AFTER_SECONDS = 5
+
+def _parse_budgets(value: str) -> Dict[str, int]:
+    """Parse "vision=60000,cortex=120000" into {module: tokens per minute}."""
+    budgets = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        module, _, tokens = item.partition("=")
+        budgets[module.strip()] = int(tokens)
+    return budgets
+
+# Tokens per minute per module, e.g. "vision=60000,hippocampus=200000".
+# Modules that aren't listed are unlimited.
+TOKEN_BUDGETS = _parse_budgets(os.environ.get("ENGRAM_LLM_TOKEN_BUDGETS", ""))
+
+queue_wait = histogram(
+    "engram_llm_queue_wait_seconds", "Time LLM requests waited for the scheduler by module and priority")
+shed_requests = counter(
+    "engram_llm_shed_total", "LLM requests rejected by the scheduler by module, priority and reason")
+
+class LLMBusy(Exception):
+    """The LLM server is too busy for this request; retry after `retry_after` seconds."""
+    def __init__(self, message: str, status_code: int = 503, retry_after: int = RETRY_AFTER_SECONDS):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+_priority = contextvars.ContextVar("engram_llm_priority", default=None)
+
+def current_priority() -> int:
+    """The priority set for this block, else interactive inside a request and background outside one."""
+    value = _priority.get()
+    if value is not None:
+        return value
+    from flask import has_request_context
+    return INTERACTIVE if has_request_context() else BACKGROUND
+
+class priority:
+    """
+    Send a block's LLM requests at a given priority.
+
+        with priority(BULK):
+            process_fragments(fragments)
+    """
+    def __init__(self, level: int):
+        self.level = level
+
+    def __enter__(self):
+        self.token = _priority.set(self.level)
+        return self
+
+    def __exit__(self, *exc):
+        _priority.reset(self.token)
+        return False
+
+class TokenBudget:
+    """A token bucket refilled at tokens_per_minute that holds at most a minute's worth."""
+    def __init__(self, tokens_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(float(self.tokens_per_minute), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, tokens: int) -> float:
+        """Seconds until `tokens` are available."""
+        self._refill()
+        return max(0.0, (tokens - self.tokens) / self.rate) if self.rate else math.inf
+
+    def spend(self, tokens: float):
+        """Take tokens (or give them back if negative); the balance may go below zero."""
+        self._refill()
+        self.tokens -= tokens
+
+class _Waiter:
+    __slots__ = ("event", "granted", "cancelled")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+class Scheduler:
+    """Admission control and priority queueing for one process's LLM requests."""
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, interactive_reserve: int = INTERACTIVE_RESERVE,
+                 budgets: Optional[Dict[str, int]] = None):
+        self.max_in_flight = max(1, max_in_flight)
+        self.interactive_reserve = min(max(0, interactive_reserve), self.max_in_flight - 1)
+        self.token_budgets = dict(TOKEN_BUDGETS if budgets is None else budgets)
+        self.budgets = {module: TokenBudget(tokens) for module, tokens in self.token_budgets.items()}
+        self._lock = threading.Lock()
+        self._queue = []  # heap of (priority, sequence, waiter)
+        self._sequence = itertools.count()
+        self._waiting = {level: 0 for level in PRIORITY_NAMES}
+        self._in_flight = {level: 0 for level in PRIORITY_NAMES}
+
+    def _can_start(self, level: int) -> bool:
+        limit = self.max_in_flight if level == INTERACTIVE else self.max_in_flight - self.interactive_reserve
+        return sum(self._in_flight.values()) < limit
+
+    def _dispatch(self):
+        """Start waiting requests in priority order while slots are free. Call with the lock held."""
+        while self._queue:
+            level, _, waiter = self._queue[0]
+            if waiter.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            if not self._can_start(level):
+                break
+            heapq.heappop(self._queue)
+            self._waiting[level] -= 1
+            self._in_flight[level] += 1
+            waiter.granted = True
+            waiter.event.set()
+
+    def _shed(self, module: str, level: int, reason: str, charged: int, error: LLMBusy):
+        """Refund a rejected request's tokens and count it. Call with the lock held."""
+        if charged:
+            self.budgets[module].spend(-charged)
+        shed_requests.inc(module=module, priority=PRIORITY_NAMES[level], reason=reason)
+        return error
+
+    def acquire(self, module: str, level: int, tokens: int):
+        """
+        Wait for a slot to send a request of about `tokens` tokens.
+        Raises LLMBusy rather than waiting longer than MAX_WAIT_SECONDS.
+        """
+        started = time.monotonic()
+        max_wait = MAX_WAIT_SECONDS[level]
+        budget = self.budgets.get(module)
+        charged = 0
+
+        if budget is not None:
+            with self._lock:
+                delay = 0.0 if level == INTERACTIVE else budget.wait_time(tokens)
+                if delay > max_wait:
+                    raise self._shed(module, level, "budget", 0, LLMBusy(
+                        f"The {module} module is over its LLM token budget", 429, math.ceil(delay)))
+                budget.spend(tokens)
+                charged = tokens
+            if delay:
+                time.sleep(delay)
+
+        with self._lock:
+            ahead = sum(count for waiting, count in self._waiting.items() if waiting <= level)
+            if ahead == 0 and self._can_start(level):
+                self._in_flight[level] += 1
+                waiter = None
+            elif ahead >= QUEUE_LIMITS[level]:
+                raise self._shed(module, level, "queue_full", charged, LLMBusy(
+                    f"The LLM server is overloaded ({ahead} requests queued)"))
+            else:
+                waiter = _Waiter()
+                heapq.heappush(self._queue, (level, next(self._sequence), waiter))
+                self._waiting[level] += 1
+
+        if waiter is not None:
+            waiter.event.wait(max(0.0, max_wait - (time.monotonic() - started)))
+            with self._lock:
+                if not waiter.granted:
+                    waiter.cancelled = True
+                    self._waiting[level] -= 1
+                    raise self._shed(module, level, "timeout", charged, LLMBusy(
+                        f"Timed out after {max_wait:.0f}s waiting for the LLM server"))
+
+        queue_wait.observe(time.monotonic() - started, module=module, priority=PRIORITY_NAMES[level])
+
+    def release(self, module: str, level: int, reserved: int, used: Optional[int] = None):
+        """Free a slot, correcting the module's budget by the tokens the request actually used."""
+        with self._lock:
+            self._in_flight[level] -= 1
+            budget = self.budgets.get(module)
+            if budget is not None and used is not None:
+                budget.spend(used - reserved)
+            self._dispatch()
+
+    def stats(self) -> Dict[str, object]:
+        """Slots in use, waiting requests per priority and remaining token budgets."""
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "interactive_reserve": self.interactive_reserve,
+                "in_flight": {PRIORITY_NAMES[level]: count for level, count in self._in_flight.items()},
+                "waiting": {PRIORITY_NAMES[level]: count for level, count in self._waiting.items()},
+                "budgets": {module: {"tokens_per_minute": budget.tokens_per_minute,
+                                     "available": int(budget.tokens + (time.monotonic() - budget.updated) * budget.rate)}
+                            for module, budget in self.budgets.items()},
+            }
+
+_scheduler = Scheduler()
+
+def configure(max_in_flight: int = MAX_IN_FLIGHT, interactive_reserve: int = INTERACTIVE_RESERVE,
+              budgets: Optional[Dict[str, int]] = None):
+    """Replace the process's scheduler, e.g. to compare settings in a benchmark."""
+    global _scheduler
+    _scheduler = Scheduler(max_in_flight, interactive_reserve, budgets)
+
+def stats() -> Dict[str, object]:
+    """The process scheduler's current state."""
+    return _scheduler.stats()
+
+class slot:
+    """
+    Hold a scheduler slot for one LLM request of about `tokens` tokens
+    (prompt plus completion), at the current priority.
+
+        with slot("cortex", tokens=1200) as request:
+            completion = client.chat.completions.create(...)
+            request.used(completion.usage.total_tokens)
+    """
+    def __init__(self, module: str, tokens: int):
+        self.module = module
+        self.tokens = tokens
+        self.level = current_priority()
+        self.actual = None
+
+    def __enter__(self):
+        self.scheduler = _scheduler
+        with span("llm_queue"):
+            self.scheduler.acquire(self.module, self.level, self.tokens)
+        return self
+
+    def used(self, tokens: int):
+        """Record the tokens the server reported, so the budget is charged for them."""
+        self.actual = tokens
+
+    def __exit__(self, *exc):
+        self.scheduler.release(self.module, self.level, self.tokens, self.actual)
+        return False
+
+def _reset_after_fork():
+    """Queued requests and locks belong to the parent; each worker starts with an empty scheduler."""
+    configure(_scheduler.max_in_flight, _scheduler.interactive_reserve, _scheduler.token_budgets)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,81 @@
+# Consistent SQLite snapshots for long reads such as archive exports
+#
+# A database is copied with SQLite's online backup API, BACKUP_PAGES pages
+# per step. In WAL mode a read transaction held for the whole copy pins one
+# consistent snapshot without blocking writers, so writes during the copy
+# neither wait for it nor restart it. Storage engines read their exports
+# from the copy in batches, and the copy is deleted afterwards.
+
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List
+from llm.profiling import span
+from llm.tenancy import user_path
+
+# Database pages copied per backup step (4 KB each by default); the source
+# is only locked while a step runs
+BACKUP_PAGES = int(os.environ.get("ENGRAM_BACKUP_PAGES", "256"))
+
+# Outside WAL mode a write to the source restarts a stepped backup; after
+# this many restarts the rest is copied in one step, holding off writers
+# until it is done
+BACKUP_RESTARTS = 3
+
+# Where snapshots are written while they are read (per user)
+SNAPSHOT_DIR = "data/snapshots"
+
+class _BackupRestarted(Exception):
+    pass
+
+def _backup(source, target):
+    """Copy source into target page by page, falling back to a single step if writes keep restarting it."""
+    state = {"remaining": None, "restarts": 0}
+
+    def progress(status, remaining, total):
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > BACKUP_RESTARTS:
+                raise _BackupRestarted()
+        state["remaining"] = remaining
+
+    try:
+        source.backup(target, pages=BACKUP_PAGES, progress=progress)
+    except _BackupRestarted:
+        print(f"Backup restarted {BACKUP_RESTARTS} times by concurrent writes, finishing in one step")
+        source.backup(target)
+
+@contextmanager
+def snapshot(path):
+    """
+    Yield a connection to a consistent copy of the SQLite database at path,
+    made with the online backup API. The copy is deleted afterwards.
+    """
+    directory = user_path(SNAPSHOT_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, copy_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}-", suffix=".snapshot", dir=directory)
+    os.close(fd)
+    source = sqlite3.connect(str(path))
+    target = sqlite3.connect(copy_path)
+    try:
+        with span("archive_snapshot"):
+            if source.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+                source.execute("BEGIN")
+                source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            _backup(source, target)
+        source.close()
+        yield target
+    finally:
+        source.close()
+        target.close()
+        os.remove(copy_path)
+
+def select_batches(conn, query: str, batch_size: int, convert: Callable[[tuple], Any]) -> Iterator[List[Any]]:
+    """Run a query when first iterated and yield its converted rows in lists of up to batch_size."""
+    cursor = conn.execute(query)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield [convert(row) for row in rows]
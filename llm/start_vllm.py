@@ -10,7 +10,8 @@ import os
 import argparse
 import time
 
-def start_vllm_server(model_path: str, host: str = "localhost", port: int = 8000, gpu_memory_utilization: float = 0.8):
+def start_vllm_server(model_path: str, host: str = "localhost", port: int = 8000, gpu_memory_utilization: float = 0.8,
+                      max_model_len: int = 2048, prefix_caching: bool = True):
     """
     Start the vLLM server with specified parameters.
     
@@ -19,6 +20,9 @@ def start_vllm_server(model_path: str, host: str = "localhost", port: int = 8000
         host: Host to bind the server to
         port: Port to run the server on
         gpu_memory_utilization: GPU memory utilization ratio
+        max_model_len: Context window in tokens (set ENGRAM_MAX_MODEL_LEN to match for the app)
+        prefix_caching: Reuse the KV cache of prompt prefixes seen before, so the
+            shared instructions of Engram's prompt templates are only prefilled once
     """
     
     print(f"Starting vLLM server...")
@@ -26,6 +30,8 @@ def start_vllm_server(model_path: str, host: str = "localhost", port: int = 8000
     print(f"Host: {host}")
     print(f"Port: {port}")
     print(f"GPU Memory Utilization: {gpu_memory_utilization}")
+    print(f"Max Model Length: {max_model_len}")
+    print(f"Prefix Caching: {'enabled' if prefix_caching else 'disabled'}")
     print()
     
     # Check if model path exists
@@ -40,10 +46,13 @@ def start_vllm_server(model_path: str, host: str = "localhost", port: int = 8000
         "--host", host,
         "--port", str(port),
         "--gpu-memory-utilization", str(gpu_memory_utilization),
-        "--max-model-len", "2048",
+        "--max-model-len", str(max_model_len),
         "--enforce-eager",
-        "--served-model-name", os.path.basename(model_path.rstrip('/'))
+        "--served-model-name", os.path.basename(model_path.rstrip('/')),
+        # Report cached prompt tokens in each response's usage
+        "--enable-prompt-tokens-details"
     ]
+    cmd.append("--enable-prefix-caching" if prefix_caching else "--no-enable-prefix-caching")
     
     print("Running command:")
     print(" ".join(cmd))
@@ -51,6 +60,7 @@ def start_vllm_server(model_path: str, host: str = "localhost", port: int = 8000
     print("Server will be available at:")
     print(f"  http://{host}:{port}/v1/models")
     print(f"  http://{host}:{port}/v1/chat/completions")
+    print(f"  http://{host}:{port}/metrics (prefix cache hits, prefill time)")
     print()
     print("Press Ctrl+C to stop the server")
     print("-" * 50)
@@ -111,6 +121,17 @@ def main():
         default=0.8,
         help="GPU memory utilization ratio (default: 0.8)"
     )
+    parser.add_argument(
+        "--max-model-len", 
+        type=int, 
+        default=2048,
+        help="Context window in tokens (default: 2048)"
+    )
+    parser.add_argument(
+        "--no-prefix-caching",
+        action="store_true",
+        help="Disable automatic prefix caching"
+    )
     
     args = parser.parse_args()
     
@@ -118,7 +139,9 @@ def main():
         model_path=args.model,
         host=args.host,
         port=args.port,
-        gpu_memory_utilization=args.gpu_memory_utilization
+        gpu_memory_utilization=args.gpu_memory_utilization,
+        max_model_len=args.max_model_len,
+        prefix_caching=not args.no_prefix_caching
     )
 
 if __name__ == "__main__":
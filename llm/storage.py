@@ -0,0 +1,210 @@
+# Storage engines shared by the cortex and hippocampus modules
+#
+# Modules keep their records (dicts with an "id") in named collections -
+# "fragments", "sessions", "memories" - and read and write them through a
+# StorageEngine instead of calling SQLite, JSON files or Letta directly.
+# The existing stores are adapters in their modules; MemoryEngine keeps
+# everything in process memory for tests and benchmarks, giving a zero-I/O
+# baseline to measure the real engines against.
+
+import copy
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from llm.tenancy import current_user
+
+def _chunks(records: List[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    for start in range(0, len(records), size):
+        yield records[start:start + size]
+
+class StorageEngine(ABC):
+    """
+    Put, get, scan, update and search records in named collections.
+
+    Engines store the current user's data (see llm.tenancy). Scans return
+    records in insertion order, or newest first by created_at. Filters in
+    `where` are exact matches on a field, or on a metadata key written as
+    "metadata.<key>"; `since` and `until` bound created_at (inclusive and
+    exclusive, ISO 8601).
+
+    Subclasses implement the abstract methods. The fragment link, stats and
+    export hooks have defaults built on them, which engines with their own
+    link table, counters or snapshots override.
+    """
+    name = "base"
+    # True for engines that keep and search records outside this process
+    # (Letta) rather than through the local indexes
+    remote = False
+    # True for engines that parse a whole file to read any record, so
+    # callers should keep the records they need rather than get them by id
+    reads_whole_file = False
+
+    def put(self, collection: str, record: Dict[str, Any]):
+        """Insert or replace one record."""
+        self.put_many(collection, [record])
+
+    @abstractmethod
+    def put_many(self, collection: str, records: List[Dict[str, Any]]):
+        """Insert or replace records in one batch."""
+
+    def get(self, collection: str, record_id: str) -> Optional[Dict[str, Any]]:
+        """Return one record by id, or None."""
+        records = self.get_many(collection, [record_id])
+        return records[0] if records else None
+
+    @abstractmethod
+    def get_many(self, collection: str, ids: List[str]) -> List[Dict[str, Any]]:
+        """Return the records that exist for the given ids, in the order asked."""
+
+    @abstractmethod
+    def update_many(self, collection: str, ids: List[str], fields: Dict[str, Any]):
+        """Set the same fields on every record with one of the given ids."""
+
+    @abstractmethod
+    def scan(self, collection: str, where: Optional[Dict[str, Any]] = None, since: Optional[str] = None,
+             until: Optional[str] = None, limit: Optional[int] = None,
+             newest_first: bool = False) -> List[Dict[str, Any]]:
+        """Return matching records."""
+
+    @abstractmethod
+    def scan_after(self, collection: str, cursor: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Return (records, cursor) for records inserted after a cursor from an
+        earlier call (0 for everything), so in-process indexes can catch up
+        with new writes without rescanning.
+        """
+
+    def count(self, collection: str) -> int:
+        """Return the number of records in a collection."""
+        return len(self.scan(collection))
+
+    def search(self, collection: str, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Search records with the engine's own index; only remote engines have one."""
+        raise NotImplementedError(f"The {self.name} engine has no search of its own")
+
+    def link_fragments(self, links: Iterable[Tuple[str, str]]):
+        """
+        Add (fragment_id, session_id) links. Engines without a link table
+        keep a fragment's session as its "session_id" field.
+        """
+        for fragment_id, session_id in links:
+            self.update_many("fragments", [fragment_id], {"session_id": session_id})
+
+    def fragment_stats(self, session_id: Optional[str] = None) -> Dict[str, Tuple]:
+        """
+        Fragment counters as {session_id ('' for all fragments): (fragments,
+        processed, sessions, last_activity)}, at least for session_id. By
+        default they are counted from every fragment.
+        """
+        counts = {"": [0, 0, self.count("sessions"), None]}
+        for fragment in self.scan("fragments"):
+            keys = ["", fragment["session_id"]] if fragment.get("session_id") else [""]
+            for key in keys:
+                row = counts.setdefault(key, [0, 0, 0, None])
+                row[0] += 1
+                row[1] += bool(fragment.get("processed"))
+                row[3] = max(row[3] or "", fragment["created_at"])
+        return {key: tuple(row) for key, row in counts.items()}
+
+    def export_batches(self, collections: List[str], stack, batch_size: int) -> Dict[str, Iterator[List[Dict[str, Any]]]]:
+        """
+        Read whole collections for an export, as {collection: batches of up
+        to batch_size records in insertion order}, all as of this call.
+        "links" are the (fragment_id, session_id) links. Engines that
+        snapshot their storage enter the snapshot on stack (an ExitStack),
+        which must stay open while the batches are read; by default every
+        collection is scanned right away.
+        """
+        records = {collection: self.scan(collection) for collection in collections if collection != "links"}
+        if "links" in collections:
+            fragments = records["fragments"] if "fragments" in records else self.scan("fragments")
+            records["links"] = [{"fragment_id": fragment["id"], "session_id": fragment["session_id"]}
+                                for fragment in fragments if fragment.get("session_id")]
+            if "fragments" in records:
+                records["fragments"] = [{k: v for k, v in fragment.items() if k != "session_id"}
+                                        for fragment in fragments]
+        return {collection: _chunks(records[collection], batch_size) for collection in collections}
+
+def field_value(record: Dict[str, Any], field: str):
+    """Read a filter field from a record, including "metadata.<key>"."""
+    if field.startswith("metadata."):
+        return (record.get("metadata") or {}).get(field[len("metadata."):])
+    return record.get(field)
+
+def matches(record: Dict[str, Any], where: Optional[Dict[str, Any]] = None,
+            since: Optional[str] = None, until: Optional[str] = None) -> bool:
+    """Apply StorageEngine.scan filters to a record in Python."""
+    created_at = record.get("created_at") or ""
+    if since and created_at < since:
+        return False
+    if until and created_at >= until:
+        return False
+    return all(field_value(record, field) == value for field, value in (where or {}).items())
+
+def select(records: Iterable[Dict[str, Any]], where=None, since=None, until=None,
+           limit=None, newest_first=False) -> List[Dict[str, Any]]:
+    """StorageEngine.scan over records held in Python, in insertion order."""
+    found = [record for record in records if matches(record, where, since, until)]
+    if newest_first:
+        found.sort(key=lambda record: record.get("created_at") or "", reverse=True)
+    return found[:limit] if limit else found
+
+class MemoryEngine(StorageEngine):
+    """
+    Every collection in process memory, per user. Nothing is persisted or
+    shared between worker processes. Records are copied on the way in and
+    out, so callers can't change stored data by mutating them.
+    """
+    name = "memory"
+
+    def __init__(self):
+        self._collections = {}  # (user, collection) -> {id: record}, in insertion order
+        self._lock = threading.Lock()
+
+    def _records(self, collection: str) -> Dict[str, Dict[str, Any]]:
+        return self._collections.setdefault((current_user(), collection), {})
+
+    def put_many(self, collection, records):
+        with self._lock:
+            stored = self._records(collection)
+            for record in records:
+                stored[record["id"]] = copy.deepcopy(record)
+
+    def get_many(self, collection, ids):
+        with self._lock:
+            stored = self._records(collection)
+            return [copy.deepcopy(stored[record_id]) for record_id in ids if record_id in stored]
+
+    def update_many(self, collection, ids, fields):
+        with self._lock:
+            stored = self._records(collection)
+            for record_id in ids:
+                if record_id in stored:
+                    stored[record_id].update(copy.deepcopy(fields))
+
+    def scan(self, collection, where=None, since=None, until=None, limit=None, newest_first=False):
+        with self._lock:
+            found = select(self._records(collection).values(), where, since, until, limit, newest_first)
+            return copy.deepcopy(found)
+
+    def scan_after(self, collection, cursor=0):
+        with self._lock:
+            records = list(self._records(collection).values())
+            return copy.deepcopy(records[cursor:]), len(records)
+
+    def count(self, collection):
+        with self._lock:
+            return len(self._records(collection))
+
+    def clear(self):
+        """Drop every collection of every user."""
+        with self._lock:
+            self._collections.clear()
+
+# One in-memory engine per process, so the cortex and hippocampus modules
+# see the same data when both use it
+_memory_engine = MemoryEngine()
+
+def memory_engine() -> MemoryEngine:
+    """Return the process-wide in-memory engine."""
+    return _memory_engine
@@ -0,0 +1,171 @@
+import contextvars
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+# Requests without a user header use the original single-user files
+DEFAULT_USER = "default"
+USER_HEADER = "X-Engram-User"
+
+# Other users get their own directory of databases and memory files
+USERS_DIR = Path(os.environ.get("ENGRAM_USERS_DIR", "data/users"))
+
+# Users whose in-memory indexes are kept loaded per process
+MAX_OPEN_USERS = int(os.environ.get("ENGRAM_MAX_OPEN_USERS", "64"))
+
+# SQLite connections kept open per thread
+MAX_OPEN_DATABASES = int(os.environ.get("ENGRAM_MAX_OPEN_DATABASES", "32"))
+
+USER_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_user = contextvars.ContextVar("engram_user", default=None)
+
+def current_user() -> str:
+    """The user whose data the current request or background job touches."""
+    user = _user.get()
+    if user is not None:
+        return user
+    from flask import g, has_app_context
+    if has_app_context():
+        return g.get("engram_user", DEFAULT_USER)
+    return DEFAULT_USER
+
+class as_user:
+    """
+    Run a block on behalf of a user outside a request (rollup jobs, scripts).
+
+        with as_user("alice"):
+            refresh_summaries()
+    """
+    def __init__(self, user: str):
+        self.user = user
+
+    def __enter__(self):
+        self.token = _user.set(self.user)
+        return self
+
+    def __exit__(self, *exc):
+        _user.reset(self.token)
+        return False
+
+def user_path(path) -> Path:
+    """Map one of the single-user storage paths to the current user's shard."""
+    user = current_user()
+    if user == DEFAULT_USER:
+        return Path(path)
+    return USERS_DIR / user / Path(path).name
+
+class LRUCache:
+    """
+    A bounded, thread-safe mapping that evicts the least recently used entry.
+    Values are created lazily by a factory; `on_evict` is called with evicted
+    values so they can release resources.
+    """
+    def __init__(self, maxsize: int, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def get_or_create(self, key, factory):
+        evicted = []
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+            value = self._items[key] = factory()
+            while len(self._items) > self.maxsize:
+                evicted.append(self._items.popitem(last=False)[1])
+        if self.on_evict:
+            for old in evicted:
+                self.on_evict(old)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A connection that stays open when the caller closes it, so the next
+    query on this thread skips reopening the file. Closing still discards
+    uncommitted changes, as a real close would.
+    """
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def release(self):
+        sqlite3.Connection.close(self)
+
+_local = threading.local()
+_initialized = set()  # (path, initializer) pairs whose schema exists
+_initialized_lock = threading.Lock()
+_forked_pools = []
+
+def _pool() -> LRUCache:
+    pool = getattr(_local, "pool", None)
+    if pool is None:
+        pool = _local.pool = LRUCache(MAX_OPEN_DATABASES, on_evict=PooledConnection.release)
+    return pool
+
+def connect(path, *initializers) -> sqlite3.Connection:
+    """
+    Return this thread's open connection to a database, opening it (and
+    running each initializer on it once per process) on first use.
+    """
+    path = str(path)
+
+    def _open():
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        return sqlite3.connect(path, factory=PooledConnection)
+
+    conn = _pool().get_or_create(path, _open)
+    if conn.in_transaction:
+        # Left open by a caller that raised before committing
+        conn.rollback()
+
+    for initializer in initializers:
+        key = (path, initializer)
+        if key not in _initialized:
+            with _initialized_lock:
+                if key not in _initialized:
+                    initializer(conn)
+                    _initialized.add(key)
+    return conn
+
+def _reset_after_fork():
+    """SQLite connections must not be used across fork; open new ones in the child."""
+    global _local, _initialized_lock
+    # Keep the inherited connections referenced so they are never closed here
+    _forked_pools.append(_local)
+    _local = threading.local()
+    _initialized_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def init_app(app):
+    """Route each request to the user named in the X-Engram-User header."""
+    from flask import g, request
+    from llm.responses import validation_error
+
+    @app.before_request
+    def _set_user():
+        user = request.headers.get(USER_HEADER) or DEFAULT_USER
+        if not USER_ID_PATTERN.match(user):
+            return validation_error("User id must be 1-64 letters, digits, '-' or '_'", USER_HEADER)
+        g.engram_user = user
@@ -0,0 +1,97 @@
+import os
+import threading
+from typing import Optional
+from .warmup import register_warmup
+
+# Context window the vLLM server is started with (see start_vllm.py --max-model-len)
+MAX_MODEL_LEN = int(os.environ.get("ENGRAM_MAX_MODEL_LEN", "2048"))
+
+# Path to a local tokenizer (a model directory or its tokenizer.json). When
+# unset or unloadable, token counts are estimated from character counts.
+TOKENIZER_PATH = os.environ.get("ENGRAM_TOKENIZER")
+
+# Starting characters-per-token ratio for English text with BPE tokenizers.
+# Refined at runtime from the prompt token counts the server reports.
+DEFAULT_CHARS_PER_TOKEN = 3.6
+
+_tokenizer = None
+_tokenizer_loaded = False
+_lock = threading.Lock()
+_chars_per_token = DEFAULT_CHARS_PER_TOKEN
+
+def _load_tokenizer():
+    """Load the local tokenizer once, preferring the lightweight tokenizers package."""
+    global _tokenizer, _tokenizer_loaded
+    with _lock:
+        if _tokenizer_loaded:
+            return _tokenizer
+        _tokenizer_loaded = True
+        if not TOKENIZER_PATH:
+            return None
+
+        tokenizer_file = TOKENIZER_PATH
+        if os.path.isdir(tokenizer_file):
+            tokenizer_file = os.path.join(tokenizer_file, "tokenizer.json")
+        try:
+            from tokenizers import Tokenizer
+            tokenizer = Tokenizer.from_file(tokenizer_file)
+            _tokenizer = lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+        except Exception:
+            try:
+                from transformers import AutoTokenizer
+                tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_PATH)
+                _tokenizer = lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+            except Exception as e:
+                print(f"Warning: Could not load tokenizer from {TOKENIZER_PATH}, estimating token counts: {e}")
+        return _tokenizer
+
+if TOKENIZER_PATH:
+    register_warmup("tokenizer", _load_tokenizer)
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the local tokenizer, or estimate them."""
+    if not text:
+        return 0
+    tokenizer = _load_tokenizer()
+    if tokenizer is not None:
+        return tokenizer(text)
+    return estimate_tokens(text)
+
+def estimate_tokens(text: str) -> int:
+    """Estimate tokens from the calibrated characters-per-token ratio, rounding up."""
+    return int(len(text) / _chars_per_token) + 1
+
+def record_usage(prompt_chars: int, prompt_tokens: Optional[int]):
+    """
+    Calibrate the estimator from a server-reported prompt token count.
+    Uses an exponential moving average so one odd prompt can't skew it.
+    """
+    global _chars_per_token
+    if not prompt_tokens or prompt_chars < 200:
+        return
+    observed = prompt_chars / prompt_tokens
+    with _lock:
+        _chars_per_token = 0.9 * _chars_per_token + 0.1 * observed
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, preferring a sentence or word boundary."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    # Shrink by the observed ratio until it fits; usually one or two passes
+    cut = len(text)
+    while cut > 0:
+        cut = int(cut * max_tokens / max(count_tokens(text[:cut]), 1) * 0.95)
+        if count_tokens(text[:cut]) <= max_tokens:
+            break
+
+    truncated = text[:cut]
+    boundary = max(truncated.rfind(". "), truncated.rfind("! "), truncated.rfind("? "))
+    if boundary > len(truncated) // 2:
+        return truncated[:boundary + 1]
+    space = truncated.rfind(" ")
+    if space > len(truncated) // 2:
+        truncated = truncated[:space]
+    return truncated.rstrip() + "..."
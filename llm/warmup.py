@@ -0,0 +1,121 @@
+# Background warm-up at startup
+#
+# Without it the first requests a worker serves pay every cold cost: LLM
+# model discovery and the first connection to vLLM, opening and migrating
+# databases, loading memories into the search index and summary buckets.
+# Modules register warm-up tasks when they are imported; start() runs each
+# on its own background thread once per process. Gunicorn workers call it
+# after fork and wait() for it before accepting connections; with the
+# development server, is_ready() turns true when all of them have finished or
+# failed, so /api/ready can keep a load balancer away until then.
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from .tenancy import DEFAULT_USER, as_user
+
+# Set ENGRAM_WARMUP=0 to skip warm-up; workers are then ready right away
+WARMUP_ENABLED = os.environ.get("ENGRAM_WARMUP", "1") != "0"
+
+# Users whose data is loaded by per-user tasks, e.g. "default,alice"
+WARMUP_USERS = [user.strip() for user in os.environ.get("ENGRAM_WARMUP_USERS", DEFAULT_USER).split(",") if user.strip()]
+
+# Seconds after which a worker reports ready even if tasks are still running
+WARMUP_TIMEOUT = float(os.environ.get("ENGRAM_WARMUP_TIMEOUT", "120"))
+
+_tasks = {}  # name -> (function, per_user)
+
+def register_warmup(name: str, func: Callable[[], None], per_user: bool = False):
+    """
+    Register a warm-up task. Tasks with per_user run once for each of
+    WARMUP_USERS, inside as_user().
+    """
+    _tasks[name] = (func, per_user)
+
+class _Task:
+    def __init__(self, name: str, func: Callable[[], None], users: Optional[List[str]]):
+        self.name = name
+        self.func = func
+        self.users = users
+        self.status = "pending"
+        self.seconds = None
+        self.error = None
+        self.done = threading.Event()
+
+    def run(self):
+        self.status = "running"
+        started = time.perf_counter()
+        try:
+            if self.users is None:
+                self.func()
+            else:
+                for user in self.users:
+                    with as_user(user):
+                        self.func()
+            self.status = "done"
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            print(f"Warm-up task {self.name} failed: {e}")
+        finally:
+            self.seconds = round(time.perf_counter() - started, 3)
+            self.done.set()
+
+    def info(self) -> Dict[str, object]:
+        info = {"status": self.status, "seconds": self.seconds}
+        if self.error:
+            info["error"] = self.error
+        return info
+
+_lock = threading.Lock()
+_running = None  # tasks of this process's warm-up, once started
+_started_at = None
+
+def start():
+    """Run the registered tasks on background threads, once per process."""
+    global _running, _started_at
+    with _lock:
+        if _running is not None:
+            return
+        _started_at = time.monotonic()
+        if not WARMUP_ENABLED:
+            _running = []
+            return
+        _running = [_Task(name, func, WARMUP_USERS if per_user else None) for name, (func, per_user) in _tasks.items()]
+    for task in _running:
+        threading.Thread(target=task.run, name=f"warmup-{task.name}", daemon=True).start()
+    print(f"Warming up: {', '.join(task.name for task in _running)}")
+
+def wait(timeout: Optional[float] = None) -> bool:
+    """Wait for warm-up to finish; returns whether it has."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for task in list(_running or []):
+        if not task.done.wait(None if deadline is None else max(0, deadline - time.monotonic())):
+            return False
+    return _running is not None
+
+def is_ready() -> bool:
+    """True once warm-up has finished, or has run for longer than WARMUP_TIMEOUT."""
+    if _running is None:
+        return False
+    return all(task.done.is_set() for task in _running) or time.monotonic() - _started_at > WARMUP_TIMEOUT
+
+def status() -> Dict[str, object]:
+    """Readiness and the state of each warm-up task."""
+    tasks = list(_running or [])
+    return {
+        "ready": is_ready(),
+        "started": _running is not None,
+        "seconds": round(time.monotonic() - _started_at, 3) if _started_at is not None else None,
+        "tasks": {task.name: task.info() for task in tasks},
+    }
+
+def _reset_after_fork():
+    """Warm-up threads don't survive fork; each worker starts its own."""
+    global _running, _started_at, _lock
+    _running = _started_at = None
+    _lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
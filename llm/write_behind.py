@@ -0,0 +1,235 @@
+# Durable write-behind buffer for slow stores and background jobs
+#
+# Requests only append items to a local SQLite outbox, which survives
+# crashes and restarts, and return. Background threads in each worker
+# claim batches from the outbox and hand them to a write function (the
+# Letta memory store, the vision model), flushing as soon as a batch fills
+# up or after a short interval. Failed batches are retried with backoff
+# and, after too many attempts, handed to a fallback so nothing is lost.
+# When the writer falls behind and the outbox fills up, producers wait for
+# it to drain and finally get WriteBufferFull instead of growing the
+# backlog without bound.
+
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List
+from llm.metrics import counter, histogram
+from llm.tenancy import as_user, connect, current_user
+
+# Defaults, tuned for the Letta memory outbox
+OUTBOX_PATH = "data/letta_outbox.db"
+
+# Flush when this many items are waiting, or after FLUSH_INTERVAL_SECONDS
+FLUSH_BATCH_SIZE = int(os.environ.get("ENGRAM_LETTA_BATCH_SIZE", "100"))
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("ENGRAM_LETTA_FLUSH_INTERVAL", "1.0"))
+
+# Backpressure: producers block once this many items are pending...
+MAX_PENDING = int(os.environ.get("ENGRAM_LETTA_MAX_PENDING", "10000"))
+# ...and give up after waiting this long for the backlog to drain
+BACKPRESSURE_TIMEOUT_SECONDS = 5.0
+
+# Attempts before a batch is written to the local fallback instead
+MAX_ATTEMPTS = 5
+MAX_BACKOFF_SECONDS = 60.0
+
+# A claim older than this belongs to a worker that died mid-flush
+CLAIM_TIMEOUT_SECONDS = 300.0
+
+flush_duration = histogram(
+    "engram_write_behind_flush_seconds", "Duration of write-behind batch writes by queue")
+outbox_results = counter(
+    "engram_write_behind_items_total", "Items flushed from write-behind outboxes by queue and result")
+
+class WriteBufferFull(Exception):
+    """The writer is too far behind to accept more items right now."""
+
+class PartialWrite(Exception):
+    """
+    A write stored the first `written` items of its batch before failing;
+    only the rest are retried or handed to the fallback.
+    """
+    def __init__(self, written: int, error: Exception):
+        super().__init__(str(error))
+        self.written = written
+
+def init_outbox(conn):
+    """Create the outbox table."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id TEXT PRIMARY KEY,
+            user TEXT NOT NULL,
+            memory TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            claim TEXT,
+            claimed_at REAL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_next_attempt ON outbox (next_attempt_at)")
+    conn.commit()
+
+class WriteBehindBuffer:
+    """
+    Durable, batched, asynchronous writes to a slow store.
+
+    Items are dicts with a unique "id". `write(items)` handles a batch and
+    raises on failure, PartialWrite if it got part of the way through;
+    `fallback(items)` handles a batch that could not be
+    written after MAX_ATTEMPTS. Both run in a flusher thread on behalf of
+    the user who submitted the items. Up to `workers` batches are written
+    at once per process.
+    """
+    def __init__(self, write: Callable[[List[Dict[str, Any]]], None],
+                 fallback: Callable[[List[Dict[str, Any]]], None], path: str = OUTBOX_PATH,
+                 name: str = "letta", batch_size: int = FLUSH_BATCH_SIZE, workers: int = 1,
+                 max_pending: int = MAX_PENDING):
+        self.write = write
+        self.fallback = fallback
+        self.path = path
+        self.name = name
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_pending = max_pending
+        self._reset()
+
+    def _reset(self):
+        self._wakeup = threading.Event()
+        self._drained = threading.Condition()
+        self._threads = []
+        self._worker_lock = threading.Lock()
+
+    def _connect(self):
+        return connect(self.path, init_outbox)
+
+    def pending(self) -> int:
+        """Items waiting to be written, across all workers."""
+        return self._connect().execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def contains(self, item_id: str) -> bool:
+        """Whether an item is still waiting to be written."""
+        return self._connect().execute("SELECT 1 FROM outbox WHERE id = ?", (item_id,)).fetchone() is not None
+
+    def submit(self, items: List[Dict[str, Any]]):
+        """
+        Durably queue items for the writer and return immediately.
+        Raises WriteBufferFull if the backlog does not drain in time.
+        """
+        self.start()
+        deadline = time.monotonic() + BACKPRESSURE_TIMEOUT_SECONDS
+        while self.pending() + len(items) > self.max_pending:
+            self._wakeup.set()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise WriteBufferFull(
+                    f"The {self.name} queue is behind ({self.max_pending} items pending), try again later")
+            with self._drained:
+                self._drained.wait(min(remaining, FLUSH_INTERVAL_SECONDS))
+
+        user = current_user()
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO outbox (id, user, memory) VALUES (?, ?, ?)",
+                [(item["id"], user, json.dumps(item)) for item in items]
+            )
+        if self.pending() >= self.batch_size:
+            self._wakeup.set()
+
+    def _claim(self) -> list:
+        """Claim up to a batch of due rows for this flush."""
+        claim = str(uuid.uuid4())
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute('''
+                UPDATE outbox SET claim = ?, claimed_at = ?
+                WHERE id IN (
+                    SELECT id FROM outbox
+                    WHERE next_attempt_at <= ? AND (claim IS NULL OR claimed_at < ?)
+                    ORDER BY rowid LIMIT ?
+                )
+            ''', (claim, now, now, now - CLAIM_TIMEOUT_SECONDS, self.batch_size))
+        return conn.execute(
+            "SELECT id, user, memory, attempts FROM outbox WHERE claim = ? ORDER BY rowid", (claim,)
+        ).fetchall()
+
+    def flush(self) -> int:
+        """Write every due batch; returns the number of items written or handed to the fallback."""
+        done = 0
+        while True:
+            rows = self._claim()
+            if not rows:
+                return done
+
+            by_user = {}
+            for item_id, user, item, attempts in rows:
+                by_user.setdefault(user, []).append((item_id, json.loads(item), attempts))
+
+            for user, claimed in by_user.items():
+                ids = [item_id for item_id, _, _ in claimed]
+                items = [item for _, item, _ in claimed]
+                attempts = max(attempt for _, _, attempt in claimed) + 1
+                with as_user(user):
+                    try:
+                        with flush_duration.time(queue=self.name):
+                            self.write(items)
+                        outbox_results.inc(len(ids), queue=self.name, result="written")
+                    except Exception as e:
+                        written = e.written if isinstance(e, PartialWrite) else 0
+                        if written:
+                            self._delete(ids[:written])
+                            outbox_results.inc(written, queue=self.name, result="written")
+                            done += written
+                            ids, items = ids[written:], items[written:]
+                        if attempts < MAX_ATTEMPTS:
+                            self._retry_later(ids, attempts)
+                            print(f"{self.name} write failed (attempt {attempts}), retrying: {e}")
+                            outbox_results.inc(len(ids), queue=self.name, result="retried")
+                            continue
+                        print(f"{self.name} write failed {attempts} times, using fallback: {e}")
+                        self.fallback(items)
+                        outbox_results.inc(len(ids), queue=self.name, result="fallback")
+                self._delete(ids)
+                done += len(ids)
+
+            with self._drained:
+                self._drained.notify_all()
+
+    def _retry_later(self, ids: List[str], attempts: int):
+        delay = min(2 ** attempts, MAX_BACKOFF_SECONDS)
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, claim = NULL WHERE id = ?",
+                [(attempts, time.time() + delay, item_id) for item_id in ids]
+            )
+
+    def _delete(self, ids: List[str]):
+        conn = self._connect()
+        with conn:
+            conn.executemany("DELETE FROM outbox WHERE id = ?", [(item_id,) for item_id in ids])
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(FLUSH_INTERVAL_SECONDS)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Write-behind flush failed: {e}")
+
+    def start(self):
+        """Start the flusher threads if they are not running; they also drain rows left by a crash."""
+        with self._worker_lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f"{self.name}-write-behind", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def after_fork(self):
+        """Threads don't survive fork; give the child its own flushers."""
+        self._reset()
+        self.start()
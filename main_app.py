@@ -7,10 +7,31 @@ This launches the web application for fragment input and memory creation.
 
 import sys
 import os
-from flask import Flask, send_from_directory
+import time
+import argparse
+from flask import Flask, Response, request
 from flask_cors import CORS
 
 def main():
+    parser = argparse.ArgumentParser(description="Start the Engram web application")
+    parser.add_argument(
+        "--production",
+        action="store_true",
+        help="Serve with pre-forked gunicorn workers instead of the Flask development server"
+    )
+    parser.add_argument(
+        "--host",
+        default=os.environ.get("ENGRAM_HOST", "0.0.0.0"),
+        help="Host to bind to (default: 0.0.0.0)"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=int(os.environ.get("ENGRAM_PORT", "5000")),
+        help="Port to listen on (default: 5000)"
+    )
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("🧠 Engram Web Application")
     print("=" * 60)
@@ -39,10 +60,24 @@ def main():
         modules_status.append("vision")
     except ImportError as e:
         print(f"⚠️  Vision module not available: {e}")
+        
+    try:
+        from modules.sync.api import sync_bp
+        print("✓ Sync module available")
+        modules_status.append("sync")
+    except ImportError as e:
+        print(f"⚠️  Sync module not available: {e}")
+        
+    try:
+        from modules.archive.api import archive_bp
+        print("✓ Archive module available")
+        modules_status.append("archive")
+    except ImportError as e:
+        print(f"⚠️  Archive module not available: {e}")
     
     print(f"Starting Engram Modular API with {len(modules_status)} modules...")
     print()
-    print("🌐 Web Interface: http://localhost:5000")
+    print(f"🌐 Web Interface: http://localhost:{args.port}")
     print("📱 Mobile friendly: Access from any device on your network")
     print()
     print("Modules loaded:", ", ".join(modules_status))
@@ -58,19 +93,33 @@ def main():
     print("API Endpoints:")
     print("  Global:")
     print("    GET  /api/health                    - System health check")
+    print("    GET  /api/ready                     - 200 once warm-up has finished, 503 before")
+    print("    GET  /api/metrics                   - Prometheus metrics")
     print("  Cortex:")
     print("    POST /api/cortex/fragments          - Add fragments from text")
     print("    POST /api/cortex/fragments/file     - Upload file and extract fragments")
+    print("    POST /api/cortex/fragments/bulk     - Bulk import fragments (NDJSON)")
     print("    GET  /api/cortex/fragments          - Get stored fragments")
     print("    POST /api/cortex/memory/build       - Build memory from content")
     print("    GET  /api/cortex/sessions           - Get all sessions")
     print("    POST /api/cortex/sessions           - Create new session")
     print("  Hippocampus:")
     print("    POST /api/hippocampus/memories      - Create new memory")
+    print("    POST /api/hippocampus/memories/bulk - Bulk import memories (NDJSON)")
     print("    GET  /api/hippocampus/memories      - Get memories")
     print("    POST /api/hippocampus/memories/query - Query memories")
+    print("    GET  /api/hippocampus/summaries     - Period summaries (?period=2022)")
     print("  Vision:")
     print("    GET  /api/vision/health             - Vision module status")
+    print("    POST /api/vision/images             - Upload images (multipart or raw body)")
+    print("    GET  /api/vision/images/<id>/thumbnail - Cached thumbnail (?size=256)")
+    print("    POST /api/vision/describe/batch     - Queue images for description")
+    print("    GET  /api/vision/jobs               - Description queue and images/s")
+    print("  Sync:")
+    print("    GET  /api/sync/changes              - Changes since a sequence number (?since=)")
+    print("  Archive:")
+    print("    GET  /api/archive/export            - Download a consistent archive")
+    print("    POST /api/archive/import            - Import an archive, resuming an interrupted one")
     print()
     print("Prerequisites:")
     print("  1. Start vLLM server: python llm/start_vllm.py --model /path/to/model")
@@ -80,9 +129,12 @@ def main():
     print("=" * 60)
     
     try:
-        # Start the Flask server
-        app = create_app()
-        app.run(host='0.0.0.0', port=5000, debug=False)
+        if args.production:
+            run_production_server(args.host, args.port)
+        else:
+            # Start the Flask development server
+            app = create_app()
+            app.run(host=args.host, port=args.port, debug=False)
         
     except ImportError as e:
         print(f"❌ Error importing modular API: {e}")
@@ -98,23 +150,114 @@ def main():
         print(f"❌ Error starting web server: {e}")
         sys.exit(1)
 
-def create_app():
-    """Create and configure the Flask application."""
+def production_options(host, port):
+    """Gunicorn settings for production mode, tunable through environment variables."""
+    return {
+        "bind": f"{host}:{port}",
+        "workers": int(os.environ.get("ENGRAM_WORKERS", os.cpu_count() or 1)),
+        "worker_class": "gthread",
+        "threads": int(os.environ.get("ENGRAM_THREADS", "4")),
+        # LLM calls can take a while; don't kill workers waiting on vLLM
+        "timeout": int(os.environ.get("ENGRAM_WORKER_TIMEOUT", "120")),
+        "graceful_timeout": 30,
+        # Recycle workers after this many requests (0 = never)
+        "max_requests": int(os.environ.get("ENGRAM_MAX_REQUESTS", "0")),
+        "max_requests_jitter": int(os.environ.get("ENGRAM_MAX_REQUESTS", "0")) // 10,
+        # Import once in the master and fork; ENGRAM_PRELOAD=0 re-imports code on reload
+        "preload_app": os.environ.get("ENGRAM_PRELOAD", "1") != "0",
+        "accesslog": "-",
+    }
+
+def run_production_server(host, port):
+    """
+    Serve the app with pre-forked gunicorn worker processes, each running a
+    thread pool. Send SIGHUP to the master process for a graceful reload.
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("❌ Production mode requires gunicorn: pip install gunicorn")
+        sys.exit(1)
+    
+    options = production_options(host, port)
+    print(f"Production mode: {options['workers']} workers x {options['threads']} threads")
+    print("Graceful reload: kill -HUP <master pid>")
+    if options["workers"] > 1 and os.environ.get("ENGRAM_MEMORY_BACKEND", "json").lower() != "sqlite":
+        print("⚠️  Only the SQLite memory store is safe for concurrent workers; set ENGRAM_MEMORY_BACKEND=sqlite")
+    if options["workers"] > 1 and os.environ.get("ENGRAM_FRAGMENT_BACKEND", "sqlite").lower() == "memory":
+        print("⚠️  The in-memory fragment store is not shared between workers")
+    
+    # Every worker writes its metrics here, so /api/metrics covers all of them
+    from llm import metrics
+    metrics.set_multiprocess_dir(os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.path.join("data", "metrics"))
+    metrics.clear_process_files()
+    
+    def post_worker_init(worker):
+        # Warm-up threads wouldn't survive the fork; each worker runs its own,
+        # and only starts accepting connections once it is warm. Heartbeats
+        # keep the master from timing out a worker that is still warming up.
+        from llm import warmup
+        warmup.start()
+        deadline = time.monotonic() + warmup.WARMUP_TIMEOUT
+        while not warmup.wait(min(1.0, max(0.0, deadline - time.monotonic()))):
+            if time.monotonic() >= deadline:
+                print(f"Worker {os.getpid()} still warming up after {warmup.WARMUP_TIMEOUT:.0f}s; serving anyway")
+                break
+            worker.notify()
+    
+    def worker_exit(server, worker):
+        metrics.flush()
+    
+    def child_exit(server, worker):
+        # Keep an exited worker's counts, but not one file per worker ever started
+        metrics.mark_process_dead(worker.pid)
+    
+    class EngramServer(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+            self.cfg.set("post_worker_init", post_worker_init)
+            self.cfg.set("worker_exit", worker_exit)
+            self.cfg.set("child_exit", child_exit)
+        
+        def load(self):
+            return create_app(warm_up=False)
+    
+    EngramServer().run()
+
+def create_app(warm_up=True):
+    """
+    Create and configure the Flask application. With warm_up, indexes,
+    caches and the LLM connection are warmed on background threads (see
+    llm/warmup.py); /api/ready reports when they are.
+    """
     # Add the project root to the path
     sys.path.append(os.path.dirname(__file__))
     
     from modules.cortex.api import cortex_bp
     from modules.hippocampus.api import hippocampus_bp
     from modules.vision.api import vision_bp
-    from llm.responses import success_response
+    from modules.sync.api import sync_bp
+    from modules.archive.api import archive_bp
+    from llm.responses import success_response, not_found_error, retry_later_error
+    from static_assets import StaticAssets
+    from llm import compression, metrics, profiling, scheduler, tenancy, warmup
+    from llm.responses import FastJSONProvider
     
     app = Flask(__name__)
     CORS(app)  # Enable CORS for Flutter web app
+    app.json = FastJSONProvider(app)
+    metrics.init_app(app)
+    profiling.init_app(app)
+    tenancy.init_app(app)
+    compression.init_app(app)
     
     # Register module blueprints
     app.register_blueprint(cortex_bp)
     app.register_blueprint(hippocampus_bp)
     app.register_blueprint(vision_bp)
+    app.register_blueprint(sync_bp)
+    app.register_blueprint(archive_bp)
     
     # Root health check
     @app.route('/api/health', methods=['GET'])
@@ -123,31 +266,59 @@ def create_app():
         return success_response({
             "status": "healthy", 
             "service": "engram-api",
-            "modules": ["cortex", "hippocampus", "vision"]
+            "modules": ["cortex", "hippocampus", "vision", "sync", "archive"],
+            "llm_scheduler": scheduler.stats(),
+            "ready": warmup.is_ready()
         })
     
-    # Serve Flutter web app
+    @app.route('/api/ready', methods=['GET'])
+    def readiness_check():
+        """
+        Readiness for load balancers: 503 until this process has warmed up.
+        Production workers only accept connections once warm; this is for
+        the development server and other single-process setups.
+        """
+        status = warmup.status()
+        if status["ready"]:
+            return success_response(status)
+        return retry_later_error("Warming up", retry_after=1, details=status)
+    
+    @app.route('/api/metrics', methods=['GET'])
+    def metrics_endpoint():
+        """Request, LLM, SQLite and cache metrics in the Prometheus text format."""
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+    
+    # Serve Flutter web app from memory, precompressed and with ETags
+    flutter_build_path = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 
+        'flutter_app', 'build', 'web'
+    )
+    static_assets = StaticAssets(flutter_build_path)
+    if static_assets.assets:
+        print(f"✓ Loaded {len(static_assets.assets)} web assets ({static_assets.total_bytes / 1e6:.1f} MB with compressed variants)")
+    
     @app.route('/')
     def index():
         """Serve the Flutter web app."""
-        flutter_build_path = os.path.join(
-            os.path.dirname(__file__), 
-            'flutter_app', 'build', 'web'
-        )
-        return send_from_directory(flutter_build_path, 'index.html')
+        response = static_assets.response('index.html', request)
+        if response is None:
+            return not_found_error("Flutter web build (run `flutter build web`)")
+        return response
 
     @app.route('/<path:filename>')
     def flutter_static(filename):
         """Serve Flutter web app static files."""
-        flutter_build_path = os.path.join(
-            os.path.dirname(__file__), 
-            'flutter_app', 'build', 'web'
-        )
-        try:
-            return send_from_directory(flutter_build_path, filename)
-        except:
-            # If file not found, serve index.html for Flutter routing
-            return send_from_directory(flutter_build_path, 'index.html')
+        response = static_assets.response(filename, request)
+        if response is not None:
+            return response
+        
+        # Missing files are 404s; other paths are Flutter routes served by index.html
+        if os.path.splitext(filename)[1] or filename.startswith('api/'):
+            return not_found_error(filename)
+        return index()
+    
+    if warm_up:
+        warmup.start()
     
     return app
 
@@ -0,0 +1 @@
+# Archive module - online backups, export and import
@@ -0,0 +1,42 @@
+from flask import Blueprint, Response, request, stream_with_context
+from datetime import datetime
+import os
+import sys
+from .archive import ArchiveError, export_archive, import_archive, get_import
+
+# Import shared utilities from the llm directory
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from llm.responses import success_response, error_response, not_found_error, server_error, retry_later_error
+from llm.write_behind import WriteBufferFull
+
+# Create blueprint for archive routes
+archive_bp = Blueprint('archive', __name__, url_prefix='/api/archive')
+
+@archive_bp.route('/export', methods=['GET'])
+def export_endpoint():
+    """Stream a consistent archive of the user's fragments, sessions, memories and embeddings."""
+    filename = f"engram-{datetime.now().strftime('%Y%m%d-%H%M%S')}.engram"
+    return Response(stream_with_context(export_archive()), mimetype='application/octet-stream',
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@archive_bp.route('/import', methods=['POST'])
+def import_endpoint():
+    """Import an archive from the request body, skipping chunks already imported (?resume=false to redo them)."""
+    resume = request.args.get('resume', 'true').lower() != 'false'
+    try:
+        return success_response(import_archive(request.stream, resume), "Archive imported")
+    except ArchiveError as e:
+        # Chunks before the bad one are kept; sending the archive again resumes after them
+        return error_response(str(e), 400, {"progress": e.progress} if e.progress else None)
+    except WriteBufferFull as e:
+        return retry_later_error(str(e))
+    except Exception as e:
+        return server_error(f"Archive import failed: {str(e)}")
+
+@archive_bp.route('/imports/<archive_id>', methods=['GET'])
+def get_import_endpoint(archive_id):
+    """Chunks and records committed by imports of an archive."""
+    progress = get_import(archive_id)
+    if progress is None:
+        return not_found_error("Archive import")
+    return success_response(progress)
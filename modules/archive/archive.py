@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# Online backups: consistent export and resumable import of an archive
+#
+# Export asks the fragment and memory storage engines for their records;
+# the SQLite engines first copy fragments.db and memories.db with SQLite's
+# online backup API (see llm/snapshots.py), so writes during the copy
+# neither wait for it nor restart it. Sessions, source documents,
+# fragments, session links, memories and embeddings are then streamed into
+# an archive of independently compressed chunks:
+#
+#   {"format": "engram-archive", "version": 1, "archive_id": "...", "encoding": "gzip", ...}\n
+#   {"chunk": 0, "kind": "sessions", "records": 1000, "size": 48213, "sha256": "..."}\n
+#   <size bytes: compressed NDJSON, one record per line>
+#   ...
+#   {"end": true, "chunks": 42, "records": {"sessions": 1000, ...}}\n
+#
+# Only one chunk is held in memory on either side. Import checks each
+# chunk's checksum, commits it as one batch and records how many chunks of
+# the archive it has committed, so sending an interrupted archive again
+# skips the chunks already stored. Records keep their ids and are written
+# as upserts.
+#
+#     python -m modules.archive.archive export backup.engram [--user alice]
+#     python -m modules.archive.archive import backup.engram [--user alice]
+
+import base64
+import hashlib
+import json
+import os
+import uuid
+from contextlib import ExitStack
+from datetime import datetime
+from dateutil import tz
+import numpy as np
+from llm.compression import ENCODINGS, compress, decompress
+from llm.metrics import time_sqlite
+from llm.profiling import span
+from llm.tenancy import current_user
+from modules.cortex import database as fragment_db
+
+ARCHIVE_FORMAT = "engram-archive"
+ARCHIVE_VERSION = 2
+
+# Record kinds in the order they are written and must be imported
+KINDS = ("sessions", "documents", "fragments", "links", "memories", "embeddings")
+
+# The kinds each archive version that can still be imported has
+VERSION_KINDS = {1: ("sessions", "fragments", "links", "memories", "embeddings"), ARCHIVE_VERSION: KINDS}
+
+# Records per archive chunk
+CHUNK_RECORDS = int(os.environ.get("ENGRAM_ARCHIVE_CHUNK_RECORDS", "1000"))
+
+# Upper bounds for a header line and a compressed chunk in an archive
+MAX_HEADER_BYTES = 64 * 1024
+MAX_CHUNK_BYTES = 256 * 1024 * 1024
+
+class ArchiveError(ValueError):
+    """
+    The archive is malformed, truncated or fails a checksum. progress is
+    what the import committed before the error, when it got that far.
+    """
+    def __init__(self, message, progress=None):
+        super().__init__(message)
+        self.progress = progress
+
+def _encode_documents(batches):
+    """Documents with their compressed content as base64."""
+    for records in batches:
+        yield [{**record, "content": base64.b64encode(record["content"]).decode()} for record in records]
+
+def _fragment_sources(stack):
+    """(kind, batches) for sessions, documents, fragments and links."""
+    kinds = ["sessions", "documents", "fragments", "links"]
+    batches = fragment_db.engine.export_batches(kinds, stack, CHUNK_RECORDS)
+    batches["documents"] = _encode_documents(batches["documents"])
+    return [(kind, batches[kind]) for kind in kinds]
+
+def _memory_batches(stack):
+    from modules.hippocampus import memory
+    return memory.local_store.export_batches(["memories"], stack, CHUNK_RECORDS)["memories"]
+
+def _embedding_batches():
+    """
+    The embeddings stored when this is called, i.e. when the database
+    snapshots are taken; rows appended while the export streams are left
+    out, like other writes made after the snapshots.
+    """
+    from modules.hippocampus.embeddings import get_store
+    store = get_store()
+    limit = len(store)
+
+    def batches():
+        for rows in store.iter_rows(CHUNK_RECORDS, limit):
+            yield [{"id": memory_id, "vector": base64.b64encode(vector.astype("<f4").tobytes()).decode()}
+                   for memory_id, vector in rows]
+    return batches()
+
+def _line(value) -> bytes:
+    return json.dumps(value).encode() + b"\n"
+
+def export_archive():
+    """
+    Yield an archive of the current user's sessions, source documents,
+    fragments, links, memories and embeddings as byte strings, one chunk at
+    a time.
+    """
+    encoding = ENCODINGS[0]
+    yield _line({
+        "format": ARCHIVE_FORMAT,
+        "version": ARCHIVE_VERSION,
+        "archive_id": str(uuid.uuid4()),
+        "created_at": datetime.now(tz=tz.UTC).isoformat(),
+        "user": current_user(),
+        "encoding": encoding,
+    })
+
+    counts = {kind: 0 for kind in KINDS}
+    chunks = 0
+    with ExitStack() as stack:
+        sources = _fragment_sources(stack)
+        sources.append(("memories", _memory_batches(stack)))
+        sources.append(("embeddings", _embedding_batches()))
+        for kind, batches in sources:
+            for records in batches:
+                payload = compress(b"".join(_line(record) for record in records), encoding)
+                yield _line({
+                    "chunk": chunks,
+                    "kind": kind,
+                    "records": len(records),
+                    "size": len(payload),
+                    "sha256": hashlib.sha256(payload).hexdigest(),
+                }) + payload
+                counts[kind] += len(records)
+                chunks += 1
+
+    yield _line({"end": True, "chunks": chunks, "records": counts})
+    print(f"Exported archive: {chunks} chunks, {counts}")
+
+@fragment_db.register_schema
+def init_imports(conn):
+    """Create the table of archive import progress in a fragments database."""
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS archive_imports (
+                archive_id TEXT PRIMARY KEY,
+                chunks INTEGER NOT NULL DEFAULT 0,
+                records INTEGER NOT NULL DEFAULT 0,
+                completed_at TEXT,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+
+@time_sqlite("archive")
+def get_import(archive_id):
+    """Progress of an archive import, or None if it was never started."""
+    conn = fragment_db.get_connection()
+    row = conn.execute(
+        "SELECT archive_id, chunks, records, completed_at, updated_at FROM archive_imports WHERE archive_id = ?",
+        (archive_id,)
+    ).fetchone()
+    conn.close()
+    if row is None:
+        return None
+    return dict(zip(["archive_id", "chunks", "records", "completed_at", "updated_at"], row))
+
+@time_sqlite("archive")
+def _save_progress(archive_id, chunks, records, completed=False):
+    now = datetime.now(tz=tz.UTC).isoformat()
+    conn = fragment_db.get_connection()
+    with conn:
+        conn.execute('''
+            INSERT INTO archive_imports (archive_id, chunks, records, completed_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (archive_id) DO UPDATE SET
+                chunks = excluded.chunks, records = excluded.records,
+                completed_at = excluded.completed_at, updated_at = excluded.updated_at
+        ''', (archive_id, chunks, records, now if completed else None, now))
+    conn.close()
+
+def _read_line(stream):
+    line = stream.readline(MAX_HEADER_BYTES + 1)
+    if not line:
+        raise ArchiveError("Archive is truncated")
+    if not line.endswith(b"\n"):
+        raise ArchiveError("Archive header line is too long or truncated")
+    try:
+        entry = json.loads(line)
+    except ValueError as e:
+        raise ArchiveError(f"Invalid archive header: {e}")
+    if not isinstance(entry, dict):
+        raise ArchiveError("Invalid archive header: not a JSON object")
+    return entry
+
+def _is_count(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+def _read_exact(stream, size):
+    data = bytearray()
+    while len(data) < size:
+        block = stream.read(min(size - len(data), 1024 * 1024))
+        if not block:
+            raise ArchiveError("Archive is truncated")
+        data += block
+    return bytes(data)
+
+def _commit(kind, records):
+    """Store one chunk of records."""
+    if kind == "sessions":
+        fragment_db.engine.put_many("sessions", records)
+    elif kind == "documents":
+        fragment_db.engine.put_many("documents", [{**record, "content": base64.b64decode(record["content"])}
+                                                  for record in records])
+    elif kind == "fragments":
+        fragment_db.engine.put_many("fragments", records)
+    elif kind == "links":
+        fragment_db.link_fragments([(record["fragment_id"], record["session_id"]) for record in records])
+    elif kind == "memories":
+        from modules.hippocampus.memory import add_memories
+        add_memories(records)
+    else:
+        from modules.hippocampus.embeddings import get_store
+        get_store().add([(record["id"], np.frombuffer(base64.b64decode(record["vector"]), dtype="<f4"))
+                         for record in records])
+
+@span("import_archive")
+def import_archive(stream, resume=True):
+    """
+    Import an archive from a binary stream (a file or request.stream),
+    committing it chunk by chunk. With resume, chunks an earlier import of
+    the same archive committed are read and checked but not stored again.
+    Returns a summary; raises ArchiveError on a bad archive, after keeping
+    the chunks committed before it.
+    """
+    header = _read_line(stream)
+    if header.get("format") != ARCHIVE_FORMAT:
+        raise ArchiveError("Not an Engram archive")
+    kinds = VERSION_KINDS.get(header.get("version"))
+    if kinds is None:
+        raise ArchiveError(f"Unsupported archive version: {header.get('version')}")
+    archive_id = header.get("archive_id")
+    if not isinstance(archive_id, str) or not archive_id:
+        raise ArchiveError("Archive header has no archive_id")
+    encoding = header.get("encoding", "gzip")
+
+    progress = get_import(archive_id) if resume else None
+    if progress and progress["completed_at"]:
+        return {"archive_id": archive_id, "status": "already imported", **progress}
+    done = progress["chunks"] if progress else 0
+    records = progress["records"] if progress else 0
+
+    try:
+        return _import_chunks(stream, archive_id, kinds, encoding, done, records)
+    except ArchiveError as e:
+        e.progress = get_import(archive_id)
+        raise
+
+def _import_chunks(stream, archive_id, kinds, encoding, done, records):
+    counts = {kind: 0 for kind in kinds}
+    chunk = 0
+    kind_order = 0
+    while True:
+        entry = _read_line(stream)
+        if entry.get("end"):
+            break
+        if entry.get("chunk") != chunk:
+            raise ArchiveError(f"Expected chunk {chunk}, found {entry.get('chunk')}")
+        if entry.get("kind") not in kinds[kind_order:]:
+            raise ArchiveError(f"Chunk {chunk} has an unknown or out-of-order kind: {entry.get('kind')}")
+        kind_order = kinds.index(entry["kind"])
+        if not _is_count(entry.get("size")) or entry["size"] > MAX_CHUNK_BYTES:
+            raise ArchiveError(f"Chunk {chunk} has an invalid size")
+        if not _is_count(entry.get("records")):
+            raise ArchiveError(f"Chunk {chunk} has an invalid record count")
+
+        payload = _read_exact(stream, entry["size"])
+        if hashlib.sha256(payload).hexdigest() != entry.get("sha256"):
+            raise ArchiveError(f"Chunk {chunk} fails its checksum")
+        counts[entry["kind"]] += entry["records"]
+
+        if chunk >= done:
+            try:
+                lines = decompress(payload, encoding).splitlines()
+                batch = [json.loads(line) for line in lines if line.strip()]
+            except (ValueError, OSError) as e:
+                raise ArchiveError(f"Chunk {chunk} can't be decoded: {e}")
+            if not all(isinstance(record, dict) for record in batch):
+                raise ArchiveError(f"Chunk {chunk} has records that aren't JSON objects")
+            if len(batch) != entry["records"]:
+                raise ArchiveError(f"Chunk {chunk} has {len(batch)} records, expected {entry['records']}")
+            _commit(entry["kind"], batch)
+            records += len(batch)
+            _save_progress(archive_id, chunk + 1, records)
+        chunk += 1
+
+    if entry.get("chunks") != chunk or entry.get("records") != counts:
+        raise ArchiveError(f"Archive trailer doesn't match its {chunk} chunks")
+    _save_progress(archive_id, chunk, records, completed=True)
+    print(f"Imported archive {archive_id}: {chunk - min(done, chunk)} chunks, {counts}")
+    return {
+        "archive_id": archive_id,
+        "status": "imported",
+        "chunks": chunk,
+        "skipped_chunks": min(done, chunk),
+        "records": counts,
+    }
+
+def main():
+    import argparse
+    from llm.tenancy import as_user, DEFAULT_USER
+
+    parser = argparse.ArgumentParser(description="Export or import an Engram archive")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="Archive file")
+    parser.add_argument("--user", default=DEFAULT_USER, help="User whose data to export or import into")
+    parser.add_argument("--no-resume", action="store_true", help="Import every chunk, even ones imported before")
+    args = parser.parse_args()
+
+    with as_user(args.user):
+        if args.command == "export":
+            with open(args.path, "wb") as f:
+                for data in export_archive():
+                    f.write(data)
+        else:
+            with open(args.path, "rb") as f:
+                print(json.dumps(import_archive(f, resume=not args.no_resume), indent=2))
+
+if __name__ == "__main__":
+    main()
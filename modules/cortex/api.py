@@ -1,12 +1,18 @@
 from flask import Blueprint, request, send_from_directory
 import base64
 import os
-from .database import get_fragments, get_sessions, create_session
+from .database import get_fragments, get_sessions, get_stats, create_session
 from .processor import add_fragments_from_input, add_fragments_from_file, process_fragments_to_memory
+from .processor import prepare_bulk_record, add_bulk_fragments
 
 # Import shared utilities from the llm directory
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from llm.bulk import bulk_ingest, ndjson_response, parse_batch_size, MAX_BATCH_SIZE
+from llm.prompts import get_prompt, register_prompt
+from llm.responses import list_response, retry_later_error
+from llm.scheduler import LLMBusy
+from llm.write_behind import WriteBufferFull
 try:
     from llm.responses import success_response, error_response, validation_error, server_error
     from llm.client import create_llm_client
@@ -31,7 +37,7 @@ except ImportError:
     
     # Simple LLM client fallback
     class SimpleLLMClient:
-        def query(self, prompt, system_message=None, max_tokens=1000, temperature=0.7):
+        def query(self, prompt, system_message=None, max_tokens=1000, temperature=0.7, prompt_id=None):
             # This would need to be implemented if shared client is not available
             return None
         def get_available_models(self):
@@ -39,6 +45,12 @@ except ImportError:
     
     cortex_llm = SimpleLLMClient()
 
+register_prompt(
+    "build_memory", 1,
+    system="You are helping build memories from fragments of text. Try to infer what the user is writing about. Then, complete the thoughts so they are full sentences. Your task is add text to make the fragments the user provides seem like a complete journal entry. Do not add any new details but try to add words so there is clarity.",
+    user="Text to build into memory:\n{content}"
+)
+
 # Create blueprint for cortex routes
 cortex_bp = Blueprint('cortex', __name__, url_prefix='/api/cortex')
 
@@ -93,6 +105,23 @@ def upload_file():
     except Exception as e:
         return server_error(f"Error processing file: {str(e)}")
 
+@cortex_bp.route('/fragments/bulk', methods=['POST'])
+def bulk_add_fragments():
+    """Add fragments from an NDJSON stream, streaming back per-line status."""
+    batch_size = parse_batch_size(request.args.get('batch_size', type=int))
+    if batch_size is None:
+        return validation_error(f"batch_size must be between 1 and {MAX_BATCH_SIZE}", "batch_size")
+    
+    source = request.args.get('source', 'bulk_import')
+    session_id = request.args.get('session_id')
+    
+    return ndjson_response(bulk_ingest(
+        request.stream,
+        prepare=lambda record: prepare_bulk_record(record, source, session_id),
+        commit=add_bulk_fragments,
+        batch_size=batch_size
+    ))
+
 @cortex_bp.route('/fragments', methods=['GET'])
 def get_fragments_endpoint():
     """Get fragments from database."""
@@ -106,7 +135,7 @@ def get_fragments_endpoint():
     
     try:
         fragments = get_fragments(session_id, processed, limit)
-        return success_response({"fragments": fragments})
+        return list_response("fragments", fragments)
     except Exception as e:
         return server_error(f"Error retrieving fragments: {str(e)}")
 
@@ -131,6 +160,10 @@ def process_fragments():
             return error_response(result['error'])
         
         return success_response(result, "Fragments processed into memory")
+    except LLMBusy as e:
+        return retry_later_error(str(e), e.status_code, e.retry_after)
+    except WriteBufferFull as e:
+        return retry_later_error(str(e))
     except Exception as e:
         return server_error(f"Error processing fragments: {str(e)}")
 
@@ -147,15 +180,15 @@ def build_memory():
     
     try:
         # Use cortex LLM client to build memory
-        system_message = "You are helping build memories from fragments of text. Try to infer what the user is writing about. Then, complete the thoughts so they are full sentences. Your task is add text to make the fragments the user provides seem like a complete journal entry. Do not add any new details but try to add words so there is clarity."
-        
-        prompt = f"Text to build into memory:\n{content}"
+        template = get_prompt("build_memory")
+        system_message, prompt = template.render(content=content)
         
         built_content = cortex_llm.query(
             prompt=prompt,
             system_message=system_message,
             max_tokens=1000,
-            temperature=0.7
+            temperature=0.7,
+            prompt_id=template.id
         )
         
         if built_content is None:
@@ -167,12 +200,22 @@ def build_memory():
             "original_content": content
         }, "Memory built successfully")
         
+    except LLMBusy as e:
+        return retry_later_error(str(e), e.status_code, e.retry_after)
     except Exception as e:
         return server_error(f"Memory building failed: {str(e)}")
 
+@cortex_bp.route('/stats', methods=['GET'])
+def get_stats_endpoint():
+    """Fragment and session counts, for everything or one session (?session_id=)."""
+    try:
+        return success_response(get_stats(request.args.get('session_id')))
+    except Exception as e:
+        return server_error(f"Error retrieving stats: {str(e)}")
+
 @cortex_bp.route('/sessions', methods=['GET'])
 def get_sessions_endpoint():
-    """Get all sessions."""
+    """Get all sessions with their fragment counts."""
     try:
         sessions = get_sessions()
         return success_response({"sessions": sessions})
@@ -207,10 +250,7 @@ def get_session_fragments(session_id):
     
     try:
         fragments = get_fragments(session_id, processed, limit)
-        return success_response({
-            "fragments": fragments, 
-            "session_id": session_id
-        })
+        return list_response("fragments", fragments, {"session_id": session_id})
     except Exception as e:
         return server_error(f"Error retrieving session fragments: {str(e)}")
 
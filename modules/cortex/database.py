@@ -1,19 +1,50 @@
-import sqlite3
 import uuid
 import json
+import hashlib
+import os
 from datetime import datetime
 from dateutil import tz
 from pathlib import Path
+from llm import compression
+from llm.metrics import time_sqlite
+from llm.profiling import span
+from llm.snapshots import select_batches, snapshot
+from llm.storage import StorageEngine, memory_engine
+from llm.tenancy import LRUCache, connect, current_user, user_path
+from llm.warmup import register_warmup
 
-# Database path
+# Database path (the default user's; other users get a shard of their own)
 DB_PATH = Path("cortex/data/fragments.db")
-DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-def init_database():
-    """Initialize the fragments database with required tables."""
-    conn = sqlite3.connect(DB_PATH)
+# Source documents (uploaded files) are stored once, compressed, and their
+# fragments point into them with (document_id, span_start, span_end)
+# instead of keeping a copy of their text. A document's id is a prefix of
+# its text's SHA-256, short since every referencing fragment repeats it
+DOCUMENT_ENCODING = "gzip"
+DOCUMENT_ID_CHARS = 16
+
+# Decompressed documents kept in memory to resolve fragment content
+DOCUMENT_CACHE_SIZE = int(os.environ.get("ENGRAM_DOCUMENT_CACHE_SIZE", "16"))
+
+# Extra schema (tables, triggers) other modules keep in the fragments database
+_schema_extensions = []
+
+def register_schema(initializer):
+    """Run initializer(conn) on every fragments database before first use."""
+    _schema_extensions.append(initializer)
+    return initializer
+
+def get_connection():
+    """Return an open connection to the current user's fragments database."""
+    return connect(user_path(DB_PATH), init_database, *_schema_extensions)
+
+def init_database(conn):
+    """Initialize a fragments database with required tables."""
     cursor = conn.cursor()
     
+    # Readers (including online backups) never block writers
+    cursor.execute("PRAGMA journal_mode=WAL")
+    
     # Create fragments table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS fragments (
@@ -23,7 +54,22 @@ def init_database():
             created_at TEXT NOT NULL,
             metadata TEXT,
             processed BOOLEAN DEFAULT FALSE,
-            memory_id TEXT
+            memory_id TEXT,
+            document_id TEXT,
+            span_start INTEGER,
+            span_end INTEGER
+        )
+    ''')
+    
+    # Create documents table for the sources fragments can reference
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS documents (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            encoding TEXT NOT NULL,
+            content BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created_at TEXT NOT NULL
         )
     ''')
     
@@ -49,118 +95,495 @@ def init_database():
     ''')
     
     conn.commit()
-    conn.close()
+    _add_document_columns(conn)
+    init_stats(conn)
+
+def _add_document_columns(conn):
+    """Add the document reference columns to fragments tables created before them."""
+    try:
+        # Serializes the check with other workers opening the same database
+        conn.execute("BEGIN IMMEDIATE")
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(fragments)")}
+        for column, column_type in (("document_id", "TEXT"), ("span_start", "INTEGER"), ("span_end", "INTEGER")):
+            if column not in existing:
+                conn.execute(f"ALTER TABLE fragments ADD COLUMN {column} {column_type}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+# A fragment's processed flag as 0 or 1, in trigger SQL
+_PROCESSED = "(COALESCE({row}.processed, 0) != 0)"
+
+# The all-fragments row and the rows of the fragment's sessions
+_STATS_ROWS = "session_id = '' OR session_id IN (SELECT session_id FROM fragment_sessions WHERE fragment_id = {id})"
+
+def init_stats(conn):
+    """
+    Create the statistics counters in a fragments database.
+
+    fragment_stats holds fragment totals, processed counts and the newest
+    fragment's created_at: one row per session with fragments, and a row
+    with session_id '' for all fragments that also counts sessions. Triggers
+    keep it current in the same transaction as each write, so reading stats
+    never scans fragments. INSERT OR REPLACE of an existing row doesn't run
+    delete triggers, so inserts first take back the row they replace. On
+    first creation the counters are computed from the existing rows.
+    """
+    try:
+        # Serializes the check with other workers opening the same database
+        conn.execute("BEGIN IMMEDIATE")
+        created = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'fragment_stats'"
+        ).fetchone() is None
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS fragment_stats (
+                session_id TEXT PRIMARY KEY,
+                fragments INTEGER NOT NULL DEFAULT 0,
+                processed INTEGER NOT NULL DEFAULT 0,
+                sessions INTEGER NOT NULL DEFAULT 0,
+                last_activity TEXT
+            )
+        ''')
+
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS fragments_stats_replace BEFORE INSERT ON fragments
+            WHEN EXISTS (SELECT 1 FROM fragments WHERE id = NEW.id)
+            BEGIN
+                UPDATE fragment_stats SET fragments = fragments - 1,
+                    processed = processed - (SELECT {_PROCESSED.format(row="f")} FROM fragments f WHERE f.id = NEW.id)
+                WHERE {_STATS_ROWS.format(id="NEW.id")};
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS fragments_stats_insert AFTER INSERT ON fragments
+            BEGIN
+                UPDATE fragment_stats SET fragments = fragments + 1,
+                    processed = processed + {_PROCESSED.format(row="NEW")},
+                    last_activity = MAX(COALESCE(last_activity, ''), NEW.created_at)
+                WHERE {_STATS_ROWS.format(id="NEW.id")};
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS fragments_stats_update AFTER UPDATE OF processed ON fragments
+            WHEN {_PROCESSED.format(row="OLD")} != {_PROCESSED.format(row="NEW")}
+            BEGIN
+                UPDATE fragment_stats
+                SET processed = processed + {_PROCESSED.format(row="NEW")} - {_PROCESSED.format(row="OLD")}
+                WHERE {_STATS_ROWS.format(id="NEW.id")};
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS fragments_stats_delete AFTER DELETE ON fragments
+            BEGIN
+                UPDATE fragment_stats SET fragments = fragments - 1,
+                    processed = processed - {_PROCESSED.format(row="OLD")}
+                WHERE {_STATS_ROWS.format(id="OLD.id")};
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS fragment_sessions_stats_insert AFTER INSERT ON fragment_sessions
+            BEGIN
+                INSERT INTO fragment_stats (session_id, fragments, processed, last_activity)
+                SELECT NEW.session_id, 1, {_PROCESSED.format(row="f")}, f.created_at
+                FROM fragments f WHERE f.id = NEW.fragment_id
+                ON CONFLICT (session_id) DO UPDATE SET fragments = fragments + 1,
+                    processed = processed + excluded.processed,
+                    last_activity = MAX(COALESCE(last_activity, ''), excluded.last_activity);
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS fragment_sessions_stats_delete AFTER DELETE ON fragment_sessions
+            WHEN EXISTS (SELECT 1 FROM fragments WHERE id = OLD.fragment_id)
+            BEGIN
+                UPDATE fragment_stats SET fragments = fragments - 1,
+                    processed = processed - (SELECT {_PROCESSED.format(row="f")} FROM fragments f WHERE f.id = OLD.fragment_id)
+                WHERE session_id = OLD.session_id;
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS sessions_stats_replace BEFORE INSERT ON sessions
+            WHEN EXISTS (SELECT 1 FROM sessions WHERE id = NEW.id)
+            BEGIN
+                UPDATE fragment_stats SET sessions = sessions - 1 WHERE session_id = '';
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS sessions_stats_insert AFTER INSERT ON sessions
+            BEGIN
+                UPDATE fragment_stats SET sessions = sessions + 1 WHERE session_id = '';
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS sessions_stats_delete AFTER DELETE ON sessions
+            BEGIN
+                UPDATE fragment_stats SET sessions = sessions - 1 WHERE session_id = '';
+            END
+        ''')
+
+        if created:
+            conn.execute(f'''
+                INSERT INTO fragment_stats (session_id, fragments, processed, sessions, last_activity)
+                SELECT '', COUNT(*), COALESCE(SUM({_PROCESSED.format(row="f")}), 0),
+                    (SELECT COUNT(*) FROM sessions), MAX(f.created_at)
+                FROM fragments f
+            ''')
+            conn.execute(f'''
+                INSERT INTO fragment_stats (session_id, fragments, processed, last_activity)
+                SELECT fs.session_id, COUNT(*), SUM({_PROCESSED.format(row="f")}), MAX(f.created_at)
+                FROM fragment_sessions fs JOIN fragments f ON f.id = fs.fragment_id
+                GROUP BY fs.session_id
+            ''')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+COLUMNS = {
+    "fragments": ['id', 'content', 'source', 'created_at', 'metadata', 'processed', 'memory_id',
+                  'document_id', 'span_start', 'span_end'],
+    "sessions": ['id', 'name', 'created_at', 'metadata'],
+    "documents": ['id', 'name', 'encoding', 'content', 'size', 'created_at'],
+}
+
+class SqliteFragmentEngine(StorageEngine):
+    """
+    The fragments database as a storage engine, with "fragments",
+    "sessions" and "documents" collections. Records keep metadata as the
+    JSON text stored in the table. A fragment's optional "session_id" links it to a session, and
+    filtering fragments on "session_id" goes through the link table.
+    """
+    name = "sqlite"
+
+    def _columns(self, collection, fields=()):
+        if collection not in COLUMNS:
+            raise ValueError(f"Unknown collection: {collection}")
+        columns = COLUMNS[collection]
+        for field in fields:
+            if field not in columns:
+                raise ValueError(f"Unknown {collection} field: {field}")
+        return columns
+
+    @time_sqlite("cortex")
+    def put_many(self, collection, records):
+        columns = self._columns(collection)
+        links = [(record["id"], record["session_id"]) for record in records
+                 if collection == "fragments" and record.get("session_id")]
+        conn = get_connection()
+        try:
+            with conn:
+                conn.executemany(f'''
+                    INSERT OR REPLACE INTO {collection} ({", ".join(columns)})
+                    VALUES ({", ".join("?" for _ in columns)})
+                ''', [tuple(record.get(column) for column in columns) for record in records])
+                if links:
+                    conn.executemany('''
+                        INSERT OR IGNORE INTO fragment_sessions (fragment_id, session_id)
+                        VALUES (?, ?)
+                    ''', links)
+        finally:
+            conn.close()
+
+    @time_sqlite("cortex")
+    def get_many(self, collection, ids):
+        columns = self._columns(collection)
+        conn = get_connection()
+        placeholders = ','.join('?' for _ in ids)
+        rows = conn.execute(
+            f"SELECT {', '.join(columns)} FROM {collection} WHERE id IN ({placeholders})", list(ids)
+        ).fetchall()
+        conn.close()
+        found = {row[0]: dict(zip(columns, row)) for row in rows}
+        return [found[record_id] for record_id in ids if record_id in found]
+
+    @time_sqlite("cortex")
+    def update_many(self, collection, ids, fields):
+        self._columns(collection, fields)
+        conn = get_connection()
+        placeholders = ','.join('?' for _ in ids)
+        assignments = ', '.join(f"{field} = ?" for field in fields)
+        with conn:
+            conn.execute(
+                f"UPDATE {collection} SET {assignments} WHERE id IN ({placeholders})",
+                list(fields.values()) + list(ids)
+            )
+        conn.close()
+
+    @time_sqlite("cortex")
+    def scan(self, collection, where=None, since=None, until=None, limit=None, newest_first=False):
+        where = dict(where or {})
+        session_id = where.pop("session_id", None) if collection == "fragments" else None
+        columns = self._columns(collection, where)
+
+        query = f"SELECT {', '.join('t.' + column for column in columns)} FROM {collection} t"
+        conditions = []
+        params = []
+        if session_id:
+            query += " JOIN fragment_sessions fs ON t.id = fs.fragment_id"
+            conditions.append("fs.session_id = ?")
+            params.append(session_id)
+        for field, value in where.items():
+            conditions.append(f"t.{field} = ?")
+            params.append(value)
+        if since:
+            conditions.append("t.created_at >= ?")
+            params.append(since)
+        if until:
+            conditions.append("t.created_at < ?")
+            params.append(until)
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY t.created_at DESC" if newest_first else " ORDER BY t.rowid"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        conn = get_connection()
+        rows = conn.execute(query, params).fetchall()
+        conn.close()
+        return [dict(zip(columns, row)) for row in rows]
+
+    @time_sqlite("cortex")
+    def scan_after(self, collection, cursor=0):
+        columns = self._columns(collection)
+        conn = get_connection()
+        rows = conn.execute(
+            f"SELECT rowid, {', '.join(columns)} FROM {collection} WHERE rowid > ? ORDER BY rowid", (cursor,)
+        ).fetchall()
+        conn.close()
+        if not rows:
+            return [], cursor
+        return [dict(zip(columns, row[1:])) for row in rows], rows[-1][0]
+
+    @time_sqlite("cortex")
+    def count(self, collection):
+        self._columns(collection)
+        conn = get_connection()
+        count = conn.execute(f"SELECT COUNT(*) FROM {collection}").fetchone()[0]
+        conn.close()
+        return count
+
+    @time_sqlite("cortex")
+    def link_fragments(self, links):
+        conn = get_connection()
+        try:
+            with conn:
+                conn.executemany('''
+                    INSERT OR IGNORE INTO fragment_sessions (fragment_id, session_id)
+                    VALUES (?, ?)
+                ''', list(links))
+        finally:
+            conn.close()
+
+    @time_sqlite("cortex")
+    def fragment_stats(self, session_id=None):
+        """Read from the fragment_stats counters the triggers keep."""
+        conn = get_connection()
+        query = "SELECT session_id, fragments, processed, sessions, last_activity FROM fragment_stats"
+        if session_id is None:
+            rows = conn.execute(query).fetchall()
+        else:
+            rows = conn.execute(query + " WHERE session_id = ?", (session_id,)).fetchall()
+        conn.close()
+        return {row[0]: row[1:] for row in rows}
+
+    def export_batches(self, collections, stack, batch_size):
+        """Read from a snapshot of the database (see llm/snapshots.py)."""
+        get_connection()  # creates the database and its schema if needed
+        conn = stack.enter_context(snapshot(user_path(DB_PATH)))
+        queries = {collection: (f"SELECT {', '.join(columns)} FROM {collection} ORDER BY rowid", columns)
+                   for collection, columns in COLUMNS.items()}
+        queries["links"] = ("SELECT fragment_id, session_id FROM fragment_sessions ORDER BY rowid",
+                            ["fragment_id", "session_id"])
+        return {collection: select_batches(conn, queries[collection][0], batch_size,
+                                           lambda row, columns=queries[collection][1]: dict(zip(columns, row)))
+                for collection in collections}
+
+# Where fragments and sessions live: "sqlite" (default) or "memory", which
+# keeps them in process memory for tests and benchmarks
+FRAGMENT_BACKEND = os.environ.get("ENGRAM_FRAGMENT_BACKEND", "sqlite").lower()
+
+engine = memory_engine() if FRAGMENT_BACKEND == "memory" else SqliteFragmentEngine()
+
+def set_engine(new_engine):
+    """Swap the storage engine behind every fragment and session function."""
+    global engine
+    engine = new_engine
+
+def _fragment_record(fragment, now):
+    record = {
+        "id": str(uuid.uuid4()),
+        "content": fragment.get('content') or "",
+        "source": fragment.get('source') or "user",
+        "created_at": fragment.get('created_at') or now,
+        "metadata": json.dumps(fragment.get('metadata') or {}),
+        "processed": False,
+        "memory_id": None,
+        "document_id": fragment.get('document_id'),
+        "span_start": fragment.get('span_start'),
+        "span_end": fragment.get('span_end'),
+    }
+    if fragment.get('session_id'):
+        record["session_id"] = fragment['session_id']
+    return record
 
 def add_fragment(content, source="user", metadata=None, session_id=None):
     """Add a new fragment to the database."""
-    fragment_id = str(uuid.uuid4())
-    created_at = datetime.now(tz=tz.UTC).isoformat()
-    
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO fragments (id, content, source, created_at, metadata)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (fragment_id, content, source, created_at, json.dumps(metadata or {})))
-    
-    # Link to session if provided
-    if session_id:
-        cursor.execute('''
-            INSERT OR IGNORE INTO fragment_sessions (fragment_id, session_id)
-            VALUES (?, ?)
-        ''', (fragment_id, session_id))
-    
-    conn.commit()
-    conn.close()
-    
-    return fragment_id
+    return add_fragments([{
+        "content": content,
+        "source": source,
+        "metadata": metadata,
+        "session_id": session_id,
+    }])[0]
+
+def add_fragments(fragments):
+    """
+    Add many fragments in a single transaction.
 
+    Each fragment is a dict with 'content', or with 'document_id',
+    'span_start' and 'span_end' to reference a stored document instead, and
+    optional 'source', 'metadata', 'session_id' and 'created_at'. Returns
+    the new ids in the same order.
+    """
+    now = datetime.now(tz=tz.UTC).isoformat()
+    records = [_fragment_record(fragment, now) for fragment in fragments]
+    engine.put_many("fragments", records)
+    return [record["id"] for record in records]
+
+@span("get_fragments")
 def get_fragments(session_id=None, processed=None, limit=None):
-    """Retrieve fragments from the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    query = "SELECT * FROM fragments"
-    params = []
-    conditions = []
-    
+    """Retrieve fragments from the database, newest first."""
+    where = {}
     if session_id:
-        query = '''
-            SELECT f.* FROM fragments f
-            JOIN fragment_sessions fs ON f.id = fs.fragment_id
-            WHERE fs.session_id = ?
-        '''
-        params.append(session_id)
-    
+        where["session_id"] = session_id
     if processed is not None:
-        if session_id:
-            query += " AND f.processed = ?"
-        else:
-            conditions.append("processed = ?")
-        params.append(processed)
-    
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
-    
-    query += " ORDER BY created_at DESC"
-    
-    if limit:
-        query += " LIMIT ?"
-        params.append(limit)
-    
-    cursor.execute(query, params)
-    fragments = cursor.fetchall()
-    conn.close()
-    
-    # Convert to dict format
-    columns = ['id', 'content', 'source', 'created_at', 'metadata', 'processed', 'memory_id']
-    return [dict(zip(columns, fragment)) for fragment in fragments]
+        where["processed"] = processed
+    return resolve_content(engine.scan("fragments", where=where, limit=limit, newest_first=True))
+
+def get_fragments_by_id(fragment_ids):
+    """Retrieve the fragments that exist for the given ids, in the order given."""
+    return resolve_content(engine.get_many("fragments", list(fragment_ids)))
+
+def add_document(text, name=None):
+    """Store a source document, compressed, unless it is already stored; returns its id."""
+    data = text.encode("utf-8")
+    document_id = hashlib.sha256(data).hexdigest()[:DOCUMENT_ID_CHARS]
+    if engine.get("documents", document_id) is not None:
+        return document_id
+    engine.put("documents", {
+        "id": document_id,
+        "name": name,
+        "encoding": DOCUMENT_ENCODING,
+        "content": compression.compress(data, DOCUMENT_ENCODING),
+        "size": len(data),
+        "created_at": datetime.now(tz=tz.UTC).isoformat(),
+    })
+    return document_id
+
+_document_cache = LRUCache(DOCUMENT_CACHE_SIZE)
+
+def get_document_text(document_id):
+    """A document's text, decompressed on first use. Raises KeyError if it doesn't exist."""
+    def load():
+        document = engine.get("documents", document_id)
+        if document is None:
+            raise KeyError(document_id)
+        return compression.decompress(document["content"], document["encoding"]).decode("utf-8")
+    return _document_cache.get_or_create((current_user(), document_id), load)
+
+def resolve_content(fragments):
+    """Fill in the content of fragments that reference a document, in place."""
+    texts = {}
+    for fragment in fragments:
+        document_id = fragment.get("document_id")
+        if document_id and not fragment.get("content"):
+            if document_id not in texts:
+                try:
+                    texts[document_id] = get_document_text(document_id)
+                except KeyError:
+                    texts[document_id] = None
+            if texts[document_id] is not None:
+                fragment["content"] = texts[document_id][fragment["span_start"]:fragment["span_end"]]
+    return fragments
+
+def get_fragment_context(fragments, chars):
+    """
+    The text around fragments that reference a document: up to `chars`
+    characters either side of each, with overlapping excerpts merged, in
+    document order. Empty when none of them has a document.
+    """
+    windows = {}
+    for fragment in fragments:
+        if fragment.get("document_id") and fragment.get("span_start") is not None:
+            windows.setdefault(fragment["document_id"], []).append(
+                (max(0, fragment["span_start"] - chars), fragment["span_end"] + chars))
+
+    excerpts = []
+    for document_id, spans in windows.items():
+        try:
+            text = get_document_text(document_id)
+        except KeyError:
+            continue
+        merged = []
+        for start, end in sorted(spans):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        excerpts.extend(" ".join(text[start:end].split()) for start, end in merged)
+    return "\n...\n".join(excerpts)
 
 def create_session(name=None, metadata=None):
     """Create a new session for grouping fragments."""
     session_id = str(uuid.uuid4())
-    created_at = datetime.now(tz=tz.UTC).isoformat()
-    
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO sessions (id, name, created_at, metadata)
-        VALUES (?, ?, ?, ?)
-    ''', (session_id, name, created_at, json.dumps(metadata or {})))
-    
-    conn.commit()
-    conn.close()
-    
+    engine.put("sessions", {
+        "id": session_id,
+        "name": name,
+        "created_at": datetime.now(tz=tz.UTC).isoformat(),
+        "metadata": json.dumps(metadata or {}),
+    })
     return session_id
 
+def link_fragments(links):
+    """Add (fragment_id, session_id) links; existing links are kept."""
+    engine.link_fragments(links)
+
 def mark_fragments_processed(fragment_ids, memory_id):
     """Mark fragments as processed and link to memory."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    placeholders = ','.join(['?' for _ in fragment_ids])
-    cursor.execute(f'''
-        UPDATE fragments 
-        SET processed = TRUE, memory_id = ?
-        WHERE id IN ({placeholders})
-    ''', [memory_id] + fragment_ids)
-    
-    conn.commit()
-    conn.close()
+    engine.update_many("fragments", fragment_ids, {"processed": True, "memory_id": memory_id})
 
-def get_sessions():
-    """Get all sessions."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM sessions ORDER BY created_at DESC")
-    sessions = cursor.fetchall()
-    conn.close()
-    
-    columns = ['id', 'name', 'created_at', 'metadata']
-    return [dict(zip(columns, session)) for session in sessions]
+def _stats_fields(fragments, processed, last_activity):
+    return {
+        "total_fragments": fragments,
+        "processed_fragments": processed,
+        "unprocessed_fragments": fragments - processed,
+        "last_activity": last_activity,
+    }
+
+@span("get_stats")
+def get_stats(session_id=None):
+    """
+    Total, processed and unprocessed fragments and the newest fragment's
+    created_at, for one session or for all fragments (with the number of
+    sessions). Read from the counters, without scanning fragments.
+    """
+    key = session_id or ""
+    fragments, processed, sessions, last_activity = engine.fragment_stats(key).get(key, (0, 0, 0, None))
+    stats = _stats_fields(fragments, processed, last_activity)
+    if not session_id:
+        stats["total_sessions"] = sessions
+    return stats
 
-# Initialize database on import
-init_database() 
\ No newline at end of file
+# Opens (and creates or migrates) the database and reads its counters
+register_warmup("fragments", get_stats, per_user=True)
+
+def get_sessions():
+    """Get all sessions, newest first, with their fragment counts."""
+    sessions = engine.scan("sessions", newest_first=True)
+    counts = engine.fragment_stats()
+    for session in sessions:
+        fragments, processed, _, last_activity = counts.get(session["id"], (0, 0, 0, None))
+        session.update(_stats_fields(fragments, processed, last_activity))
+    return sessions
@@ -1,35 +1,32 @@
-import re
-from typing import List, Dict, Any
-from .database import add_fragment, get_fragments, mark_fragments_processed
+import os
+from typing import List, Dict, Any, Iterator, Tuple
+from llm.bulk import parse_created_at
+from llm.scheduler import LLMBusy
+from llm.write_behind import WriteBufferFull
+from .database import add_document, add_fragments, get_fragment_context, get_fragments_by_id, mark_fragments_processed
+from .segmenter import DEFAULT_RULES, SegmentRules, segment
+
+# Keep uploaded files as compressed source documents that their fragments
+# reference, instead of storing a copy of each fragment's text
+STORE_DOCUMENTS = os.environ.get("ENGRAM_STORE_DOCUMENTS", "1") != "0"
+
+# Characters of the source document either side of each fragment given to
+# the LLM when consolidating fragments from a file (0: the fragments only)
+CONSOLIDATION_CONTEXT_CHARS = int(os.environ.get("ENGRAM_CONSOLIDATION_CONTEXT_CHARS", "0"))
+
+def extract_fragment_spans(text: str, rules: SegmentRules = DEFAULT_RULES) -> Iterator[Tuple[int, int]]:
+    """
+    Find meaningful fragments in raw text input, as (start, end) offsets.
+    Sentences are split at punctuation; long ones also at commas and conjunctions.
+    """
+    return segment(text, rules)
 
 def extract_fragments_from_text(text: str, source: str = "text_input") -> List[str]:
     """
     Extract meaningful fragments from raw text input.
     This is a simple implementation that can be enhanced with NLP.
     """
-    # Remove extra whitespace and split by common delimiters
-    fragments = []
-    
-    # Split by sentences first
-    sentences = re.split(r'[.!?]+', text)
-    
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-            
-        # For short sentences, keep as single fragment
-        if len(sentence.split()) <= 5:
-            fragments.append(sentence)
-        else:
-            # For longer sentences, split by commas and conjunctions
-            parts = re.split(r'[,;]|\sand\s|\sor\s|\sbut\s', sentence)
-            for part in parts:
-                part = part.strip()
-                if part and len(part.split()) >= 2:  # At least 2 words
-                    fragments.append(part)
-    
-    return [f for f in fragments if f]
+    return [text[start:end] for start, end in extract_fragment_spans(text)]
 
 def extract_fragments_from_file(file_content: str, filename: str) -> List[str]:
     """
@@ -46,12 +43,7 @@ def process_fragments_to_memory(fragment_ids: List[str], session_id: str = None)
     Process a set of fragments into a consolidated memory using the hippocampus.
     """
     # Get fragments from database
-    fragments_data = []
-    for frag_id in fragment_ids:
-        frags = get_fragments()
-        fragment = next((f for f in frags if f['id'] == frag_id), None)
-        if fragment:
-            fragments_data.append(fragment)
+    fragments_data = get_fragments_by_id(fragment_ids)
     
     if not fragments_data:
         return {"error": "No fragments found"}
@@ -59,6 +51,9 @@ def process_fragments_to_memory(fragment_ids: List[str], session_id: str = None)
     # Extract just the content for hippocampus processing
     fragment_contents = [f['content'] for f in fragments_data]
     
+    # Text around fragments that came from a file, from the stored document
+    context = get_fragment_context(fragments_data, CONSOLIDATION_CONTEXT_CHARS) if CONSOLIDATION_CONTEXT_CHARS else ""
+    
     # Import hippocampus functions (the renamed cortex module)
     try:
         from modules.hippocampus.memory import process_fragments
@@ -71,7 +66,8 @@ def process_fragments_to_memory(fragment_ids: List[str], session_id: str = None)
                 "session_id": session_id,
                 "fragment_count": len(fragment_contents),
                 "original_fragments": fragment_ids
-            }
+            },
+            context=context
         )
         
         # Mark fragments as processed
@@ -85,9 +81,18 @@ def process_fragments_to_memory(fragment_ids: List[str], session_id: str = None)
         
     except ImportError as e:
         return {"error": f"Could not import hippocampus module: {e}"}
+    except (LLMBusy, WriteBufferFull):
+        raise
     except Exception as e:
         return {"error": f"Error processing fragments: {e}"}
 
+def _store_fragments(fragments: List[str], source: str, session_id: str = None) -> List[str]:
+    """Store fragments in one transaction; returns their ids."""
+    return add_fragments([
+        {"content": fragment, "source": source, "session_id": session_id}
+        for fragment in fragments
+    ])
+
 def add_fragments_from_input(text: str, source: str = "user_input", session_id: str = None) -> Dict[str, Any]:
     """
     Add fragments from user input text.
@@ -97,14 +102,7 @@ def add_fragments_from_input(text: str, source: str = "user_input", session_id:
     if not fragments:
         return {"error": "No fragments could be extracted from input"}
     
-    fragment_ids = []
-    for fragment in fragments:
-        frag_id = add_fragment(
-            content=fragment,
-            source=source,
-            session_id=session_id
-        )
-        fragment_ids.append(frag_id)
+    fragment_ids = _store_fragments(fragments, source, session_id)
     
     return {
         "success": True,
@@ -116,27 +114,74 @@ def add_fragments_from_input(text: str, source: str = "user_input", session_id:
 def add_fragments_from_file(file_content: str, filename: str, session_id: str = None) -> Dict[str, Any]:
     """
     Add fragments from uploaded file.
+    The file is kept as a source document that the fragments reference.
     """
-    fragments = extract_fragments_from_file(file_content, filename)
+    spans = list(extract_fragment_spans(file_content))
     
-    if not fragments:
+    if not spans:
         return {"error": "No fragments could be extracted from file"}
     
-    fragment_ids = []
     source = f"file:{filename}"
-    
-    for fragment in fragments:
-        frag_id = add_fragment(
-            content=fragment,
-            source=source,
-            session_id=session_id
-        )
-        fragment_ids.append(frag_id)
+    fragments = [file_content[start:end] for start, end in spans]
+    document_id = None
+    if STORE_DOCUMENTS:
+        document_id = add_document(file_content, filename)
+        fragment_ids = add_fragments([
+            {"document_id": document_id, "span_start": start, "span_end": end,
+             "source": source, "session_id": session_id}
+            for start, end in spans
+        ])
+    else:
+        fragment_ids = _store_fragments(fragments, source, session_id)
     
     return {
         "success": True,
         "fragments_added": len(fragments),
         "fragment_ids": fragment_ids,
         "fragments": fragments,
-        "filename": filename
-    } 
\ No newline at end of file
+        "filename": filename,
+        "document_id": document_id
+    }
+
+def prepare_bulk_record(record: Dict[str, Any], source: str = "bulk_import", session_id: str = None) -> List[Dict[str, Any]]:
+    """
+    Turn one NDJSON bulk record into fragment rows.
+
+    A record either carries a ready-made fragment in 'content', or raw 'text'
+    that is split into fragments like regular input. 'source', 'session_id',
+    'metadata' and 'created_at' override the request-level defaults.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("Record must be a JSON object")
+    created_at = parse_created_at(record.get('created_at'))
+
+    if isinstance(record.get('content'), str) and record['content'].strip():
+        contents = [record['content'].strip()]
+    elif isinstance(record.get('text'), str):
+        contents = extract_fragments_from_text(record['text'], source)
+        if not contents:
+            raise ValueError("No fragments could be extracted from text")
+    else:
+        raise ValueError("Record requires 'content' or 'text'")
+
+    return [{
+        "content": content,
+        "source": record.get('source', source),
+        "session_id": record.get('session_id', session_id),
+        "metadata": record.get('metadata'),
+        "created_at": created_at
+    } for content in contents]
+
+def add_bulk_fragments(records: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Store a batch of prepared bulk records in one transaction.
+    Returns the new fragment ids for each record.
+    """
+    fragment_ids = add_fragments([row for rows in records for row in rows])
+
+    results = []
+    offset = 0
+    for rows in records:
+        results.append({"fragment_ids": fragment_ids[offset:offset + len(rows)]})
+        offset += len(rows)
+    return results
@@ -0,0 +1,67 @@
+# Span-based fragment segmentation
+#
+# Text is split into sentences at runs of sentence delimiters. Short
+# sentences become one fragment each; longer ones are split again at clause
+# delimiters and at conjunctions surrounded by whitespace, keeping the parts
+# that have enough words. All of it is one compiled pattern scanned once
+# over the text, with word counts checked by the pattern in place: each
+# match is a boundary followed by the part up to the next one, or by the
+# whole sentence when it is short. Fragments are yielded as (start, end) offsets into the original
+# text, so nothing is copied until a caller slices out what it stores.
+
+import re
+from operator import methodcaller
+from typing import Iterable, Iterator, Tuple
+
+Span = Tuple[int, int]
+
+_FRAGMENT_SPAN = methodcaller("span", "fragment")
+
+class SegmentRules:
+    """Boundaries and word thresholds for segment()."""
+    def __init__(self, sentence_delimiters: str = ".!?", clause_delimiters: str = ",;",
+                 conjunctions: Iterable[str] = ("and", "or", "but"),
+                 max_short_words: int = 5, min_clause_words: int = 2):
+        if not sentence_delimiters or max_short_words < 0 or min_clause_words < 1:
+            raise ValueError("Need sentence delimiters, max_short_words >= 0 and min_clause_words >= 1")
+        self.sentence_delimiters = sentence_delimiters
+        self.clause_delimiters = clause_delimiters
+        self.conjunctions = tuple(conjunctions)
+        self.max_short_words = max_short_words
+        self.min_clause_words = min_clause_words
+        self.pattern = self._compile()
+
+    def _compile(self):
+        sentence = f"[{re.escape(self.sentence_delimiters)}]"
+        sentence_word = f"[^{re.escape(self.sentence_delimiters)}\\s]+"
+        clause_word = f"[^{re.escape(self.sentence_delimiters + self.clause_delimiters)}\\s]+"
+
+        # A conjunction only splits when more of the same sentence follows it
+        boundaries = [f"[{re.escape(self.clause_delimiters)}]"] if self.clause_delimiters else []
+        if self.conjunctions:
+            conjunction = rf"(?:{'|'.join(map(re.escape, self.conjunctions))})\s(?=\s*[^{re.escape(self.sentence_delimiters)}\s])"
+            space = rf"\s+(?!{conjunction})"
+            boundaries.append(rf"\s{conjunction}")
+        else:
+            space = r"\s+"
+
+        # A whole sentence of at most max_short_words words
+        short = (rf"{sentence_word}(?:\s+{sentence_word}){{0,{self.max_short_words - 1}}}"
+                 if self.max_short_words else "(?!)")
+        long = rf"{sentence_word}(?:\s+{sentence_word}){{{self.max_short_words}}}"
+        # Each match is a boundary and what follows up to the next one: at a
+        # sentence start that is the whole sentence when it is short, otherwise
+        # a part, captured when it has at least min_clause_words words
+        start = rf"(?:{sentence}+|\A)\s*(?P<short>(?!{long}))?"
+        part = rf"{clause_word}(?:{space}{clause_word}){{{self.min_clause_words - 1},}}"
+        fragment = rf"(?P<fragment>(?(short){short}|{part}))|{clause_word}(?:{space}{clause_word})*"
+        pattern = rf"(?:{'|'.join([start] + boundaries)})(?:{space})?(?:{fragment})?(?:{space})?"
+        return re.compile(pattern)
+
+DEFAULT_RULES = SegmentRules()
+
+def segment(text: str, rules: SegmentRules = DEFAULT_RULES) -> Iterator[Span]:
+    """Yield the (start, end) offsets of the fragments in text, in order."""
+    for start, end in map(_FRAGMENT_SPAN, rules.pattern.finditer(text)):
+        if start >= 0:
+            yield start, end
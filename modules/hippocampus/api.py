@@ -1,14 +1,18 @@
 from flask import Blueprint, request
 import os
 import sys
-from .memory import make_memory, add_memory, get_memories, search_memories
+from .memory import make_memory, add_memory, add_memories, get_memories, search_memories, WriteBufferFull
 from .query import query_memory
 from .memory import process_fragments
+from .summaries import get_summary, refresh_summaries
 
 # Import shared utilities from the llm directory
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from llm.responses import success_response, error_response, validation_error, server_error
+from llm.responses import success_response, validation_error, not_found_error, server_error, retry_later_error
+from llm.responses import list_response
 from llm.client import create_llm_client
+from llm.scheduler import LLMBusy, BULK, priority
+from llm.bulk import bulk_ingest, ndjson_response, parse_batch_size, parse_created_at, MAX_BATCH_SIZE
 hippocampus_llm = create_llm_client("hippocampus")
 
 # Create blueprint for hippocampus routes
@@ -31,30 +35,70 @@ def create_memory():
     source = data.get('source', 'direct_input')
     fragments = data.get('fragments', [])
     metadata = data.get('metadata', {})
+    embedding = data.get('embedding')
     
     try:
         memory = make_memory(
             text=text,
             source=source,
             fragments=fragments,
-            metadata=metadata
+            metadata=metadata,
+            embedding=embedding
         )
         
         add_memory(memory)
         
         return success_response(memory, "Memory created successfully")
+    except WriteBufferFull as e:
+        return retry_later_error(str(e))
     except Exception as e:
         return server_error(f"Error creating memory: {str(e)}")
 
+@hippocampus_bp.route('/memories/bulk', methods=['POST'])
+def bulk_create_memories():
+    """Create memories from an NDJSON stream, streaming back per-line status."""
+    batch_size = parse_batch_size(request.args.get('batch_size', type=int))
+    if batch_size is None:
+        return validation_error(f"batch_size must be between 1 and {MAX_BATCH_SIZE}", "batch_size")
+    
+    default_source = request.args.get('source', 'bulk_import')
+    
+    def prepare(record):
+        if not isinstance(record, dict) or not isinstance(record.get('text'), str):
+            raise ValueError("Record requires 'text'")
+        return make_memory(
+            text=record['text'],
+            source=record.get('source', default_source),
+            fragments=record.get('fragments', []),
+            metadata=record.get('metadata', {}),
+            embedding=record.get('embedding'),
+            created_at=parse_created_at(record.get('created_at'))
+        )
+    
+    def commit(memories):
+        add_memories(memories)
+        return [{"id": memory["id"]} for memory in memories]
+    
+    return ndjson_response(bulk_ingest(request.stream, prepare, commit, batch_size))
+
 @hippocampus_bp.route('/memories', methods=['GET'])
 def get_memories_endpoint():
     """Get memories from the database."""
     limit = request.args.get('limit', type=int)
     source = request.args.get('source')
+    since = request.args.get('since')
+    until = request.args.get('until')
+    session_id = request.args.get('session_id')
     
     try:
-        memories = get_memories(limit=limit, source=source)
-        return success_response({"memories": memories})
+        memories = get_memories(
+            limit=limit,
+            source=source,
+            since=since,
+            until=until,
+            metadata={"session_id": session_id} if session_id else None
+        )
+        return list_response("memories", memories)
     except Exception as e:
         return server_error(f"Error retrieving memories: {str(e)}")
 
@@ -70,7 +114,7 @@ def search_memories_endpoint():
     limit = data.get('limit', 10)
     
     try:
-        results = search_memories(query, limit=limit)
+        results = search_memories(query, top_k=limit)
         return success_response({"results": results, "query": query})
     except Exception as e:
         return server_error(f"Error searching memories: {str(e)}")
@@ -96,9 +140,43 @@ def query_memory_endpoint():
             "question": question,
             "response": response
         }, "Memory query processed successfully")
+    except LLMBusy as e:
+        return retry_later_error(str(e), e.status_code, e.retry_after)
     except Exception as e:
         return server_error(f"Error processing memory query: {str(e)}")
 
+@hippocampus_bp.route('/summaries', methods=['GET'])
+def get_summary_endpoint():
+    """Get the precomputed summary for a day, week, month or year."""
+    period = request.args.get('period')
+    
+    if not period:
+        return validation_error("Period required (e.g. 2022, 2022-03, 2022-W09, 2022-03-01, last_month)", "period")
+    
+    try:
+        summary = get_summary(period)
+    except ValueError as e:
+        return validation_error(str(e), "period")
+    except Exception as e:
+        return server_error(f"Error retrieving summary: {str(e)}")
+    
+    if summary is None:
+        return not_found_error(f"Memories for period {period}")
+    
+    return success_response(summary)
+
+@hippocampus_bp.route('/summaries/refresh', methods=['POST'])
+def refresh_summaries_endpoint():
+    """Summarize all periods that have new memories now instead of waiting for the rollup job."""
+    try:
+        with priority(BULK):
+            result = refresh_summaries(llm_client=hippocampus_llm)
+        return success_response(result, "Summaries refreshed")
+    except LLMBusy as e:
+        return retry_later_error(str(e), e.status_code, e.retry_after)
+    except Exception as e:
+        return server_error(f"Error refreshing summaries: {str(e)}")
+
 @hippocampus_bp.route('/fragments/process', methods=['POST'])
 def process_fragments_endpoint():
     """Process fragments into a structured memory."""
@@ -122,6 +200,10 @@ def process_fragments_endpoint():
         )
         
         return success_response(memory, "Fragments processed into memory successfully")
+    except LLMBusy as e:
+        return retry_later_error(str(e), e.status_code, e.retry_after)
+    except WriteBufferFull as e:
+        return retry_later_error(str(e))
     except Exception as e:
         return server_error(f"Error processing fragments: {str(e)}")
 
@@ -0,0 +1,230 @@
+# Storage engines for memories besides SQLite (see database.py): the
+# original JSON file and Letta. Both implement llm.storage.StorageEngine
+# with a single "memories" collection.
+
+import json
+import os
+import textwrap
+import threading
+from llm.storage import StorageEngine, select
+from llm.tenancy import user_path
+from llm.write_behind import PartialWrite
+
+# Try to import Letta with the new API
+try:
+    from letta_client import LettaClient
+    from letta_client.schemas import Memory as LettaMemory
+    # Initialize Letta client with new API
+    letta_client = LettaClient()
+    print("✓ Letta client initialized successfully")
+except ImportError:
+    print("⚠️ Letta client not available, using fallback storage")
+    letta_client = None
+    LettaMemory = None
+
+# Fallback file-based storage (the default user's; other users get their own)
+MEMORY_FILE = "data/memories.json"
+
+def _check(collection):
+    if collection != "memories":
+        raise ValueError(f"Unknown collection: {collection}")
+
+class JsonMemoryEngine(StorageEngine):
+    """
+    Memories as a list in one JSON file per user. New memories are appended
+    to the end of the list in place, so bulk imports don't rewrite the file
+    per batch; updates and replacements rewrite it. Only suitable for a
+    single writer process; use the SQLite engine with several workers.
+    """
+    name = "json"
+    reads_whole_file = True
+
+    def __init__(self, path=MEMORY_FILE):
+        self.path = path
+        self._seen = {}  # file -> (mtime, size) when scan_after last read it
+        self._ids = {}  # file -> ((mtime, size), ids stored in it)
+        self._lock = threading.Lock()
+
+    def _file(self):
+        """The current user's memory file, with its directory created."""
+        path = user_path(self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def _load(self):
+        memory_file = self._file()
+        if os.path.exists(memory_file):
+            try:
+                with open(memory_file, 'r') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, IOError):
+                pass
+        return []
+
+    def _save(self, memories):
+        with open(self._file(), 'w') as f:
+            json.dump(memories, f, indent=2)
+
+    @staticmethod
+    def _version(memory_file):
+        try:
+            stat = os.stat(memory_file)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _stored_ids(self, memory_file):
+        """Ids in the file, re-read only when another writer changed it."""
+        version = self._version(memory_file)
+        cached = self._ids.get(memory_file)
+        if cached is None or cached[0] != version:
+            cached = (version, {memory["id"] for memory in self._load()})
+            self._ids[memory_file] = cached
+        return cached[1]
+
+    def _append(self, memory_file, records):
+        """Write records before the list's closing bracket. Returns False if the file isn't a list."""
+        with open(memory_file, 'r+b') as f:
+            f.seek(0, os.SEEK_END)
+            tail_start = max(0, f.tell() - 64)
+            f.seek(tail_start)
+            tail = f.read()
+            end = tail.rfind(b"]")
+            if end < 0:
+                return False
+            empty = tail[:end].rstrip().endswith(b"[")
+            body = ",\n".join(textwrap.indent(json.dumps(record, indent=2), "  ") for record in records)
+            f.seek(tail_start + end)
+            f.truncate()
+            f.write((("\n" if empty else ",\n") + body + "\n]").encode())
+        return True
+
+    def put_many(self, collection, records):
+        _check(collection)
+        with self._lock:
+            memory_file = str(self._file())
+            ids = self._stored_ids(memory_file)
+            new = {record["id"] for record in records}
+            if (os.path.exists(memory_file) and len(new) == len(records) and not new & ids
+                    and self._append(memory_file, records)):
+                ids.update(new)
+                self._ids[memory_file] = (self._version(memory_file), ids)
+                return
+
+            memories = self._load()
+            positions = {memory["id"]: i for i, memory in enumerate(memories)}
+            for record in records:
+                if record["id"] in positions:
+                    memories[positions[record["id"]]] = record
+                else:
+                    positions[record["id"]] = len(memories)
+                    memories.append(record)
+            self._save(memories)
+            self._ids[memory_file] = (self._version(memory_file), set(positions))
+
+    def get_many(self, collection, ids):
+        _check(collection)
+        found = {memory["id"]: memory for memory in self._load()}
+        return [found[memory_id] for memory_id in ids if memory_id in found]
+
+    def update_many(self, collection, ids, fields):
+        _check(collection)
+        ids = set(ids)
+        memories = self._load()
+        for memory in memories:
+            if memory["id"] in ids:
+                memory.update(fields)
+        self._save(memories)
+
+    def scan(self, collection, where=None, since=None, until=None, limit=None, newest_first=False):
+        _check(collection)
+        return select(self._load(), where, since, until, limit, newest_first)
+
+    def scan_after(self, collection, cursor=0):
+        _check(collection)
+        # The file is only appended to, so the cursor is a list position;
+        # skip re-reading it while it is unchanged
+        memory_file = str(self._file())
+        try:
+            stat = os.stat(memory_file)
+            version = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            version = None
+        if cursor and self._seen.get(memory_file) == version:
+            return [], cursor
+        memories = self._load()
+        self._seen[memory_file] = version
+        return memories[cursor:], max(len(memories), cursor)
+
+    def count(self, collection):
+        _check(collection)
+        return len(self._load())
+
+class LettaMemoryEngine(StorageEngine):
+    """
+    Letta as a storage engine. Writes go through a write-behind buffer (see
+    llm/write_behind.py) and search goes to Letta; reads by id and scans come
+    from the local engine, as Letta has no listing API.
+    """
+    name = "letta"
+    remote = True
+
+    def __init__(self, local, buffer=None):
+        self.local = local
+        self.buffer = buffer
+        self.reads_whole_file = local.reads_whole_file
+
+    @staticmethod
+    def write(memories):
+        """
+        Write a batch to Letta, in one call when the client supports it.
+        Otherwise memories are sent one at a time, and a failure raises
+        PartialWrite so the ones already sent are not sent again.
+        """
+        letta_memories = [_to_letta_memory(memory) for memory in memories]
+        if hasattr(letta_client, "add_memories"):
+            letta_client.add_memories(letta_memories)
+            return
+        for written, letta_memory in enumerate(letta_memories):
+            try:
+                letta_client.add_memory(letta_memory)
+            except Exception as e:
+                raise PartialWrite(written, e) from e
+
+    def put_many(self, collection, records):
+        _check(collection)
+        if self.buffer:
+            self.buffer.submit(records)
+        else:
+            self.write(records)
+
+    def get_many(self, collection, ids):
+        return self.local.get_many(collection, ids)
+
+    def update_many(self, collection, ids, fields):
+        self.local.update_many(collection, ids, fields)
+
+    def scan(self, collection, where=None, since=None, until=None, limit=None, newest_first=False):
+        return self.local.scan(collection, where, since, until, limit, newest_first)
+
+    def scan_after(self, collection, cursor=0):
+        return self.local.scan_after(collection, cursor)
+
+    def count(self, collection):
+        return self.local.count(collection)
+
+    def export_batches(self, collections, stack, batch_size):
+        return self.local.export_batches(collections, stack, batch_size)
+
+    def search(self, collection, query, top_k=5):
+        _check(collection)
+        return letta_client.search_memories(query, top_k=top_k)
+
+def _to_letta_memory(memory):
+    """Convert a memory dict into a Letta memory object."""
+    return LettaMemory(
+        id=memory["id"],
+        text=memory["text"],
+        metadata=memory.get("metadata", {}),
+        embedding=memory.get("embedding")
+    )
@@ -0,0 +1,66 @@
+# Token-budgeted context packing for memory queries
+
+import re
+from typing import Any, Dict, List
+from llm.tokens import count_tokens, truncate_to_tokens
+
+# Memories whose word sets overlap at least this much are treated as duplicates
+DUPLICATE_OVERLAP = 0.8
+
+# Don't bother adding a truncated memory with less room than this
+MIN_TRUNCATED_TOKENS = 32
+
+# Largest share of the budget a single memory may take, so one long journal
+# entry can't crowd out every other relevant memory
+MAX_MEMORY_SHARE = 0.5
+
+WORD_PATTERN = re.compile(r"\w+")
+
+def _words(text: str) -> set:
+    return set(WORD_PATTERN.findall(text.lower()))
+
+def _is_duplicate(words: set, text: str, selected: List[Dict[str, Any]]) -> bool:
+    """A memory is a duplicate if it repeats, or is contained in, one already selected."""
+    for other in selected:
+        if text in other["text"]:
+            return True
+        union = len(words | other["words"])
+        if union and len(words & other["words"]) / union >= DUPLICATE_OVERLAP:
+            return True
+    return False
+
+def build_context(memories: List[Dict[str, Any]], budget_tokens: int) -> List[str]:
+    """
+    Pack memory texts, best first, into at most budget_tokens tokens.
+
+    Exact and overlapping duplicates are skipped, long memories are cut to
+    a share of the budget, and the first memory that doesn't fit is
+    truncated to the remaining budget instead of overflowing the model's
+    context. Returns the memory texts to include.
+    """
+    selected = []
+    remaining = budget_tokens
+    per_memory_cap = max(int(budget_tokens * MAX_MEMORY_SHARE), MIN_TRUNCATED_TOKENS)
+
+    for memory in memories:
+        text = (memory.get('text') or "").strip()
+        if not text:
+            continue
+        words = _words(text)
+        if _is_duplicate(words, text, selected):
+            continue
+
+        # Account for the "Memory N: " label and newline around each entry
+        cost = count_tokens(text) + 4
+        if cost > per_memory_cap and per_memory_cap <= remaining:
+            text = truncate_to_tokens(text, per_memory_cap - 4)
+            cost = count_tokens(text) + 4
+        if cost > remaining:
+            if remaining - 4 >= MIN_TRUNCATED_TOKENS:
+                selected.append({"text": truncate_to_tokens(text, remaining - 4), "words": words})
+            break
+
+        selected.append({"text": text, "words": words})
+        remaining -= cost
+
+    return [entry["text"] for entry in selected]
@@ -0,0 +1,240 @@
+import json
+from array import array
+from pathlib import Path
+from llm.metrics import time_sqlite
+from llm.profiling import span
+from llm.snapshots import select_batches, snapshot
+from llm.storage import StorageEngine
+from llm.tenancy import connect, user_path
+
+# Database path for the SQLite memory backend (the default user's)
+DB_PATH = Path("data/memories.db")
+
+# Metadata keys that get a JSON1 expression index, so filtering on them
+# does not scan the whole table
+INDEXED_METADATA_KEYS = ("session_id",)
+
+COLUMNS = ['id', 'text', 'source', 'created_at', 'fragments', 'metadata', 'embedding']
+
+def _connect():
+    """Return an open connection to the current user's memory database."""
+    return connect(user_path(DB_PATH), init_database)
+
+def init_database(conn):
+    """Initialize a memory database with required tables and indexes."""
+    cursor = conn.cursor()
+
+    # Readers (including online backups) never block writers
+    cursor.execute("PRAGMA journal_mode=WAL")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS memories (
+            id TEXT PRIMARY KEY,
+            text TEXT,
+            source TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            fragments TEXT,
+            metadata TEXT,
+            embedding BLOB
+        )
+    ''')
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memories_created_at ON memories (created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memories_source ON memories (source, created_at)")
+
+    for key in INDEXED_METADATA_KEYS:
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_memories_meta_{key}
+            ON memories (json_extract(metadata, '$.{key}'))
+        ''')
+
+    conn.commit()
+
+def _encode_embedding(embedding):
+    """Pack an embedding as a float32 BLOB."""
+    if embedding is None:
+        return None
+    return array('f', embedding).tobytes()
+
+def _decode_embedding(blob):
+    """Unpack a float32 BLOB into a list of floats."""
+    if blob is None:
+        return None
+    values = array('f')
+    values.frombytes(blob)
+    return values.tolist()
+
+def _to_row(memory):
+    return (
+        memory["id"],
+        memory.get("text"),
+        memory.get("source") or "unknown",
+        memory["created_at"],
+        json.dumps(memory.get("fragments") or []),
+        json.dumps(memory.get("metadata") or {}),
+        _encode_embedding(memory.get("embedding"))
+    )
+
+def _from_row(row):
+    memory = dict(zip(COLUMNS, row))
+    memory["fragments"] = json.loads(memory["fragments"] or "[]")
+    memory["metadata"] = json.loads(memory["metadata"] or "{}")
+    memory["embedding"] = _decode_embedding(memory["embedding"])
+    return memory
+
+@time_sqlite("hippocampus")
+def insert_memories(memories):
+    """Insert memory dicts in a single transaction."""
+    conn = _connect()
+    try:
+        with conn:
+            conn.executemany(f'''
+                INSERT OR REPLACE INTO memories ({", ".join(COLUMNS)})
+                VALUES ({", ".join("?" for _ in COLUMNS)})
+            ''', [_to_row(memory) for memory in memories])
+    finally:
+        conn.close()
+
+@time_sqlite("hippocampus")
+def update_memories(memory_ids, fields):
+    """Set the same fields on the given memories."""
+    for field in fields:
+        if field not in COLUMNS or field == "id":
+            raise ValueError(f"Unknown memory field: {field}")
+    row = _to_row({"id": None, "created_at": None, **fields})
+    values = [row[COLUMNS.index(field)] for field in fields]
+    assignments = ", ".join(f"{field} = ?" for field in fields)
+    conn = _connect()
+    with conn:
+        conn.executemany(f"UPDATE memories SET {assignments} WHERE id = ?",
+                         [(*values, memory_id) for memory_id in memory_ids])
+    conn.close()
+
+@time_sqlite("hippocampus")
+def get_memories_by_id(memory_ids):
+    """Return the stored memories with the given ids, in the order asked."""
+    placeholders = ", ".join("?" for _ in memory_ids)
+    conn = _connect()
+    rows = conn.execute(
+        f"SELECT {', '.join(COLUMNS)} FROM memories WHERE id IN ({placeholders})", list(memory_ids)
+    ).fetchall()
+    conn.close()
+    found = {row[0]: _from_row(row) for row in rows}
+    return [found[memory_id] for memory_id in memory_ids if memory_id in found]
+
+@time_sqlite("hippocampus")
+def count_memories():
+    """Return the number of stored memories."""
+    conn = _connect()
+    count = conn.execute("SELECT COUNT(*) FROM memories").fetchone()[0]
+    conn.close()
+    return count
+
+@span("select_memories")
+@time_sqlite("hippocampus")
+def select_memories(limit=None, where=None, since=None, until=None, newest_first=False):
+    """
+    Retrieve memories in insertion order (or newest first), filtering in SQL.
+
+    Args:
+        limit: Maximum number of memories to return
+        where: Dict of exact matches on a column or a "metadata.<key>"
+        since: Inclusive lower bound on created_at (ISO 8601)
+        until: Exclusive upper bound on created_at (ISO 8601)
+        newest_first: Order by created_at, newest first
+    """
+    conditions = []
+    params = []
+
+    for field, value in (where or {}).items():
+        if field.startswith("metadata."):
+            key = field[len("metadata."):]
+            if not key.replace("_", "").isalnum():
+                raise ValueError(f"Invalid metadata key: {key}")
+            conditions.append(f"json_extract(metadata, '$.{key}') = ?")
+        elif field in ("id", "text", "source", "created_at"):
+            conditions.append(f"{field} = ?")
+        else:
+            raise ValueError(f"Cannot filter memories on {field}")
+        params.append(value)
+    if since:
+        conditions.append("created_at >= ?")
+        params.append(since)
+    if until:
+        conditions.append("created_at < ?")
+        params.append(until)
+
+    query = f"SELECT {', '.join(COLUMNS)} FROM memories"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY created_at DESC" if newest_first else " ORDER BY rowid"
+
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    conn = _connect()
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+
+    return [_from_row(row) for row in rows]
+
+@time_sqlite("hippocampus")
+def select_memories_after(rowid):
+    """
+    Return (memories, last_rowid) for memories inserted after the given
+    rowid, so in-process indexes can catch up with writes from other
+    worker processes without rescanning the table.
+    """
+    conn = _connect()
+    rows = conn.execute(
+        f"SELECT rowid, {', '.join(COLUMNS)} FROM memories WHERE rowid > ? ORDER BY rowid",
+        (rowid,)
+    ).fetchall()
+    conn.close()
+
+    if not rows:
+        return [], rowid
+    return [_from_row(row[1:]) for row in rows], rows[-1][0]
+
+class SqliteMemoryEngine(StorageEngine):
+    """The SQLite memory database as a storage engine with one "memories" collection."""
+    name = "sqlite"
+
+    def _check(self, collection):
+        if collection != "memories":
+            raise ValueError(f"Unknown collection: {collection}")
+
+    def put_many(self, collection, records):
+        self._check(collection)
+        insert_memories(records)
+
+    def get_many(self, collection, ids):
+        self._check(collection)
+        return get_memories_by_id(ids)
+
+    def update_many(self, collection, ids, fields):
+        self._check(collection)
+        update_memories(ids, fields)
+
+    def scan(self, collection, where=None, since=None, until=None, limit=None, newest_first=False):
+        self._check(collection)
+        return select_memories(limit, where, since, until, newest_first)
+
+    def scan_after(self, collection, cursor=0):
+        self._check(collection)
+        return select_memories_after(cursor)
+
+    def count(self, collection):
+        self._check(collection)
+        return count_memories()
+
+    def export_batches(self, collections, stack, batch_size):
+        """Read from a snapshot of the database (see llm/snapshots.py)."""
+        for collection in collections:
+            self._check(collection)
+        count_memories()  # creates the database if needed
+        conn = stack.enter_context(snapshot(user_path(DB_PATH)))
+        return {collection: select_batches(conn, f"SELECT {', '.join(COLUMNS)} FROM memories ORDER BY rowid",
+                                           batch_size, _from_row)
+                for collection in collections}
@@ -0,0 +1,246 @@
+# Memory-mapped, quantized embedding store
+#
+# Memory embeddings live in flat binary files next to the memory store
+# instead of as float lists inside every memory dict:
+#
+#   embeddings.json    dimensions and quantization
+#   embeddings.ids     one fixed-width memory id per row
+#   embeddings.q       the normalized vectors, int8 (with per-row scales in
+#                      embeddings.scales) or float16
+#   embeddings.f32     optional full-precision copy used to re-rank the
+#                      best quantized candidates
+#
+# The files are only appended to and are read through np.memmap, so opening
+# a store costs the same for ten memories as for ten million and search
+# touches pages instead of building Python objects. Appends from several
+# worker processes are serialized with an advisory lock on embeddings.lock.
+
+import fcntl
+import json
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from llm.tenancy import LRUCache, MAX_OPEN_USERS, user_path
+
+# The default user's store; other users get their own files
+STORE_PATH = "data/embeddings"
+
+# "int8" (4x smaller than float32) or "float16" (2x smaller, near-exact)
+EMBEDDING_DTYPE = os.environ.get("ENGRAM_EMBEDDING_DTYPE", "int8").lower()
+
+# Keep a float32 copy on disk and re-rank the quantized top candidates with it
+EMBEDDING_RERANK = os.environ.get("ENGRAM_EMBEDDING_RERANK", "1") != "0"
+
+# Candidates re-ranked at full precision per requested result
+RERANK_FACTOR = 4
+
+# Memory ids are stored as fixed-width ASCII
+ID_BYTES = 64
+
+# Quantized rows are converted to float32 this many bytes at a time while
+# scanning, bounding scratch memory
+SCAN_CHUNK_BYTES = 4 * 1024 * 1024
+
+class EmbeddingStore:
+    """
+    Append-only quantized embedding matrix with an id per row, searched by
+    cosine similarity.
+    """
+    def __init__(self, path, dtype: str = EMBEDDING_DTYPE, rerank: bool = EMBEDDING_RERANK):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._maps = None  # (rows, ids, quantized, scales, full) memmaps
+        meta = self._read_meta()
+        if meta:
+            self.dimensions = meta["dimensions"]
+            self.dtype = meta["dtype"]
+            self.rerank = meta["rerank"]
+        else:
+            self.dimensions = None
+            self.dtype = dtype
+            self.rerank = rerank
+
+    def _file(self, suffix: str) -> str:
+        return f"{self.path}.{suffix}"
+
+    def _read_meta(self) -> Optional[Dict]:
+        try:
+            with open(self._file("json"), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_file = f"{self._file('json')}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({"dimensions": self.dimensions, "dtype": self.dtype, "rerank": self.rerank}, f)
+        os.replace(tmp_file, self._file("json"))
+
+    def _row_bytes(self) -> Dict[str, int]:
+        sizes = {"ids": ID_BYTES, "q": self.dimensions * (1 if self.dtype == "int8" else 2)}
+        if self.dtype == "int8":
+            sizes["scales"] = 4
+        if self.rerank:
+            sizes["f32"] = self.dimensions * 4
+        return sizes
+
+    def _rows_on_disk(self) -> int:
+        """Rows fully written to every file; a partially appended row is ignored."""
+        if self.dimensions is None:
+            meta = self._read_meta()
+            if not meta:
+                return 0
+            self.dimensions, self.dtype, self.rerank = meta["dimensions"], meta["dtype"], meta["rerank"]
+        rows = None
+        for suffix, width in self._row_bytes().items():
+            try:
+                count = os.path.getsize(self._file(suffix)) // width
+            except OSError:
+                return 0
+            rows = count if rows is None else min(rows, count)
+        return rows or 0
+
+    def __len__(self):
+        return self._rows_on_disk()
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+            return quantized, scales.astype(np.float32)
+        return vectors.astype(np.float16), None
+
+    def add(self, items: Sequence[Tuple[str, Sequence[float]]]) -> int:
+        """
+        Append (memory id, embedding) pairs. Zero vectors and vectors whose
+        dimensions differ from the store's are skipped. Returns rows written.
+        """
+        if self.dimensions is None:
+            self._rows_on_disk()  # picks up dimensions set by another process
+        ids = []
+        vectors = []
+        for memory_id, embedding in items:
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector) if vector.ndim == 1 else 0
+            if not norm or not memory_id or len(memory_id.encode()) > ID_BYTES:
+                continue
+            if self.dimensions is None:
+                self.dimensions = vector.shape[0]
+                self._write_meta()
+            if vector.shape[0] != self.dimensions:
+                continue
+            ids.append(memory_id.encode())
+            vectors.append(vector / norm)
+        if not vectors:
+            return 0
+
+        matrix = np.vstack(vectors)
+        quantized, scales = self._quantize(matrix)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self._file("lock"), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Truncate any row left half-written by a crashed writer, then
+            # append the ids last so readers never see an id without its vector
+            rows = self._rows_on_disk()
+            for suffix, width in self._row_bytes().items():
+                with open(self._file(suffix), 'ab') as f:
+                    f.truncate(rows * width)
+            with open(self._file("q"), 'ab') as f:
+                f.write(quantized.tobytes())
+            if scales is not None:
+                with open(self._file("scales"), 'ab') as f:
+                    f.write(scales.tobytes())
+            if self.rerank:
+                with open(self._file("f32"), 'ab') as f:
+                    f.write(matrix.astype(np.float32).tobytes())
+            with open(self._file("ids"), 'ab') as f:
+                f.write(np.array(ids, dtype=f"S{ID_BYTES}").tobytes())
+        return len(ids)
+
+    def _mapped(self):
+        """Memory-map the files, remapping when other writers have appended."""
+        rows = self._rows_on_disk()
+        with self._lock:
+            if self._maps is None or self._maps[0] != rows:
+                if not rows:
+                    self._maps = (0, None, None, None, None)
+                else:
+                    q_dtype = np.int8 if self.dtype == "int8" else np.float16
+                    self._maps = (
+                        rows,
+                        np.memmap(self._file("ids"), dtype=f"S{ID_BYTES}", mode='r', shape=(rows,)),
+                        np.memmap(self._file("q"), dtype=q_dtype, mode='r', shape=(rows, self.dimensions)),
+                        np.memmap(self._file("scales"), dtype=np.float32, mode='r', shape=(rows,))
+                        if self.dtype == "int8" else None,
+                        np.memmap(self._file("f32"), dtype=np.float32, mode='r', shape=(rows, self.dimensions))
+                        if self.rerank else None,
+                    )
+            return self._maps
+
+    def iter_rows(self, batch_rows: int, limit: Optional[int] = None) -> Iterator[List[Tuple[str, np.ndarray]]]:
+        """
+        Yield the first limit rows (default: the rows stored when iteration
+        starts) as lists of up to batch_rows (memory id, normalized float32
+        vector) pairs. Rows are never rewritten, so later appends don't
+        change what is yielded.
+        """
+        rows, ids, quantized, scales, full = self._mapped()
+        if limit is not None:
+            rows = min(rows, limit)
+        for start in range(0, rows, batch_rows):
+            end = min(start + batch_rows, rows)
+            if full is not None:
+                vectors = np.array(full[start:end])
+            else:
+                vectors = quantized[start:end].astype(np.float32)
+                if scales is not None:
+                    vectors *= scales[start:end, None]
+            yield [(ids[i].decode(), vectors[i - start]) for i in range(start, end)]
+
+    def search(self, query_embedding: Sequence[float], top_k: int) -> List[Tuple[str, float]]:
+        """Return up to top_k (memory id, cosine similarity) pairs, best first."""
+        rows, ids, quantized, scales, full = self._mapped()
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if not rows or query.shape != (self.dimensions,) or not np.linalg.norm(query):
+            return []
+        query = query / np.linalg.norm(query)
+
+        scores = np.empty(rows, dtype=np.float32)
+        chunk_rows = max(SCAN_CHUNK_BYTES // (self.dimensions * 4), 1)
+        for start in range(0, rows, chunk_rows):
+            end = min(start + chunk_rows, rows)
+            scores[start:end] = quantized[start:end].astype(np.float32) @ query
+        if scales is not None:
+            scores *= scales
+
+        k = min(top_k * RERANK_FACTOR if full is not None else top_k, rows)
+        best = np.argpartition(-scores, k - 1)[:k]
+        if full is not None:
+            best.sort()  # sequential reads from the full-precision file
+            scores[best] = full[best] @ query
+        results = []
+        seen = set()
+        for i in best[np.argsort(-scores[best])]:
+            memory_id = ids[i].decode()
+            if memory_id not in seen:
+                seen.add(memory_id)
+                results.append((memory_id, float(scores[i])))
+        return results[:top_k]
+
+# Open stores by file path, shared by every user request in this process
+_stores = LRUCache(MAX_OPEN_USERS)
+
+def get_store() -> EmbeddingStore:
+    """Return the current user's embedding store."""
+    path = str(user_path(STORE_PATH))
+    return _stores.get_or_create(path, lambda: EmbeddingStore(path))
+
+def _reset_after_fork():
+    global _stores
+    _stores = LRUCache(MAX_OPEN_USERS)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
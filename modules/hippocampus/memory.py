@@ -1,146 +1,275 @@
 import uuid
-import json
 import os
+import threading
 from datetime import datetime
 from dateutil import tz
 from llm.client import create_llm_client
+from .summaries import note_memories
+from modules.sync.changes import record_memories
+from .retrieval import HybridIndex
+from .embeddings import get_store as get_embedding_store
+from llm.write_behind import WriteBehindBuffer, WriteBufferFull
+from .backends import JsonMemoryEngine, LettaMemoryEngine, LettaMemory, letta_client, MEMORY_FILE
+from llm.metrics import record_cache
+from llm.profiling import span
+from llm.prompts import DEFAULT_SYSTEM_MESSAGE, get_prompt, register_prompt
+from llm.scheduler import LLMBusy, BULK, priority
+from llm.storage import memory_engine
+from llm.tenancy import LRUCache, MAX_OPEN_USERS, current_user
+from llm.warmup import register_warmup
 
-# Try to import Letta with the new API
-try:
-    from letta_client import LettaClient
-    from letta_client.schemas import Memory as LettaMemory
-    # Initialize Letta client with new API
-    letta_client = LettaClient()
-    print("✓ Letta client initialized successfully")
-except ImportError:
-    print("⚠️ Letta client not available, using fallback storage")
-    letta_client = None
-    LettaMemory = None
-
-# Fallback file-based storage
-MEMORY_FILE = "data/memories.json"
-
-def _ensure_data_dir():
-    """Ensure the data directory exists."""
-    os.makedirs("data", exist_ok=True)
-
-def _load_memories():
-    """Load memories from JSON file."""
-    _ensure_data_dir()
-    if os.path.exists(MEMORY_FILE):
-        try:
-            with open(MEMORY_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            pass
-    return []
-
-def _save_memories(memories):
-    """Save memories to JSON file."""
-    _ensure_data_dir()
-    with open(MEMORY_FILE, 'w') as f:
-        json.dump(memories, f, indent=2)
+# Local storage engine for memories: "json", "sqlite", or "memory" (in
+# process memory, for tests and benchmarks)
+MEMORY_BACKEND = os.environ.get("ENGRAM_MEMORY_BACKEND", "json").lower()
+
+if MEMORY_BACKEND == "sqlite":
+    from .database import SqliteMemoryEngine
+    local_store = SqliteMemoryEngine()
+    # One-time migration of an existing JSON store
+    if local_store.count("memories") == 0 and os.path.exists(MEMORY_FILE):
+        local_store.put_many("memories", JsonMemoryEngine(MEMORY_FILE).scan("memories"))
+    print("✓ Using SQLite memory storage")
+elif MEMORY_BACKEND == "memory":
+    local_store = memory_engine()
+    print("✓ Using in-memory memory storage")
+else:
+    local_store = JsonMemoryEngine(MEMORY_FILE)
+
+def _move_embeddings_to_store(memories):
+    """
+    Append inline embeddings to the current user's embedding store and
+    return the memories without them, so stored records stay small.
+    """
+    items = [(memory["id"], memory["embedding"]) for memory in memories if memory.get("embedding")]
+    if not items:
+        return memories
+    get_embedding_store().add(items)
+    return [{**memory, "embedding": None} if memory.get("embedding") else memory for memory in memories]
+
+def _store_locally(memories):
+    """Write memories to the local engine, keeping embeddings in the embedding store."""
+    local_store.put_many("memories", _move_embeddings_to_store(memories))
+
+# With Letta, memories are written through a durable write-behind buffer so
+# requests never wait on the remote store; batches that keep failing are
+# stored locally instead
+store = local_store
+if letta_client and LettaMemory:
+    store = LettaMemoryEngine(local_store, WriteBehindBuffer(write=LettaMemoryEngine.write, fallback=_store_locally))
+    store.buffer.start()
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=store.buffer.after_fork)
+
+def set_engine(engine):
+    """Swap the storage engine behind every memory function."""
+    global store, local_store
+    store = local_store = engine
+    _reset_search_index_after_fork()
 
 # Initialize LLM client for hippocampus module
 hippocampus_llm = create_llm_client("hippocampus")
 
-def make_memory(text, source, fragments=None, metadata=None, embedding=None):
+class _UserSearchIndex:
+    """One user's hybrid index and how far it has read the storage engine."""
+    def __init__(self):
+        self.index = None
+        self.cursor = 0  # StorageEngine.scan_after position
+        self.lock = threading.Lock()
+
+# Hybrid BM25/vector indexes over local memories, built per user on first
+# search; the least recently used are dropped and rebuilt when needed again
+_search_indexes = LRUCache(MAX_OPEN_USERS)
+
+def _get_search_index():
+    """Return the current user's search index, building it from stored memories on first use."""
+    state = _search_indexes.get_or_create(current_user(), _UserSearchIndex)
+    with state.lock:
+        built = state.index is None
+        if built:
+            # Keep only ids and postings; results are read back from storage
+            fetch = None if store.reads_whole_file else (lambda ids: store.get_many("memories", ids))
+            state.index = HybridIndex(vectors=get_embedding_store(), fetch=fetch)
+            state.cursor = 0
+        
+        # Also picks up memories written by other worker processes
+        memories, state.cursor = store.scan_after("memories", state.cursor)
+        inline = [memory["id"] for memory in memories if memory.get("embedding")]
+        if inline:
+            # Written before the embedding store existed
+            memories = _move_embeddings_to_store(memories)
+            store.update_many("memories", inline, {"embedding": None})
+        state.index.add_memories(memories)
+        
+        if built:
+            print(f"Search index built over {len(state.index)} memories")
+        record_cache("search_index", hit=not built)
+        return state.index
+
+def _reset_search_index_after_fork():
+    """Each forked worker builds its own indexes on first search."""
+    global _search_indexes
+    _search_indexes = LRUCache(MAX_OPEN_USERS)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_search_index_after_fork)
+
+# Load memories and embeddings into the index before the first search
+register_warmup("search_index", _get_search_index, per_user=True)
+
+def _index_memories(memories):
+    """Keep an already built search index, the summary buckets and the sync feed up to date."""
+    state = _search_indexes.get(current_user())
+    if state is not None and state.index is not None:
+        state.index.add_memories(memories)
+    try:
+        note_memories(memories)
+    except Exception as e:
+        # The memories are stored; summaries will catch up on the next rebuild
+        print(f"Could not update summary index: {e}")
+    try:
+        record_memories(memories)
+    except Exception as e:
+        print(f"Could not record memories in the change feed: {e}")
+
+def make_memory(text, source, fragments=None, metadata=None, embedding=None, created_at=None):
     """
     Create a memory dict with all required fields.
     """
     return {
         "id": str(uuid.uuid4()),
         "text": text,
-        "created_at": datetime.now(tz=tz.UTC).isoformat(),
+        "created_at": created_at or datetime.now(tz=tz.UTC).isoformat(),
         "embedding": embedding,  # Can be None if not yet embedded
         "source": source,
         "fragments": fragments or [],
         "metadata": metadata or {},
     }
 
+def _write_memories(memories):
+    """Write memories to the storage engine; local engines keep embeddings in the embedding store."""
+    if store.remote:
+        store.put_many("memories", memories)
+    else:
+        _store_locally(memories)
+    print(f"{len(memories)} memories stored in {store.name}")
+    _index_memories(memories)
+
 def add_memory(memory):
     """
-    Store a memory using Letta client or JSON fallback.
+    Store a memory in the configured engine (queued when it is Letta).
+    Raises WriteBufferFull when Letta is too far behind.
     """
-    if letta_client and LettaMemory:
-        try:
-            # Use Letta client
-            letta_mem = LettaMemory(
-                id=memory["id"],
-                text=memory["text"],
-                metadata=memory.get("metadata", {}),
-                embedding=memory.get("embedding")
-            )
-            letta_client.add_memory(letta_mem)
-            print(f"Memory stored in Letta: {memory['id']}")
-            return
-        except Exception as e:
-            print(f"Letta storage failed, using fallback: {e}")
-    
-    # Fallback to JSON storage
-    memories = _load_memories()
-    memories.append(memory)
-    _save_memories(memories)
-    print(f"Memory stored in JSON: {memory['id']}")
+    _write_memories([memory])
 
-def get_memories(limit=None, source=None):
+def add_memories(memories):
+    """
+    Store a batch of memories in the configured engine in one go.
+    Raises WriteBufferFull when Letta is too far behind.
     """
-    Get memories from JSON storage with optional filtering.
+    _write_memories(list(memories))
+
+def get_memories(limit=None, source=None, since=None, until=None, metadata=None):
     """
-    memories = _load_memories()
+    Get memories from local storage with optional filtering.
     
-    # Filter by source if specified
+    Args:
+        limit: Maximum number of memories to return
+        source: Only memories with this source
+        since: Only memories created at or after this ISO 8601 timestamp
+        until: Only memories created before this ISO 8601 timestamp
+        metadata: Dict of metadata values that must all match, e.g. {"session_id": ...}
+    """
+    where = {f"metadata.{key}": value for key, value in (metadata or {}).items()}
     if source:
-        memories = [m for m in memories if m.get('source') == source]
-    
-    # Apply limit if specified
-    if limit:
-        memories = memories[:limit]
-    
-    return memories
+        where["source"] = source
+    return store.scan("memories", where=where, since=since, until=until, limit=limit)
 
+@span("search_memories")
 def search_memories(query, top_k=5):
     """
-    Search for relevant memories using Letta or simple text matching fallback.
+    Search for relevant memories using Letta or the local hybrid index.
+    
+    The local fallback ranks memories by BM25 over their text and, when
+    memories have embeddings, by vector similarity to the query over the
+    memory-mapped embedding store, fused with reciprocal rank fusion.
     """
-    if letta_client:
+    if store.remote:
         try:
-            # Use Letta's vector search
-            results = letta_client.search_memories(query, top_k=top_k)
-            print(f"Letta search returned {len(results)} results")
+            # Use the remote store's own vector search
+            results = store.search("memories", query, top_k=top_k)
+            print(f"{store.name} search returned {len(results)} results")
             return results
         except Exception as e:
-            print(f"Letta search failed, using fallback: {e}")
+            print(f"{store.name} search failed, using fallback: {e}")
     
-    # Fallback to simple text search
-    memories = _load_memories()
-    query_lower = query.lower()
-    matching_memories = []
+    # Fallback to local hybrid search
+    index = _get_search_index()
     
-    for memory in memories:
-        text = memory.get('text', '').lower()
-        if query_lower in text:
-            matching_memories.append(memory)
+    query_embedding = None
+    if len(index.vectors):
+        try:
+            embeddings = hippocampus_llm.embed([query])
+        except LLMBusy as e:
+            # Keyword ranking alone beats failing the search
+            print(f"Query embedding skipped: {e}")
+            embeddings = None
+        if embeddings:
+            query_embedding = embeddings[0]
     
-    return matching_memories[:top_k]
+    return index.search(query, top_k=top_k, query_embedding=query_embedding)
 
-def complete_memory(fragments, max_tokens=128):
-    """
-    Given a list of fragments/words, generate a structured memory using the LLM.
-    """
-    prompt = (
+register_prompt(
+    "complete_memory", 1,
+    system=DEFAULT_SYSTEM_MESSAGE,
+    user=(
         "You are an assistant that helps users log memories. "
         "Given the following unordered words or fragments, reconstruct a coherent, embellished memory or story. "
-        "Fragments: " + ", ".join(fragments) + "\nMemory: "
+        "Fragments: {fragments}\nMemory: "
     )
+)
+register_prompt(
+    "complete_memory", 2,
+    system=(
+        "You are an assistant that helps users log memories. "
+        "The user gives you unordered words or fragments they wrote down about something that happened. "
+        "Reconstruct a coherent, embellished memory or story from them, written as a journal entry. "
+        "Reply with the memory only."
+    ),
+    user="Fragments: {fragments}\nMemory:"
+)
+register_prompt(
+    "complete_memory_in_context", 1,
+    system=(
+        "You are an assistant that helps users log memories. "
+        "The user gives you fragments picked out of something they wrote, with excerpts of the text around them. "
+        "Reconstruct a coherent, embellished memory or story from the fragments, written as a journal entry, "
+        "using the excerpts to fill in context. "
+        "Reply with the memory only."
+    ),
+    user="Excerpts: {context}\nFragments: {fragments}\nMemory:"
+)
+
+def complete_memory(fragments, max_tokens=128, context=None):
+    """
+    Given a list of fragments/words, generate a structured memory using the LLM.
+    `context` is optional surrounding text from the fragments' source document.
+    """
+    if context:
+        template = get_prompt("complete_memory_in_context")
+        system_message, prompt = template.render(context=context, fragments=", ".join(fragments))
+    else:
+        template = get_prompt("complete_memory")
+        system_message, prompt = template.render(fragments=", ".join(fragments))
     
-    return hippocampus_llm.query(prompt, max_tokens=max_tokens)
+    return hippocampus_llm.query(prompt, system_message, max_tokens=max_tokens, prompt_id=template.id)
 
-def process_fragments(fragments, source="user", metadata=None):
+def process_fragments(fragments, source="user", metadata=None, context=None):
     """
     Take a list of fragments, generate a structured memory, and store it.
+    Consolidation is bulk work, so it yields to interactive LLM requests.
     """
-    memory_text = complete_memory(fragments)
+    with priority(BULK):
+        memory_text = complete_memory(fragments, context=context)
     memory = make_memory(
         text=memory_text,
         source=source,
@@ -1,4 +1,56 @@
 # Query logic for natural language memory queries
+import os
+from llm.prompts import DEFAULT_SYSTEM_MESSAGE, get_prompt, register_prompt
+from llm.scheduler import LLMBusy
+from llm.tokens import MAX_MODEL_LEN, count_tokens
+from .context import build_context
+
+# Memories retrieved per question before deduplication and packing
+RETRIEVAL_TOP_K = 8
+
+# Tokens reserved for the generated answer
+ANSWER_TOKENS = 200
+
+# Upper bound on memory text per question, even when the model has room for more
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("ENGRAM_CONTEXT_TOKENS", "1024"))
+
+# Chat template tokens not counted in the messages themselves
+PROMPT_OVERHEAD_TOKENS = 64
+
+register_prompt(
+    "memory_query", 1,
+    system=DEFAULT_SYSTEM_MESSAGE,
+    user="""Based on these memories, answer the following question:
+
+Question: {question}
+
+Relevant memories:
+{context}
+
+Answer:"""
+)
+register_prompt(
+    "memory_query", 2,
+    system=(
+        "You answer questions about the user's journal. "
+        "Each question comes with memories retrieved from the journal, numbered by relevance. "
+        "Answer from those memories; if they don't contain the answer, say so rather than guessing. "
+        "Keep the answer to a few sentences."
+    ),
+    user="""Relevant memories:
+{context}
+
+Question: {question}
+
+Answer:"""
+)
+
+def context_budget(question):
+    """Tokens left for memories once the prompt, overhead and answer are accounted for."""
+    system_message, prompt = get_prompt("memory_query").render(question=question, context="")
+    prompt_tokens = count_tokens(system_message) + count_tokens(prompt)
+    available = MAX_MODEL_LEN - ANSWER_TOKENS - PROMPT_OVERHEAD_TOKENS - prompt_tokens
+    return max(0, min(CONTEXT_TOKEN_BUDGET, available))
 
 def query_memories(query_text, top_k=5):
     """Search memories using simple text matching."""
@@ -13,7 +65,7 @@ def query_memory(question, llm_client=None):
     from .memory import search_memories
     
     # First, search for relevant memories
-    relevant_memories = search_memories(question, top_k=5)
+    relevant_memories = search_memories(question, top_k=RETRIEVAL_TOP_K)
     
     if not relevant_memories:
         return "I don't have any memories related to that question."
@@ -22,22 +74,19 @@ def query_memory(question, llm_client=None):
         # Simple fallback - just return the most relevant memory
         return relevant_memories[0].get('text', 'No memory text available')
     
-    # Use LLM to synthesize an answer from relevant memories
-    memory_texts = [mem.get('text', '') for mem in relevant_memories]
+    # Use LLM to synthesize an answer from as many memories as fit the context window
+    memory_texts = build_context(relevant_memories, context_budget(question))
     context = "\n".join([f"Memory {i+1}: {text}" for i, text in enumerate(memory_texts)])
     
-    prompt = f"""Based on these memories, answer the following question:
-
-Question: {question}
-
-Relevant memories:
-{context}
-
-Answer:"""
+    template = get_prompt("memory_query")
+    system_message, prompt = template.render(question=question, context=context)
     
     try:
-        response = llm_client.query(prompt, max_tokens=200, temperature=0.7)
+        response = llm_client.query(prompt, system_message, max_tokens=ANSWER_TOKENS, temperature=0.7,
+                                    prompt_id=template.id)
         return response
+    except LLMBusy:
+        raise
     except Exception as e:
         print(f"LLM query failed: {e}")
         # Fallback to simple response
@@ -0,0 +1,182 @@
+# Hybrid memory retrieval: BM25 keyword scoring fused with vector similarity
+#
+# Both indexes are built once from stored memories and then updated
+# incrementally as memories are added. Their rankings are combined with
+# reciprocal rank fusion, which only looks at ranks, so BM25 scores and
+# cosine similarities never have to be put on the same scale.
+
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by did do does for from had has have he her his i if in into is it
+its me my of on or our she so that the their them then there they this to was we were what
+when where which who why will with you your
+""".split())
+
+# Damping constant from the original RRF paper; larger values flatten the
+# contribution of top ranks
+RRF_K = 60
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def _top(scores: Iterable[Tuple[str, float]], top_k: int) -> List[Tuple[str, float]]:
+    return heapq.nlargest(top_k, scores, key=lambda item: item[1])
+
+class BM25Index:
+    """
+    An in-process inverted index with Okapi BM25 scoring.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self.doc_lengths = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: str, text: str):
+        """Index a document. Re-adding an existing id is ignored."""
+        if doc_id in self.doc_lengths:
+            return
+        terms = tokenize(text or "")
+        for term, frequency in Counter(terms).items():
+            self.postings[term][doc_id] = frequency
+        self.doc_lengths[doc_id] = len(terms)
+        self.total_length += len(terms)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """Return up to top_k (doc_id, score) pairs, best first."""
+        doc_count = len(self.doc_lengths)
+        if not doc_count:
+            return []
+        average_length = self.total_length / doc_count or 1.0
+
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / average_length
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+
+        return _top(scores.items(), top_k)
+
+class VectorIndex:
+    """
+    Brute-force cosine similarity over normalized embeddings.
+    """
+    def __init__(self):
+        self.ids = []
+        self.vectors = []
+        self.dimensions = None
+        self._matrix = None  # stacked vectors, rebuilt after adds
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, doc_id: str, embedding: Sequence[float]):
+        """Index an embedding. Zero vectors and mismatched dimensions are skipped."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if vector.ndim != 1 or norm == 0:
+            return
+        if self.dimensions is None:
+            self.dimensions = vector.shape[0]
+        elif vector.shape[0] != self.dimensions:
+            return
+        self.ids.append(doc_id)
+        self.vectors.append(vector / norm)
+        self._matrix = None
+
+    def search(self, query_embedding: Sequence[float], top_k: int) -> List[Tuple[str, float]]:
+        """Return up to top_k (doc_id, cosine similarity) pairs, best first."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if not self.ids or query.shape != (self.dimensions,) or not np.linalg.norm(query):
+            return []
+        if self._matrix is None:
+            self._matrix = np.vstack(self.vectors)
+
+        scores = self._matrix @ (query / np.linalg.norm(query))
+        k = min(top_k, len(self.ids))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(self.ids[i], float(scores[i])) for i in best]
+
+def reciprocal_rank_fusion(rankings: Iterable[List[Tuple[str, float]]], k: int = RRF_K) -> List[str]:
+    """Fuse several best-first rankings into one list of ids."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking, 1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+class HybridIndex:
+    """
+    BM25 and vector indexes over memory dicts, searched together.
+
+    By default embeddings are kept in an in-process VectorIndex. An external
+    vector index (such as the on-disk EmbeddingStore) can be passed instead;
+    it is maintained by whoever stores the memories and only searched here.
+
+    With `fetch` (ids -> memory dicts, in the order asked), only ids and
+    BM25 postings are kept and results are read back from storage;
+    otherwise the indexed memory dicts are kept in memory.
+    """
+    def __init__(self, vectors=None, fetch: Optional[Callable[[List[str]], List[Dict[str, Any]]]] = None):
+        self.bm25 = BM25Index()
+        self.vectors = vectors if vectors is not None else VectorIndex()
+        self._owns_vectors = vectors is None
+        self.fetch = fetch
+        self.ids = set()
+        self.memories = {}  # id -> memory, only without fetch
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add_memories(self, memories: Iterable[Dict[str, Any]]):
+        """Index memories by their text and, when present, their embedding."""
+        with self._lock:
+            for memory in memories:
+                memory_id = memory.get('id')
+                if not memory_id or memory_id in self.ids:
+                    continue
+                self.ids.add(memory_id)
+                if self.fetch is None:
+                    self.memories[memory_id] = memory
+                self.bm25.add(memory_id, memory.get('text') or "")
+                if self._owns_vectors and memory.get('embedding'):
+                    self.vectors.add(memory_id, memory['embedding'])
+
+    def search(self, query: str, top_k: int = 5, query_embedding: Optional[Sequence[float]] = None) -> List[Dict[str, Any]]:
+        """
+        Return the top_k memories for a query.
+
+        Each index contributes a deeper candidate list than top_k so that a
+        memory ranked moderately well by both can beat one ranked first by
+        only one of them.
+        """
+        depth = max(top_k * 4, 20)
+        with self._lock:
+            rankings = [self.bm25.search(query, depth)]
+            if query_embedding is not None and len(self.vectors):
+                rankings.append(self.vectors.search(query_embedding, depth))
+            # An external vector index may hold memories not loaded here yet
+            ids = [memory_id for memory_id in reciprocal_rank_fusion(rankings) if memory_id in self.ids][:top_k]
+            if self.fetch is None:
+                return [self.memories[memory_id] for memory_id in ids]
+        return self.fetch(ids) if ids else []
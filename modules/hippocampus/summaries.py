@@ -0,0 +1,464 @@
+# Time-bucketed memory index and precomputed period summaries
+#
+# Every memory falls into a day, ISO week, month and year bucket. Each bucket
+# keeps a memory count, a cached LLM summary and a dirty flag. New memories
+# only mark their own buckets dirty; the rollup job then re-summarizes dirty
+# buckets bottom-up (days from memory text, weeks and months from day
+# summaries, years from month summaries), so answering "what happened in
+# 2022" is a single row lookup instead of an LLM call over every memory.
+#
+# Buckets live in a SQLite database per user that every worker process
+# shares: new memories add to the counts with upserts, so concurrent
+# workers never overwrite each other's updates, and a lease row lets only
+# one worker at a time roll up a user's dirty buckets. The ids of counted
+# memories are kept too, so a memory that a concurrent build already
+# counted is not added again when its request notes it.
+
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from dateutil import tz
+from llm.metrics import record_cache, time_sqlite
+from llm.prompts import DEFAULT_SYSTEM_MESSAGE, get_prompt, register_prompt
+from llm.scheduler import LLMBusy
+from llm.tenancy import LRUCache, MAX_OPEN_USERS, as_user, connect, current_user, user_path
+from llm.warmup import register_warmup
+
+# The default user's summaries; other users get their own database
+SUMMARY_DB = Path("data/summaries.db")
+
+# Written by earlier versions; imported into the database on first use
+SUMMARY_FILE = "data/summaries.json"
+
+LEVELS = ("day", "week", "month", "year")
+
+# Which level each level is summarized from (None = the memories themselves)
+CHILD_LEVEL = {"day": None, "week": "day", "month": "day", "year": "month"}
+
+# Wait this long after new memories arrive before rolling up, so a burst of
+# inserts is summarized once
+ROLLUP_DELAY_SECONDS = 30
+
+# A worker rolling up a user's summaries renews its lease after every
+# bucket; if it dies, another worker takes over once the lease expires
+ROLLUP_LEASE_SECONDS = 120
+
+# Upper bound on the text handed to the LLM for a single bucket
+SUMMARY_INPUT_CHARS = 4000
+
+PERIOD_PATTERNS = {
+    "day": re.compile(r"^\d{4}-\d{2}-\d{2}$"),
+    "week": re.compile(r"^\d{4}-W\d{2}$"),
+    "month": re.compile(r"^\d{4}-\d{2}$"),
+    "year": re.compile(r"^\d{4}$"),
+}
+
+_lock = threading.RLock()
+_built = set()  # summary databases known to cover every stored memory
+_build_locks = LRUCache(MAX_OPEN_USERS)  # summary database -> lock held while building it
+_pending_users = set()  # users with new memories awaiting a rollup
+_wakeup = threading.Event()
+_worker = None
+
+def period_keys(created_at: str) -> Dict[str, str]:
+    """Return the day, week, month and year bucket keys for a timestamp."""
+    day = datetime.fromisoformat(created_at).date()
+    year, week, _ = day.isocalendar()
+    return {
+        "day": day.isoformat(),
+        "week": f"{year}-W{week:02d}",
+        "month": day.strftime("%Y-%m"),
+        "year": day.strftime("%Y"),
+    }
+
+def resolve_period(period: str) -> str:
+    """Translate relative names such as 'last_month' into a period key."""
+    today = datetime.now(tz=tz.UTC).date()
+    first_of_month = today.replace(day=1)
+    aliases = {
+        "today": today.isoformat(),
+        "yesterday": (today - timedelta(days=1)).isoformat(),
+        "this_week": period_keys(today.isoformat())["week"],
+        "last_week": period_keys((today - timedelta(days=7)).isoformat())["week"],
+        "this_month": first_of_month.strftime("%Y-%m"),
+        "last_month": (first_of_month - timedelta(days=1)).strftime("%Y-%m"),
+        "this_year": str(today.year),
+        "last_year": str(today.year - 1),
+    }
+    return aliases.get(period, period)
+
+def parse_period(period: str) -> Tuple[str, str, str]:
+    """
+    Return (level, start, end) for a period key, where start and end are
+    ISO dates bounding created_at as [start, end). Raises ValueError.
+    """
+    for level, pattern in PERIOD_PATTERNS.items():
+        if pattern.match(period):
+            break
+    else:
+        raise ValueError(f"Unrecognized period: {period}")
+
+    if level == "day":
+        start = date.fromisoformat(period)
+        end = start + timedelta(days=1)
+    elif level == "week":
+        year, week = period.split("-W")
+        start = date.fromisocalendar(int(year), int(week), 1)
+        end = start + timedelta(days=7)
+    elif level == "month":
+        start = date.fromisoformat(period + "-01")
+        end = (start + timedelta(days=32)).replace(day=1)
+    else:
+        start = date(int(period), 1, 1)
+        end = date(int(period) + 1, 1, 1)
+
+    return level, start.isoformat(), end.isoformat()
+
+def init_database(conn):
+    """Initialize a summaries database with required tables."""
+    cursor = conn.cursor()
+
+    # Shared by every worker; readers never block writers
+    cursor.execute("PRAGMA journal_mode=WAL")
+
+    # version counts the memories noted in a bucket, so a rollup that raced
+    # with new memories leaves the bucket dirty
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS buckets (
+            key TEXT PRIMARY KEY,
+            level TEXT NOT NULL,
+            memory_count INTEGER NOT NULL DEFAULT 0,
+            summary TEXT,
+            updated_at TEXT,
+            dirty BOOLEAN NOT NULL DEFAULT TRUE,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_buckets_level ON buckets (level, key)")
+
+    # Memories already in the counts, whether from the build or noted since
+    cursor.execute("CREATE TABLE IF NOT EXISTS counted_memories (id TEXT PRIMARY KEY) WITHOUT ROWID")
+
+    # "built" once the buckets cover the stored memories; "rollup" is the rollup lease
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS summary_state (
+            name TEXT PRIMARY KEY,
+            owner TEXT,
+            expires_at REAL
+        )
+    ''')
+
+    conn.commit()
+
+def _connect():
+    """Return an open connection to the current user's summaries database."""
+    return connect(user_path(SUMMARY_DB), init_database)
+
+def _bucket_counts(memories: List[Dict[str, Any]]) -> Dict[str, Tuple[str, int]]:
+    """Count memories per period key, as {key: (level, count)}."""
+    counts = {}
+    skipped = 0
+    for memory in memories:
+        if not memory.get('created_at'):
+            continue
+        try:
+            keys = period_keys(memory['created_at'])
+        except (TypeError, ValueError):
+            # Stored before dates were validated; leave it out of every period
+            skipped += 1
+            continue
+        for level, key in keys.items():
+            counts[key] = (level, counts.get(key, (level, 0))[1] + 1)
+    if skipped:
+        print(f"Summary index skipped {skipped} memories with an unparseable created_at")
+    return counts
+
+def _summary_file_rows() -> Optional[List[Tuple]]:
+    """Bucket rows from a summaries.json written by an earlier version, or None."""
+    summary_file = str(user_path(SUMMARY_FILE))
+    if not os.path.exists(summary_file):
+        return None
+    try:
+        with open(summary_file, 'r') as f:
+            buckets = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return None
+    return [(key, bucket["level"], bucket["memory_count"], bucket.get("summary"), bucket.get("updated_at"),
+             bool(bucket.get("dirty", True))) for key, bucket in buckets.items()]
+
+def _ensure_built() -> bool:
+    """
+    Fill the current user's buckets from an old summaries.json, or from
+    the stored memories, on first use. Returns True if this call built them.
+    """
+    path = str(user_path(SUMMARY_DB))
+    if path in _built:
+        return False
+    # Only threads building the same user's buckets wait for each other
+    with _build_locks.get_or_create(path, threading.Lock):
+        if path in _built:
+            return False
+        conn = _connect()
+        if conn.execute("SELECT 1 FROM summary_state WHERE name = 'built'").fetchone() is None:
+            # Read before taking the write lock, so other workers can keep writing meanwhile
+            rows = _summary_file_rows()
+            ids = []
+            if rows is None:
+                from .memory import get_memories
+                memories = get_memories()
+                ids = [(memory["id"],) for memory in memories]
+                rows = [(key, level, count, None, None, True)
+                        for key, (level, count) in _bucket_counts(memories).items()]
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                # Another worker may have built them in the meantime
+                built = conn.execute("SELECT 1 FROM summary_state WHERE name = 'built'").fetchone() is None
+                if built:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO buckets (key, level, memory_count, summary, updated_at, dirty) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", rows)
+                    conn.executemany("INSERT OR IGNORE INTO counted_memories (id) VALUES (?)", ids)
+                    conn.execute("INSERT INTO summary_state (name) VALUES ('built')")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        else:
+            built = False
+        _built.add(path)
+        return built
+
+register_warmup("summaries", _ensure_built, per_user=True)
+
+@time_sqlite("summaries")
+def note_memories(memories: List[Dict[str, Any]]):
+    """
+    Count newly stored memories in their buckets, mark those dirty and
+    schedule a rollup. Memories already counted, e.g. by a build that read
+    them after they were stored, are skipped.
+    """
+    _ensure_built()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        new = [memory for memory in memories
+               if conn.execute("INSERT OR IGNORE INTO counted_memories (id) VALUES (?)", (memory["id"],)).rowcount]
+        counts = _bucket_counts(new)
+        conn.executemany('''
+            INSERT INTO buckets (key, level, memory_count) VALUES (?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET memory_count = memory_count + excluded.memory_count,
+                dirty = TRUE, version = version + 1
+        ''', [(key, level, count) for key, (level, count) in counts.items()])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    _schedule_rollup()
+
+def _child_keys(conn, key: str, level: str) -> List[Tuple[str, Optional[str], bool]]:
+    """The buckets one level down within a period, as (key, summary, dirty)."""
+    child_level = CHILD_LEVEL[level]
+    _, start, end = parse_period(key)
+    # Day keys are ISO dates; month keys sort like an ISO date's first 7 characters
+    length = 10 if child_level == "day" else 7
+    return conn.execute(
+        "SELECT key, summary, dirty FROM buckets WHERE level = ? AND key >= ? AND key < ? ORDER BY key",
+        (child_level, start[:length], end[:length])
+    ).fetchall()
+
+def _clip(entries: List[str]) -> str:
+    """Join entries, stopping once the input budget is used up."""
+    text = []
+    used = 0
+    for entry in entries:
+        if used + len(entry) > SUMMARY_INPUT_CHARS:
+            text.append(entry[:max(SUMMARY_INPUT_CHARS - used, 0)])
+            break
+        text.append(entry)
+        used += len(entry)
+    return "\n".join(text)
+
+
+register_prompt(
+    "period_summary", 1,
+    system=DEFAULT_SYSTEM_MESSAGE,
+    user=(
+        "Summarize the following {kind} from the {level} {key} into a short paragraph. "
+        "Keep the important events, people and feelings.\n\n{entries}\n\nSummary:"
+    )
+)
+register_prompt(
+    "period_summary", 2,
+    system=(
+        "You summarize periods of a personal journal. "
+        "You are given either the journal memories from a day or the summaries of the shorter periods within a longer one. "
+        "Summarize them into a short paragraph. Keep the important events, people and feelings. "
+        "Reply with the summary only."
+    ),
+    user="Period: {level} {key}\nEntries ({kind}):\n{entries}\n\nSummary:"
+)
+
+def _summarize_bucket(conn, key: str, level: str, llm_client) -> Optional[str]:
+    if CHILD_LEVEL[level] is None:
+        from .memory import get_memories
+        _, start, end = parse_period(key)
+        entries = [f"- {m.get('text') or ''}" for m in get_memories(since=start, until=end)]
+        kind = "journal memories"
+    else:
+        children = _child_keys(conn, key, level)
+        if any(dirty for _, _, dirty in children):
+            # Wait until every child summary is current
+            return None
+        entries = [f"{child}: {summary}" for child, summary, _ in children if summary]
+        kind = f"{CHILD_LEVEL[level]} summaries"
+
+    if not entries:
+        return None
+
+    template = get_prompt("period_summary")
+    system_message, prompt = template.render(kind=kind, level=level, key=key, entries=_clip(entries))
+    return llm_client.query(prompt, system_message, max_tokens=200, temperature=0.3, prompt_id=template.id)
+
+def _renew_lease(conn, owner: str) -> bool:
+    """Take or extend the current user's rollup lease; False while someone else holds it."""
+    now = time.time()
+    try:
+        cursor = conn.execute('''
+            INSERT INTO summary_state (name, owner, expires_at) VALUES ('rollup', ?, ?)
+            ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE summary_state.expires_at < ? OR summary_state.owner = excluded.owner
+        ''', (owner, now + ROLLUP_LEASE_SECONDS, now))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return cursor.rowcount > 0
+
+def _release_lease(conn, owner: str):
+    conn.execute("UPDATE summary_state SET expires_at = 0 WHERE name = 'rollup' AND owner = ?", (owner,))
+    conn.commit()
+
+def refresh_summaries(llm_client=None) -> Dict[str, Any]:
+    """
+    Re-summarize every dirty bucket, children before parents.
+    Buckets whose summary could not be generated, or whose children are
+    still dirty, stay dirty for the next run. Only one worker refreshes a
+    user's summaries at a time: while another holds the lease, nothing is
+    done and "busy" is true.
+    """
+    if llm_client is None:
+        from .memory import hippocampus_llm as llm_client
+
+    _ensure_built()
+    conn = _connect()
+    owner = f"{os.getpid()}:{threading.get_ident()}"
+    if not _renew_lease(conn, owner):
+        return {"refreshed": 0, "failed": 0, "busy": True}
+
+    refreshed = failed = 0
+    try:
+        for level in LEVELS:
+            dirty = conn.execute("SELECT key, version FROM buckets WHERE level = ? AND dirty ORDER BY key",
+                                 (level,)).fetchall()
+            for key, version in dirty:
+                summary = _summarize_bucket(conn, key, level, llm_client)
+                if summary is None:
+                    failed += 1
+                    continue
+                # Memories noted while this was summarized keep the bucket dirty
+                conn.execute(
+                    "UPDATE buckets SET summary = ?, updated_at = ?, dirty = (version != ?) WHERE key = ?",
+                    (summary.strip(), datetime.now(tz=tz.UTC).isoformat(), version, key)
+                )
+                conn.commit()
+                refreshed += 1
+                if not _renew_lease(conn, owner):
+                    return {"refreshed": refreshed, "failed": failed, "busy": True}
+    finally:
+        _release_lease(conn, owner)
+
+    return {"refreshed": refreshed, "failed": failed, "busy": False}
+
+@time_sqlite("summaries")
+def get_summary(period: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the cached summary for a period, or None if it has no memories.
+    Raises ValueError for malformed periods.
+    """
+    key = resolve_period(period)
+    level, start, end = parse_period(key)
+
+    _ensure_built()
+    conn = _connect()
+    row = conn.execute("SELECT memory_count, summary, updated_at, dirty FROM buckets WHERE key = ?",
+                       (key,)).fetchone()
+    record_cache("period_summary", hit=bool(row and row[1] and not row[3]))
+    if row is None:
+        return None
+    memory_count, summary, updated_at, dirty = row
+    children = [child for child, _, _ in _child_keys(conn, key, level)] if CHILD_LEVEL[level] else []
+    return {
+        "period": key,
+        "level": level,
+        "start": start,
+        "end": end,
+        "summary": summary,
+        "memory_count": memory_count,
+        "updated_at": updated_at,
+        "stale": bool(dirty),
+        "children": children,
+    }
+
+def _rollup_worker():
+    while True:
+        _wakeup.wait()
+        time.sleep(ROLLUP_DELAY_SECONDS)
+        _wakeup.clear()
+        with _lock:
+            users = sorted(_pending_users)
+            _pending_users.clear()
+        for user in users:
+            try:
+                with as_user(user):
+                    result = refresh_summaries()
+                if result["busy"]:
+                    # Another worker is rolling up this user; check again after it
+                    with _lock:
+                        _pending_users.add(user)
+                    _wakeup.set()
+                    continue
+                print(f"Summary rollup ({user}): {result['refreshed']} refreshed, {result['failed']} failed")
+            except LLMBusy as e:
+                # Try again on the next rollup; the remaining buckets stay dirty
+                print(f"Summary rollup deferred ({user}): {e}")
+                with _lock:
+                    _pending_users.add(user)
+                _wakeup.set()
+            except Exception as e:
+                print(f"Summary rollup failed ({user}): {e}")
+
+def _reset_after_fork():
+    """The rollup thread and lock state don't survive fork; start fresh in the child."""
+    global _lock, _build_locks, _wakeup, _worker, _pending_users
+    _lock = threading.RLock()
+    _build_locks = LRUCache(MAX_OPEN_USERS)
+    _wakeup = threading.Event()
+    _worker = None
+    _pending_users = set()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def _schedule_rollup():
+    global _worker
+    with _lock:
+        _pending_users.add(current_user())
+        if _worker is None:
+            _worker = threading.Thread(target=_rollup_worker, name="summary-rollup", daemon=True)
+            _worker.start()
+    _wakeup.set()
@@ -0,0 +1 @@
+# Sync module - change feed for offline-first clients
\ No newline at end of file
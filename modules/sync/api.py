@@ -0,0 +1,32 @@
+from flask import Blueprint, request
+import os
+import sys
+from .changes import get_changes, needs_memory_backfill, backfill_memories, DEFAULT_CHANGE_LIMIT, MAX_CHANGE_LIMIT
+
+# Import shared utilities from the llm directory
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from llm.responses import success_response, validation_error, server_error
+
+# Create blueprint for sync routes
+sync_bp = Blueprint('sync', __name__, url_prefix='/api/sync')
+
+@sync_bp.route('/changes', methods=['GET'])
+def get_changes_endpoint():
+    """Get fragments, sessions, links and memories changed after a sequence number."""
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', DEFAULT_CHANGE_LIMIT, type=int)
+
+    if since < 0:
+        return validation_error("since must be a non-negative sequence number", "since")
+    if limit < 1 or limit > MAX_CHANGE_LIMIT:
+        return validation_error(f"limit must be between 1 and {MAX_CHANGE_LIMIT}", "limit")
+
+    try:
+        if needs_memory_backfill():
+            from modules.hippocampus.memory import get_memories
+            backfill_memories(get_memories())
+
+        # Compressed with the other API responses (llm/compression.py)
+        return success_response(get_changes(since, limit))
+    except Exception as e:
+        return server_error(f"Error retrieving changes: {str(e)}")
@@ -0,0 +1,207 @@
+import json
+from llm.metrics import time_sqlite
+from llm.profiling import span
+from modules.cortex.database import get_connection, register_schema, resolve_content
+
+# Changes returned per request when the client does not ask for a size
+DEFAULT_CHANGE_LIMIT = 1000
+MAX_CHANGE_LIMIT = 10000
+
+FRAGMENT_COLUMNS = ['id', 'content', 'source', 'created_at', 'metadata', 'processed', 'memory_id']
+# Read to fill in the content of fragments kept as document references
+DOCUMENT_REFERENCE_COLUMNS = ['document_id', 'span_start', 'span_end']
+SESSION_COLUMNS = ['id', 'name', 'created_at', 'metadata']
+
+# SQLite caps bound parameters per statement
+_LOOKUP_CHUNK = 500
+
+@register_schema
+def init_changes(conn):
+    """
+    Create the change log in a fragments database.
+
+    Fragment, session and fragment/session link changes are recorded by
+    triggers in the same transaction as the write; memories live in another
+    store and are recorded by record_memories. On first creation every
+    existing row is logged so a client syncing from 0 gets the full archive.
+    """
+    with conn:
+        created = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'changes'"
+        ).fetchone() is None
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                entity TEXT NOT NULL,
+                entity_id TEXT NOT NULL,
+                op TEXT NOT NULL,
+                changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+                data TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS fragments_insert_change AFTER INSERT ON fragments
+            BEGIN
+                INSERT INTO changes (entity, entity_id, op) VALUES ('fragment', NEW.id, 'insert');
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS fragments_update_change
+            AFTER UPDATE OF processed, memory_id ON fragments
+            WHEN OLD.processed IS NOT NEW.processed OR OLD.memory_id IS NOT NEW.memory_id
+            BEGIN
+                INSERT INTO changes (entity, entity_id, op) VALUES ('fragment', NEW.id, 'update');
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS sessions_insert_change AFTER INSERT ON sessions
+            BEGIN
+                INSERT INTO changes (entity, entity_id, op) VALUES ('session', NEW.id, 'insert');
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS fragment_sessions_insert_change AFTER INSERT ON fragment_sessions
+            BEGIN
+                INSERT INTO changes (entity, entity_id, op, data)
+                VALUES ('link', NEW.fragment_id, 'insert', NEW.session_id);
+            END
+        ''')
+
+        if created:
+            conn.execute('''
+                INSERT INTO changes (entity, entity_id, op)
+                SELECT 'session', id, 'insert' FROM sessions ORDER BY created_at
+            ''')
+            conn.execute('''
+                INSERT INTO changes (entity, entity_id, op)
+                SELECT 'fragment', id, 'insert' FROM fragments ORDER BY created_at
+            ''')
+            conn.execute('''
+                INSERT INTO changes (entity, entity_id, op, data)
+                SELECT 'link', fragment_id, 'insert', session_id FROM fragment_sessions
+            ''')
+            # Existing memories are logged on the first sync request
+            conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('memories_backfilled', '0')")
+
+def _memory_payload(memory):
+    """The synced form of a memory: everything except the embedding."""
+    return json.dumps({key: value for key, value in memory.items() if key != "embedding"})
+
+@time_sqlite("sync")
+def record_memories(memories):
+    """Log newly stored memories in the change feed."""
+    conn = get_connection()
+    with conn:
+        conn.executemany('''
+            INSERT INTO changes (entity, entity_id, op, data)
+            VALUES ('memory', ?, 'insert', ?)
+        ''', [(memory["id"], _memory_payload(memory)) for memory in memories if memory.get("id")])
+
+def needs_memory_backfill():
+    """Whether memories stored before the change log existed still need logging."""
+    row = get_connection().execute("SELECT value FROM sync_state WHERE key = 'memories_backfilled'").fetchone()
+    return row is not None and row[0] == '0'
+
+@time_sqlite("sync")
+def backfill_memories(memories):
+    """Log pre-existing memories once, even with several workers racing."""
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT value FROM sync_state WHERE key = 'memories_backfilled'").fetchone()
+        if row is not None and row[0] == '0':
+            conn.executemany('''
+                INSERT INTO changes (entity, entity_id, op, data)
+                VALUES ('memory', ?, 'insert', ?)
+            ''', [(memory["id"], _memory_payload(memory)) for memory in memories if memory.get("id")])
+            conn.execute("UPDATE sync_state SET value = '1' WHERE key = 'memories_backfilled'")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def _select_by_id(cursor, table, columns, ids):
+    rows = {}
+    ids = list(ids)
+    for i in range(0, len(ids), _LOOKUP_CHUNK):
+        chunk = ids[i:i + _LOOKUP_CHUNK]
+        cursor.execute(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE id IN ({','.join('?' for _ in chunk)})", chunk)
+        for row in cursor.fetchall():
+            rows[row[0]] = dict(zip(columns, row))
+    return rows
+
+@span("get_changes")
+@time_sqlite("sync")
+def get_changes(since=0, limit=DEFAULT_CHANGE_LIMIT):
+    """
+    Return everything that changed after sequence number `since`.
+
+    Changes are compacted: an entity inserted and updated within the batch
+    appears once, in its current state. Clients store `next` and pass it as
+    `since` on their next pull, repeating while `more` is true. `reset` means
+    the server's log is behind the client (e.g. a restored database) and the
+    client should discard its copy and sync from 0.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    latest = cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+    if since > latest:
+        conn.close()
+        return {"since": since, "next": 0, "more": True, "reset": True,
+                "fragments": [], "sessions": [], "links": [], "memories": []}
+
+    cursor.execute('''
+        SELECT seq, entity, entity_id, data FROM changes
+        WHERE seq > ? ORDER BY seq LIMIT ?
+    ''', (since, limit + 1))
+    rows = cursor.fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Latest change per entity, in sequence order
+    fragment_ids = {}
+    session_ids = {}
+    memories = {}
+    links = []
+    for seq, entity, entity_id, data in rows:
+        if entity == 'fragment':
+            fragment_ids.pop(entity_id, None)
+            fragment_ids[entity_id] = seq
+        elif entity == 'session':
+            session_ids.pop(entity_id, None)
+            session_ids[entity_id] = seq
+        elif entity == 'link':
+            links.append({"fragment_id": entity_id, "session_id": data})
+        elif entity == 'memory':
+            memories.pop(entity_id, None)
+            memories[entity_id] = json.loads(data)
+
+    fragments = _select_by_id(cursor, "fragments", FRAGMENT_COLUMNS + DOCUMENT_REFERENCE_COLUMNS, fragment_ids)
+    sessions = _select_by_id(cursor, "sessions", SESSION_COLUMNS, session_ids)
+    conn.close()
+
+    resolve_content(fragments.values())
+    for fragment in fragments.values():
+        for column in DOCUMENT_REFERENCE_COLUMNS:
+            del fragment[column]
+
+    return {
+        "since": since,
+        "next": rows[-1][0] if rows else since,
+        "more": more,
+        "reset": False,
+        "fragments": [fragments[i] for i in fragment_ids if i in fragments],
+        "sessions": [sessions[i] for i in session_ids if i in sessions],
+        "links": links,
+        "memories": list(memories.values()),
+    }
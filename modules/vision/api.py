@@ -1,12 +1,20 @@
-from flask import Blueprint, request
+from flask import Blueprint, request, send_file
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import FormDataParser
+import base64
+import binascii
 import os
 import sys
 
 # Import shared utilities from the llm directory
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from llm.responses import success_response, error_response, validation_error, server_error
-from llm.client import create_llm_client
-vision_llm = create_llm_client("vision")
+from llm.responses import success_response, error_response, validation_error, not_found_error, server_error
+from llm.write_behind import WriteBufferFull
+from . import database as image_db
+from .blobs import (BlobWriter, ingest, ingest_bytes, get_thumbnail, blob_path,
+                    IMAGE_ID_PATTERN, THUMBNAIL_SIZES, DEFAULT_THUMBNAIL_SIZE, MAX_IMAGE_BYTES)
+from .images import PIL_AVAILABLE
+from .describe import submit as submit_descriptions, get_status as get_description_status, queue_stats, vision_llm
 
 # Create blueprint for vision routes
 vision_bp = Blueprint('vision', __name__, url_prefix='/api/vision')
@@ -17,60 +25,226 @@ def health_check():
     return success_response({
         "status": "healthy", 
         "module": "vision",
-        "note": "Vision module is not yet implemented"
+        "thumbnails": PIL_AVAILABLE,
+        "note": "Image storage is available; analysis is not yet implemented"
     })
 
+def _resolve_image(data):
+    """
+    Return (image, None) for a request naming a stored image by "image_id"
+    or carrying it inline as base64 "image" (which is stored first), or
+    (None, error response).
+    """
+    if not data or ('image_id' not in data and 'image' not in data):
+        return None, validation_error("image_id (or inline base64 image) required", "image_id")
+
+    if 'image_id' in data:
+        image = None
+        if IMAGE_ID_PATTERN.match(str(data['image_id'])):
+            image = image_db.get_image(data['image_id'])
+        if image is None:
+            return None, not_found_error("Image")
+        return image, None
+
+    try:
+        return ingest_bytes(base64.b64decode(data['image'], validate=True)), None
+    except (binascii.Error, TypeError):
+        return None, validation_error("image must be base64 encoded", "image")
+    except ValueError as e:
+        return None, validation_error(str(e), "image")
+    except RequestEntityTooLarge:
+        return None, error_response(f"Images are limited to {MAX_IMAGE_BYTES} bytes", 413)
+
+@vision_bp.route('/images', methods=['POST'])
+def upload_images():
+    """
+    Upload images as multipart/form-data (any number of file fields) or as
+    a raw image body. Identical bytes are stored once.
+    """
+    writers = []
+
+    def stream_factory(*args, **kwargs):
+        # Each file part is written straight into the blob store while it is parsed
+        writers.append(BlobWriter())
+        return writers[-1]
+
+    try:
+        if request.mimetype == 'multipart/form-data':
+            parser = FormDataParser(stream_factory=stream_factory)
+            _, _, files = parser.parse(request.stream, request.mimetype, request.content_length,
+                                       request.mimetype_params)
+            uploads = [(storage.stream, storage.filename) for storage in files.values()]
+        elif request.mimetype.startswith('image/'):
+            writer = BlobWriter()
+            while True:
+                chunk = request.stream.read(64 * 1024)
+                if not chunk:
+                    break
+                writer.write(chunk)
+            uploads = [(writer, request.args.get('filename'))]
+        else:
+            return validation_error("Send multipart/form-data or an image/* body")
+    except RequestEntityTooLarge:
+        for writer in writers:
+            writer.discard()
+        return error_response(f"Images are limited to {MAX_IMAGE_BYTES} bytes", 413)
+    except Exception as e:
+        for writer in writers:
+            writer.discard()
+        return server_error(f"Error reading upload: {str(e)}")
+
+    if not uploads:
+        return validation_error("No image files in upload")
+
+    images = []
+    errors = []
+    for writer, filename in uploads:
+        try:
+            images.append(ingest(writer, filename))
+        except ValueError as e:
+            errors.append({"filename": filename, "error": str(e)})
+        except Exception as e:
+            for writer, _ in uploads:
+                writer.discard()
+            return server_error(f"Error storing image: {str(e)}")
+
+    if not images:
+        return error_response("No valid images in upload", 400, {"errors": errors})
+    result = {"images": images}
+    if errors:
+        result["errors"] = errors
+    return success_response(result, f"{len(images)} images stored")
+
+@vision_bp.route('/images/<image_id>', methods=['GET'])
+def get_image_metadata(image_id):
+    """Get a stored image's metadata."""
+    image = image_db.get_image(image_id) if IMAGE_ID_PATTERN.match(image_id) else None
+    if image is None:
+        return not_found_error("Image")
+    return success_response({**image, "description": get_description_status(image_id)})
+
+def _send_immutable(path, mimetype, etag):
+    # Content-addressed files never change, so clients may cache them forever
+    response = send_file(os.path.abspath(path), mimetype=mimetype, etag=etag, conditional=True, max_age=31536000)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@vision_bp.route('/images/<image_id>/original', methods=['GET'])
+def get_image_original(image_id):
+    """Download a stored image's original bytes."""
+    image = image_db.get_image(image_id) if IMAGE_ID_PATTERN.match(image_id) else None
+    if image is None:
+        return not_found_error("Image")
+    return _send_immutable(blob_path(image_id), image['content_type'], image_id)
+
+@vision_bp.route('/images/<image_id>/thumbnail', methods=['GET'])
+def get_image_thumbnail(image_id):
+    """Get a JPEG thumbnail (?size=128|256|512|1024), generated once and cached."""
+    size = request.args.get('size', DEFAULT_THUMBNAIL_SIZE, type=int)
+    if size not in THUMBNAIL_SIZES:
+        return validation_error(f"size must be one of {', '.join(map(str, THUMBNAIL_SIZES))}", "size")
+    if not PIL_AVAILABLE:
+        return error_response("Thumbnails require Pillow", 501)
+
+    image = image_db.get_image(image_id) if IMAGE_ID_PATTERN.match(image_id) else None
+    if image is None:
+        return not_found_error("Image")
+    try:
+        path = get_thumbnail(image_id, size)
+    except Exception as e:
+        return server_error(f"Error generating thumbnail: {str(e)}")
+    return _send_immutable(path, 'image/jpeg', f"{image_id}-{size}")
+
 @vision_bp.route('/analyze', methods=['POST'])
 def analyze_image():
     """Analyze an image using vision models (placeholder)."""
-    data = request.get_json()
-    
-    if not data or 'image' not in data:
-        return validation_error("Image data required", "image")
+    image, error = _resolve_image(request.get_json(silent=True))
+    if error:
+        return error
     
     # TODO: Implement image analysis
     return success_response({
+        "image_id": image["id"],
         "analysis": "Image analysis not yet implemented",
         "note": "This endpoint is a placeholder for future vision functionality"
     }, "Analysis placeholder")
 
+def _queue_full(e):
+    response = error_response(str(e), 503)
+    response[0].headers['Retry-After'] = '5'
+    return response
+
 @vision_bp.route('/describe', methods=['POST'])
 def describe_image():
-    """Generate a description of an image (placeholder)."""
-    data = request.get_json()
+    """
+    Describe an image with the vision model. Returns the description if the
+    image has one, otherwise queues it and returns 202.
+    """
+    data = request.get_json(silent=True)
+    image, error = _resolve_image(data)
+    if error:
+        return error
+    
+    try:
+        result = submit_descriptions([image["id"]], data.get('session_id'))
+    except WriteBufferFull as e:
+        return _queue_full(e)
+    
+    if image["id"] in result["described"]:
+        return success_response({"image_id": image["id"], **get_description_status(image["id"])})
+    return success_response({"image_id": image["id"], "status": "queued"}, "Description queued"), 202
+
+@vision_bp.route('/describe/batch', methods=['POST'])
+def describe_images():
+    """Queue many stored images for description, e.g. after a photo library import."""
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('image_ids'), list) or not data['image_ids']:
+        return validation_error("image_ids must be a non-empty list", "image_ids")
+    
+    image_ids = [str(image_id) for image_id in data['image_ids']]
+    missing = [image_id for image_id in image_ids
+               if not IMAGE_ID_PATTERN.match(image_id) or image_db.get_image(image_id) is None]
+    if missing:
+        return error_response("Images not found", 404, {"missing": missing})
     
-    if not data or 'image' not in data:
-        return validation_error("Image data required", "image")
+    try:
+        result = submit_descriptions(image_ids, data.get('session_id'))
+    except WriteBufferFull as e:
+        return _queue_full(e)
     
-    # TODO: Implement image description using vision_llm
     return success_response({
-        "description": "Image description not yet implemented",
-        "note": "This endpoint is a placeholder for future vision functionality"
-    }, "Description placeholder")
+        "queued": len(result["queued"]),
+        "described": len(result["described"]),
+    }, f"{len(result['queued'])} images queued for description"), 202
+
+@vision_bp.route('/jobs', methods=['GET'])
+def get_jobs():
+    """Description queue length and throughput (images per second)."""
+    try:
+        return success_response(queue_stats())
+    except Exception as e:
+        return server_error(f"Error retrieving job status: {str(e)}")
 
 @vision_bp.route('/extract', methods=['POST'])
 def extract_text():
     """Extract text from an image using OCR (placeholder)."""
-    data = request.get_json()
-    
-    if not data or 'image' not in data:
-        return validation_error("Image data required", "image")
+    image, error = _resolve_image(request.get_json(silent=True))
+    if error:
+        return error
     
     # TODO: Implement OCR functionality
     return success_response({
+        "image_id": image["id"],
         "extracted_text": "OCR not yet implemented",
         "note": "This endpoint is a placeholder for future OCR functionality"
     }, "OCR placeholder")
 
 @vision_bp.route('/models', methods=['GET'])
 def get_available_models():
-    """Get available vision models (placeholder)."""
+    """Get the models served to the vision module."""
     try:
-        # TODO: When vision models are available, use vision_llm.get_available_models()
-        return success_response({
-            "models": [],
-            "note": "Vision models not yet configured"
-        })
+        models = vision_llm.get_available_models() or {}
+        return success_response({"models": models.get("data", [])})
     except Exception as e:
         return server_error(f"Error retrieving vision models: {str(e)}")
 
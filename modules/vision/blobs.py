@@ -0,0 +1,144 @@
+# Content-addressed image store
+#
+# Uploaded images are streamed to a temporary file in the blob directory
+# while their SHA-256 is computed, then renamed to blobs/<ab>/<sha256>. The
+# same bytes uploaded twice are stored once and only processed once.
+# Derivatives (thumbnails) are generated on first request into
+# blobs/derivatives/ and served from there afterwards.
+
+import hashlib
+import os
+import re
+import tempfile
+from datetime import datetime
+from dateutil import tz
+from werkzeug.exceptions import RequestEntityTooLarge
+from llm.metrics import counter, record_cache
+from llm.tenancy import user_path
+from . import database as image_db
+from .images import inspect_image, make_thumbnail, sniff_content_type
+
+# The default user's blob directory; other users get their own
+BLOB_DIR = "data/blobs"
+
+MAX_IMAGE_BYTES = int(os.environ.get("ENGRAM_MAX_IMAGE_BYTES", str(25 * 1024 * 1024)))
+
+# Thumbnail sizes (longest side, pixels) that may be requested, so the
+# derivative cache can't be filled with arbitrary sizes
+THUMBNAIL_SIZES = (128, 256, 512, 1024)
+DEFAULT_THUMBNAIL_SIZE = 256
+
+IMAGE_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+uploads = counter("engram_vision_uploads_total", "Image uploads by outcome")
+
+def _blob_dir():
+    return user_path(BLOB_DIR)
+
+def blob_path(image_id):
+    """Path of an image's original bytes."""
+    return _blob_dir() / image_id[:2] / image_id
+
+def derivative_path(image_id, size):
+    """Path of an image's cached thumbnail."""
+    return _blob_dir() / "derivatives" / f"{image_id}-{size}.jpg"
+
+class BlobWriter:
+    """
+    A temporary file in the blob directory that hashes everything written
+    to it and refuses more than MAX_IMAGE_BYTES. Usable as a werkzeug
+    stream_factory result, so multipart uploads are never buffered whole.
+    """
+    def __init__(self, max_bytes=MAX_IMAGE_BYTES):
+        directory = _blob_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        self.file = os.fdopen(fd, "w+b")
+        self.max_bytes = max_bytes
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.header = b""
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise RequestEntityTooLarge(f"Images are limited to {self.max_bytes} bytes")
+        if len(self.header) < 16:
+            self.header += data[:16 - len(self.header)]
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        # seek/read/tell/flush for werkzeug's FileStorage
+        return getattr(self.file, name)
+
+    def discard(self):
+        """Delete the temporary file."""
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def commit(self):
+        """Move the bytes to their content address and return the image id."""
+        self.file.close()
+        image_id = self.sha256.hexdigest()
+        path = blob_path(image_id)
+        if path.exists():
+            os.remove(self.tmp_path)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self.tmp_path, path)
+        return image_id
+
+def ingest(writer, filename=None):
+    """
+    Store an uploaded image and return its metadata with "existing" (the
+    same bytes were already stored) and "near_duplicates" (ids of stored
+    images that look the same). Raises ValueError for non-images.
+    """
+    content_type = sniff_content_type(writer.header)
+    if content_type is None:
+        writer.discard()
+        raise ValueError("Unsupported image format (expected JPEG, PNG, GIF, WebP or BMP)")
+
+    image_id = writer.commit()
+    existing = image_db.get_image(image_id)
+    if existing:
+        uploads.inc(outcome="existing")
+        return {**existing, "existing": True, "near_duplicates": []}
+
+    try:
+        info = inspect_image(blob_path(image_id))
+    except ValueError:
+        os.remove(blob_path(image_id))
+        raise
+
+    near_duplicates = image_db.find_near_duplicates(info["phash"], exclude=image_id) if info["phash"] else []
+    image = image_db.insert_image({
+        "id": image_id,
+        "size": writer.size,
+        "content_type": content_type,
+        "filename": filename,
+        "created_at": datetime.now(tz=tz.UTC).isoformat(),
+        "duplicate_of": near_duplicates[0][0] if near_duplicates else None,
+        **info,
+    })
+    uploads.inc(outcome="near_duplicate" if near_duplicates else "stored")
+    return {**image, "existing": False, "near_duplicates": [image_id for image_id, _ in near_duplicates]}
+
+def ingest_bytes(data, filename=None):
+    """Store an image given as bytes (e.g. decoded from an inline base64 field)."""
+    writer = BlobWriter()
+    writer.write(data)
+    return ingest(writer, filename)
+
+def get_thumbnail(image_id, size=DEFAULT_THUMBNAIL_SIZE):
+    """Return the path of an image's thumbnail, generating it on first request."""
+    path = derivative_path(image_id, size)
+    hit = path.exists()
+    record_cache("thumbnail", hit=hit)
+    if not hit:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        make_thumbnail(blob_path(image_id), path, size)
+    return path
@@ -0,0 +1,132 @@
+from pathlib import Path
+from llm.metrics import time_sqlite
+from llm.tenancy import connect, user_path
+
+# Image metadata database (the default user's; other users get their own)
+DB_PATH = Path("data/images.db")
+
+COLUMNS = ['id', 'size', 'content_type', 'width', 'height', 'phash', 'duplicate_of', 'filename', 'created_at']
+
+# Perceptual hashes are split into this many 16-bit bands, each indexed.
+# Two hashes within NEAR_DUPLICATE_DISTANCE bits of each other must share
+# at least one band exactly, so near-duplicate lookups are index probes.
+PHASH_BANDS = 4
+NEAR_DUPLICATE_DISTANCE = PHASH_BANDS - 1
+
+def _connect():
+    """Return an open connection to the current user's image database."""
+    return connect(user_path(DB_PATH), init_database)
+
+def init_database(conn):
+    """Initialize an image database with required tables and indexes."""
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS images (
+            id TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            content_type TEXT NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            phash TEXT,
+            duplicate_of TEXT,
+            filename TEXT,
+            created_at TEXT NOT NULL,
+            band0 INTEGER,
+            band1 INTEGER,
+            band2 INTEGER,
+            band3 INTEGER
+        )
+    ''')
+
+    for band in range(PHASH_BANDS):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_images_band{band} ON images (band{band})")
+
+    # Model descriptions, keyed by image hash so each image is described once
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS descriptions (
+            image_id TEXT PRIMARY KEY,
+            description TEXT,
+            model TEXT,
+            fragment_id TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL
+        )
+    ''')
+
+    conn.commit()
+
+def _bands(phash):
+    value = int(phash, 16)
+    return [(value >> (16 * band)) & 0xFFFF for band in range(PHASH_BANDS)]
+
+@time_sqlite("vision")
+def get_image(image_id):
+    """Return an image's metadata, or None."""
+    conn = _connect()
+    row = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM images WHERE id = ?", (image_id,)).fetchone()
+    conn.close()
+    return dict(zip(COLUMNS, row)) if row else None
+
+@time_sqlite("vision")
+def insert_image(image):
+    """
+    Store an image's metadata unless the same blob is already known.
+    Returns the stored record, which is the existing one after a race.
+    """
+    bands = _bands(image["phash"]) if image.get("phash") else [None] * PHASH_BANDS
+    conn = _connect()
+    with conn:
+        conn.execute(f'''
+            INSERT OR IGNORE INTO images ({", ".join(COLUMNS)}, band0, band1, band2, band3)
+            VALUES ({", ".join("?" for _ in COLUMNS)}, ?, ?, ?, ?)
+        ''', [image.get(column) for column in COLUMNS] + bands)
+    conn.close()
+    return get_image(image["id"])
+
+@time_sqlite("vision")
+def find_near_duplicates(phash, exclude=None):
+    """
+    Return [(image id, distance)] for stored images whose perceptual hash is
+    within NEAR_DUPLICATE_DISTANCE bits of phash, closest first.
+    """
+    bands = _bands(phash)
+    conn = _connect()
+    rows = conn.execute(f'''
+        SELECT id, phash FROM images
+        WHERE {" OR ".join(f"band{band} = ?" for band in range(PHASH_BANDS))}
+    ''', bands).fetchall()
+    conn.close()
+
+    value = int(phash, 16)
+    matches = []
+    for image_id, other in rows:
+        distance = bin(value ^ int(other, 16)).count("1")
+        if image_id != exclude and distance <= NEAR_DUPLICATE_DISTANCE:
+            matches.append((image_id, distance))
+    return sorted(matches, key=lambda match: match[1])
+
+DESCRIPTION_COLUMNS = ['image_id', 'description', 'model', 'fragment_id', 'error', 'created_at']
+
+@time_sqlite("vision")
+def get_descriptions(image_ids):
+    """Return {image id: description record} for images that have one (or a recorded failure)."""
+    placeholders = ", ".join("?" for _ in image_ids)
+    conn = _connect()
+    rows = conn.execute(
+        f"SELECT {', '.join(DESCRIPTION_COLUMNS)} FROM descriptions WHERE image_id IN ({placeholders})",
+        list(image_ids)
+    ).fetchall()
+    conn.close()
+    return {row[0]: dict(zip(DESCRIPTION_COLUMNS, row)) for row in rows}
+
+@time_sqlite("vision")
+def save_descriptions(descriptions):
+    """Store description records, replacing earlier failures."""
+    conn = _connect()
+    with conn:
+        conn.executemany(f'''
+            INSERT OR REPLACE INTO descriptions ({", ".join(DESCRIPTION_COLUMNS)})
+            VALUES ({", ".join("?" for _ in DESCRIPTION_COLUMNS)})
+        ''', [[record.get(column) for column in DESCRIPTION_COLUMNS] for record in descriptions])
+    conn.close()
@@ -0,0 +1,192 @@
+# Batched image description jobs
+#
+# Description requests go into a durable job queue (llm/write_behind.py)
+# instead of calling the vision model inside the request. Worker threads
+# claim up to DESCRIBE_BATCH_SIZE images at a time and describe them in one
+# multimodal chat request, with at most DESCRIBE_CONCURRENCY requests in
+# flight per process. Descriptions are stored by image hash, so an image
+# (or a near-duplicate of one) is only ever described once, and each new
+# description becomes a cortex fragment with source "image:<hash>".
+
+import base64
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from dateutil import tz
+from llm.client import create_llm_client
+from llm.metrics import counter
+from llm.tenancy import current_user
+from llm.write_behind import WriteBehindBuffer
+from . import database as image_db
+from .blobs import blob_path, get_thumbnail
+from .images import PIL_AVAILABLE
+
+JOBS_PATH = "data/vision_jobs.db"
+
+# Images per multimodal request, and requests in flight per process
+DESCRIBE_BATCH_SIZE = int(os.environ.get("ENGRAM_VISION_BATCH_SIZE", "4"))
+DESCRIBE_CONCURRENCY = int(os.environ.get("ENGRAM_VISION_CONCURRENCY", "4"))
+
+# Images are sent as a thumbnail of this size rather than full resolution
+DESCRIBE_IMAGE_SIZE = 512
+
+# Completion tokens allowed per image in a batch
+DESCRIPTION_TOKENS = 150
+
+DESCRIPTION_PROMPT = (
+    "Describe each of the following photos from a personal journal in one or two sentences: "
+    "who or what is in it, where it seems to be and what is happening. "
+    "Reply with exactly one line per photo, numbered in order: '1. ...', '2. ...'."
+)
+
+# Window for the reported images-per-second rate
+THROUGHPUT_WINDOW_SECONDS = 60
+
+vision_llm = create_llm_client("vision")
+
+descriptions_total = counter("engram_vision_descriptions_total", "Image descriptions by source (model, cache or failure)")
+
+_batches = deque()  # (started, finished, images) for recent batches
+_batches_lock = threading.Lock()
+
+def _job_id(image_id: str) -> str:
+    return f"{current_user()}:{image_id}"
+
+def _image_url(image: Dict[str, Any]) -> str:
+    """A data: URL with a downscaled copy of the image (the original without Pillow)."""
+    if PIL_AVAILABLE:
+        path, content_type = get_thumbnail(image["id"], DESCRIBE_IMAGE_SIZE), "image/jpeg"
+    else:
+        path, content_type = blob_path(image["id"]), image["content_type"]
+    with open(path, 'rb') as f:
+        return f"data:{content_type};base64,{base64.b64encode(f.read()).decode()}"
+
+def _describe(images: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """Describe images in one request, falling back to one request per image if the reply doesn't parse."""
+    urls = [_image_url(image) for image in images]
+    descriptions = vision_llm.describe_images(urls, DESCRIPTION_PROMPT, max_tokens=DESCRIPTION_TOKENS * len(urls))
+    if descriptions is None and len(urls) > 1:
+        descriptions = [(vision_llm.describe_images([url], DESCRIPTION_PROMPT, max_tokens=DESCRIPTION_TOKENS) or [None])[0]
+                        for url in urls]
+    return descriptions or [None] * len(images)
+
+def _store(described: List[tuple], by_image: Dict[str, Dict[str, Any]]):
+    """Save (image, description, model) triples and add each description as a cortex fragment."""
+    from modules.cortex.database import add_fragments
+
+    fragment_ids = add_fragments([{
+        "content": description,
+        "source": f"image:{image['id']}",
+        "metadata": {"image_id": image["id"], "filename": image.get("filename")},
+        "session_id": by_image[image["id"]].get("session_id"),
+    } for image, description, _ in described])
+
+    now = datetime.now(tz=tz.UTC).isoformat()
+    image_db.save_descriptions([{
+        "image_id": image["id"],
+        "description": description,
+        "model": model,
+        "fragment_id": fragment_id,
+        "created_at": now,
+    } for (image, description, model), fragment_id in zip(described, fragment_ids)])
+
+def _describe_batch(batch: List[Dict[str, Any]]):
+    """Job queue writer: describe one user's batch of images. Raises so failed images are retried."""
+    started = time.monotonic()
+    by_image = {job["image_id"]: job for job in batch}
+    known = image_db.get_descriptions(list(by_image))
+    images = [image_db.get_image(image_id) for image_id in by_image
+              if not (known.get(image_id) or {}).get("description")]
+    images = [image for image in images if image is not None]
+
+    # Near-duplicates of described images reuse their description
+    originals = image_db.get_descriptions([image["duplicate_of"] for image in images if image["duplicate_of"]])
+    reused = [(image, originals[image["duplicate_of"]]["description"], originals[image["duplicate_of"]]["model"])
+              for image in images if (originals.get(image["duplicate_of"]) or {}).get("description")]
+    if reused:
+        _store(reused, by_image)
+        descriptions_total.inc(len(reused), source="cache")
+    reused_ids = {image["id"] for image, _, _ in reused}
+    images = [image for image in images if image["id"] not in reused_ids]
+    if not images:
+        return
+
+    results = list(zip(images, _describe(images)))
+    described = [(image, description, vision_llm.model_name) for image, description in results if description]
+    if described:
+        _store(described, by_image)
+        descriptions_total.inc(len(described), source="model")
+        with _batches_lock:
+            _batches.append((started, time.monotonic(), len(described)))
+
+    if len(described) < len(images):
+        raise RuntimeError(f"Vision model did not describe {len(images) - len(described)} of {len(images)} images")
+
+def _record_failures(batch: List[Dict[str, Any]]):
+    """Job queue fallback: remember images the model failed on, so status requests can report it."""
+    known = image_db.get_descriptions([job["image_id"] for job in batch])
+    failed = [job["image_id"] for job in batch if not (known.get(job["image_id"]) or {}).get("description")]
+    image_db.save_descriptions([{
+        "image_id": image_id,
+        "error": "The vision model could not describe this image",
+        "created_at": datetime.now(tz=tz.UTC).isoformat(),
+    } for image_id in failed])
+    descriptions_total.inc(len(failed), source="failed")
+
+jobs = WriteBehindBuffer(write=_describe_batch, fallback=_record_failures, path=JOBS_PATH, name="vision",
+                         batch_size=DESCRIBE_BATCH_SIZE, workers=DESCRIBE_CONCURRENCY)
+jobs.start()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=jobs.after_fork)
+
+def submit(image_ids: List[str], session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Queue images for description. Images that already have a description
+    are not queued again. Raises WriteBufferFull when the queue is full.
+    Returns {"queued": [ids], "described": {id: description}}.
+    """
+    known = image_db.get_descriptions(image_ids)
+    described = {image_id: known[image_id]["description"] for image_id in image_ids
+                 if (known.get(image_id) or {}).get("description")}
+    queued = [image_id for image_id in dict.fromkeys(image_ids) if image_id not in described]
+    if queued:
+        jobs.submit([{"id": _job_id(image_id), "image_id": image_id, "session_id": session_id}
+                     for image_id in queued])
+    if described:
+        descriptions_total.inc(len(described), source="cache")
+    return {"queued": queued, "described": described}
+
+def get_status(image_id: str) -> Dict[str, Any]:
+    """Return an image's description status: described, queued, failed or none."""
+    record = image_db.get_descriptions([image_id]).get(image_id)
+    if jobs.contains(_job_id(image_id)):
+        return {"status": "queued"}
+    if record and record["description"]:
+        return {"status": "described", "description": record["description"],
+                "model": record["model"], "fragment_id": record["fragment_id"]}
+    if record:
+        return {"status": "failed", "error": record["error"]}
+    return {"status": "none"}
+
+def images_per_second() -> float:
+    """Images described by the model per second over recent batches in this process."""
+    now = time.monotonic()
+    with _batches_lock:
+        while _batches and _batches[0][1] < now - THROUGHPUT_WINDOW_SECONDS:
+            _batches.popleft()
+        if not _batches:
+            return 0.0
+        elapsed = max(batch[1] for batch in _batches) - min(batch[0] for batch in _batches)
+        return sum(batch[2] for batch in _batches) / max(elapsed, 1e-6)
+
+def queue_stats() -> Dict[str, Any]:
+    """Pending jobs and recent throughput."""
+    return {
+        "pending": jobs.pending(),
+        "images_per_second": round(images_per_second(), 3),
+        "batch_size": DESCRIBE_BATCH_SIZE,
+        "concurrency": DESCRIBE_CONCURRENCY,
+    }
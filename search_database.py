@@ -6,9 +6,37 @@ Simple script to search the SQLite fragments database
 import sqlite3
 import json
 from pathlib import Path
+from llm.compression import decompress
 
 DB_PATH = Path("cortex/data/fragments.db")
 
+FRAGMENT_COLUMNS = "f.id, f.content, f.source, f.created_at, f.metadata, f.processed, f.memory_id"
+
+def _referenced_fragments(cursor, search_term, show_all, limit):
+    """Fragments with the content of those that reference a source document filled in."""
+    cursor.execute(f'''
+        SELECT {FRAGMENT_COLUMNS}, f.document_id, f.span_start, f.span_end
+        FROM fragments f
+        WHERE ? OR f.content LIKE ? OR f.document_id IS NOT NULL
+        ORDER BY f.created_at DESC
+    ''', [show_all, f"%{search_term}%"])
+    
+    documents = {}
+    fragments = []
+    for row in cursor:
+        fragment, (document_id, start, end) = list(row[:7]), row[7:]
+        if document_id and not fragment[1]:
+            if document_id not in documents:
+                document = cursor.connection.execute(
+                    "SELECT encoding, content FROM documents WHERE id = ?", (document_id,)).fetchone()
+                documents[document_id] = decompress(document[1], document[0]).decode("utf-8") if document else ""
+            fragment[1] = documents[document_id][start:end]
+        if show_all or search_term.lower() in fragment[1].lower():
+            fragments.append(fragment)
+            if len(fragments) >= limit:
+                break
+    return fragments
+
 def search_fragments(search_term="", show_all=False, limit=10):
     """Search fragments by content."""
     if not DB_PATH.exists():
@@ -18,15 +46,20 @@ def search_fragments(search_term="", show_all=False, limit=10):
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
-    if show_all:
-        query = "SELECT * FROM fragments ORDER BY created_at DESC LIMIT ?"
-        params = [limit]
+    # Databases with source documents keep some fragments as references into them
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'documents'")
+    if cursor.fetchone():
+        fragments = _referenced_fragments(cursor, search_term, show_all, limit)
     else:
-        query = "SELECT * FROM fragments WHERE content LIKE ? ORDER BY created_at DESC LIMIT ?"
-        params = [f"%{search_term}%", limit]
-    
-    cursor.execute(query, params)
-    fragments = cursor.fetchall()
+        if show_all:
+            query = f"SELECT {FRAGMENT_COLUMNS} FROM fragments f ORDER BY created_at DESC LIMIT ?"
+            params = [limit]
+        else:
+            query = f"SELECT {FRAGMENT_COLUMNS} FROM fragments f WHERE content LIKE ? ORDER BY created_at DESC LIMIT ?"
+            params = [f"%{search_term}%", limit]
+        
+        cursor.execute(query, params)
+        fragments = cursor.fetchall()
     conn.close()
     
     if not fragments:
@@ -82,15 +115,20 @@ def show_stats():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
-    # Count fragments
-    cursor.execute("SELECT COUNT(*) FROM fragments")
-    total_fragments = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM fragments WHERE processed = TRUE")
-    processed_fragments = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM sessions")
-    total_sessions = cursor.fetchone()[0]
+    # Counters kept by the app's triggers; older databases are counted
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'fragment_stats'")
+    if cursor.fetchone():
+        cursor.execute("SELECT fragments, processed, sessions FROM fragment_stats WHERE session_id = ''")
+        total_fragments, processed_fragments, total_sessions = cursor.fetchone() or (0, 0, 0)
+    else:
+        cursor.execute("SELECT COUNT(*) FROM fragments")
+        total_fragments = cursor.fetchone()[0]
+        
+        cursor.execute("SELECT COUNT(*) FROM fragments WHERE processed = TRUE")
+        processed_fragments = cursor.fetchone()[0]
+        
+        cursor.execute("SELECT COUNT(*) FROM sessions")
+        total_sessions = cursor.fetchone()[0]
     
     conn.close()
     
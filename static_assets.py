@@ -0,0 +1,163 @@
+"""
+In-memory static asset serving for the Flutter web build.
+
+Every file under the build directory is read once at startup together with
+precompressed gzip (and brotli, when the brotli package is installed)
+variants and a content hash ETag. Requests are then answered from memory
+with content negotiation, 304 Not Modified for matching If-None-Match
+headers, and long-lived immutable caching for fingerprinted files.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from flask import Response
+from llm.metrics import record_cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Files whose names carry a content hash, e.g. main.3f9a2c1b.js, never change
+FINGERPRINT_PATTERN = re.compile(r"[.-][0-9a-f]{8,}\.\w+$")
+
+# Files smaller than this aren't worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/manifest+json",
+    "application/wasm",
+    "application/xml",
+    "image/svg+xml",
+    "font/ttf",
+    "font/otf",
+)
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+mimetypes.add_type("application/wasm", ".wasm")
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+
+class StaticAsset:
+    """One file with its precompressed variants."""
+    __slots__ = ("variants", "mimetype", "cache_control")
+
+    def __init__(self, variants, mimetype, cache_control):
+        self.variants = variants  # encoding -> (body, etag), "identity" always present
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+
+def _compressed_variant(path, data, encoding, compress):
+    """
+    Return compressed bytes for a file, reusing a sidecar file (main.dart.js.gz)
+    newer than the source, and writing one when the build directory allows.
+    The sidecar is renamed into place, so other workers never read half of it.
+    """
+    suffix = ".gz" if encoding == "gzip" else ".br"
+    sidecar = path + suffix
+    try:
+        if os.path.getmtime(sidecar) >= os.path.getmtime(path):
+            with open(sidecar, 'rb') as f:
+                return f.read()
+    except OSError:
+        pass
+
+    compressed = compress(data)
+    tmp_file = None
+    try:
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(sidecar), prefix=os.path.basename(sidecar) + ".",
+                                        suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_file, sidecar)
+    except OSError:
+        if tmp_file is not None and os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return compressed
+
+class StaticAssets:
+    """
+    An in-memory manifest of a static build directory.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.assets = {}
+        self.total_bytes = 0
+        self.load()
+
+    def load(self):
+        """Read and precompress every file under the root directory."""
+        self.assets = {}
+        self.total_bytes = 0
+        if not os.path.isdir(self.root):
+            return
+
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith((".gz", ".br")):
+                    continue
+                path = os.path.join(directory, filename)
+                relative_path = os.path.relpath(path, self.root).replace(os.sep, "/")
+                self.assets[relative_path] = self._load_asset(path, relative_path)
+
+    def _load_asset(self, path, relative_path):
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        digest = hashlib.sha256(data).hexdigest()[:20]
+        variants = {"identity": (data, f'"{digest}"')}
+
+        if len(data) >= MIN_COMPRESS_BYTES and mimetype.startswith(COMPRESSIBLE_TYPES):
+            compressed = _compressed_variant(path, data, "gzip", lambda d: gzip.compress(d, 9))
+            if len(compressed) < len(data):
+                variants["gzip"] = (compressed, f'"{digest}-gz"')
+            if brotli is not None:
+                compressed = _compressed_variant(path, data, "br", lambda d: brotli.compress(d, quality=11))
+                if len(compressed) < len(data):
+                    variants["br"] = (compressed, f'"{digest}-br"')
+
+        self.total_bytes += sum(len(body) for body, _ in variants.values())
+        is_fingerprinted = FINGERPRINT_PATTERN.search(relative_path)
+        return StaticAsset(variants, mimetype, IMMUTABLE_CACHE if is_fingerprinted else REVALIDATE_CACHE)
+
+    def response(self, path, request):
+        """
+        Build the response for an asset path, or return None if it doesn't exist.
+        Picks the smallest encoding the client accepts and answers 304 when
+        the client's cached copy is current.
+        """
+        asset = self.assets.get(path)
+        if asset is None:
+            return None
+
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if candidate in asset.variants and request.accept_encodings[candidate] > 0:
+                encoding = candidate
+                break
+        body, etag = asset.variants[encoding]
+
+        headers = {
+            "ETag": etag,
+            "Cache-Control": asset.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        # If-None-Match uses weak comparison (RFC 9110), so W/"..." also matches
+        not_modified = request.if_none_match.contains_weak(etag.strip('"'))
+        record_cache("static_etag", hit=not_modified)
+        if not_modified:
+            return Response(status=304, headers=headers)
+
+        return Response(body, mimetype=asset.mimetype, headers=headers)